@@ -1,13 +1,19 @@
-from utils.pinutils import FakeBot
+from utils.AppSettings import get_settings
+from utils.eventbus import EventBus
+from utils.fleet import Fleet
+from utils.pinutils import Led
 
+settings = get_settings()
 
-class Bots:
-    def __init__(self, leds: list[FakeBot]):
-        self.leds = leds
+# status changes of the bots, streamed by /supervisor/events
+bot_events = EventBus()
 
+# the three bots with an LED on the Raspberry Pi and the simulated ones
+fleet = Fleet(events=bot_events)
+for color in ("red", "yellow", "green"):
+    fleet.add(color, led=Led(color))
+fleet.add_many(f"sim-{i:05d}" for i in range(settings.FLEET_SIMULATED_BOTS))
 
-bots = Bots([FakeBot("red"), FakeBot("yellow"), FakeBot("green")])
 
-
-def get_bots():
-    return bots
+def get_fleet():
+    return fleet
@@ -1,25 +1,20 @@
 import os
-import pathlib
-import re
+import zipfile
 from datetime import datetime
 from typing import Literal
 
-from fastapi import APIRouter, File, UploadFile
-from langchain_community.document_loaders import (
-    Docx2txtLoader,
-    PyPDFLoader,
-    TextLoader,
-    AsyncHtmlLoader,
-)
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from langchain_community.document_loaders import AsyncHtmlLoader
 from loguru import logger
 from utils.aiutils import get_splitter
-from utils.AppSettings import AppSettings
-from utils.fileutils import save_file
-from utils.pgutils import pg_save_import
-from utils.retriever import get_vectorstore
-from uuid import uuid4
+from utils.answercache import answer_cache
+from utils.AppSettings import get_settings
+from utils.bulkimport import bulk_imports, list_import_files
+from utils.fileutils import extract_zip, get_upload_subdir, save_file
+from utils.importer import import_queue, iter_chunks, sync_chunks
+from utils.pgutils import pg_get_import, pg_save_import
 
-settings = AppSettings()
+settings = get_settings()
 
 router = APIRouter(
     prefix="/file",
@@ -31,7 +26,7 @@ router = APIRouter(
 @router.post(
     "/import",
     name="import data",
-    description="Upload a file and save data with embedding in the vector db",
+    description="Upload a file and queue the import (embedding in the vector db), returns the import id",
 )
 def import_file(
     file_upload: UploadFile = File(...),
@@ -48,37 +43,85 @@ def import_file(
         file_size=os.path.getsize(save_to),
         import_date=datetime.now(),
         collection_name=collection_name,
+        status="queued",
+        splitter_type=splitter_type,
+        file_path=save_to,
     )
+    import_queue.submit(
+        import_id, save_to, new_filename, splitter_type, collection_name
+    )
+    return {"import_id": import_id, "status": "queued"}
 
-    suffix = pathlib.Path(new_filename).suffix.lower()
-    if suffix == ".pdf":
-        loader = PyPDFLoader(save_to)
-    elif suffix == ".docx":
-        loader = Docx2txtLoader(save_to)
-    else:
-        loader = TextLoader(save_to, autodetect_encoding=True)
-
-    pages = loader.load()
 
-    for i, page in enumerate(pages):
-        page.metadata["source"] = new_filename
-        page.metadata["import_id"] = import_id
-        if not suffix == ".pdf":
-            page.metadata["page"] = i
-
-    text_splitter = get_splitter(splitter_type)
-    doc_splits = text_splitter.split_documents(pages)
-
-    # beautify after splitting
-    for doc in doc_splits:
-        doc.page_content = re.sub(
-            r"(\d)([a-zA-Z])", r"\1 \2", doc.page_content.replace("\n", "")
+@router.post(
+    "/import-bulk",
+    name="bulk import",
+    description="Import all files (pdf, docx, txt, md) of an uploaded zip or of a directory "
+    "below ./data/upload: parsing in a process pool, embedding in shared batches, "
+    "one import per file. Returns the bulk id and the import ids",
+)
+def import_bulk(
+    zip_upload: UploadFile | None = File(None),
+    directory: str = "",
+    splitter_type: Literal["recursive", "semantic"] = "recursive",
+    collection_name: str = settings.PGVECTOR_COLLECTION,
+):
+    if bool(zip_upload) == bool(directory):
+        raise HTTPException(
+            status_code=422, detail="Either zip_upload or directory is required"
         )
+    try:
+        path = extract_zip(zip_upload) if zip_upload else get_upload_subdir(directory)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    files = list_import_files(path)
+    if not files:
+        raise HTTPException(status_code=400, detail=f"No files to import in {path}")
+    logger.debug(f"Starting bulk import of {len(files)} files from {path}")
+
+    bulk = bulk_imports.submit(files, splitter_type, collection_name)
+    return {
+        "bulk_id": bulk.id,
+        "imports": bulk.stats()["imports"],
+        "status": "queued",
+    }
+
+
+@router.get(
+    "/import-bulk/{bulk_id}",
+    name="bulk import status",
+    description="Status and throughput per stage (parse, embed, write) of a bulk import",
+)
+def import_bulk_status(bulk_id: str):
+    bulk = bulk_imports.get(bulk_id)
+    if bulk is None:
+        raise HTTPException(status_code=404, detail=f"Bulk import {bulk_id} not found")
+    return bulk.stats()
+
 
-    vectorstore = get_vectorstore(collection_name=collection_name)
-    # uuids = [str(uuid4()) for _ in range(len(doc_splits))]
-    ids = vectorstore.add_documents(doc_splits)
-    return {"ids": ids}
+@router.get(
+    "/import/{import_id}",
+    name="import status",
+    description="Status of an import: stage and number of chunks",
+)
+def import_status(import_id: int):
+    job = pg_get_import(import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import {import_id} not found")
+    return {
+        "import_id": job["id"],
+        "file_name": job["file_name"],
+        "collection_name": job["collection_name"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "chunks_total": job["chunks_total"],
+        "chunks_done": job["chunks_done"],
+        "chunks_added": job["chunks_added"],
+        "chunks_unchanged": job["chunks_unchanged"],
+        "chunks_deleted": job["chunks_deleted"],
+        "error": job["error"],
+        "updated_at": job["updated_at"],
+    }
 
 
 @router.post(
@@ -100,10 +143,11 @@ def import_web(
         page.metadata["source"] = url
         page.metadata["import_id"] = 0
 
-    text_splitter = get_splitter(splitter_type)
-    doc_splits = text_splitter.split_documents(pages)
+    doc_splits = list(iter_chunks(pages, get_splitter(splitter_type), set_page=False))
 
-    vectorstore = get_vectorstore(collection_name=collection_name)
-    # uuids = [str(uuid4()) for _ in range(len(doc_splits))]
-    ids = vectorstore.add_documents(doc_splits)
-    return {"ids": ids}
+    # a page imported before is updated incrementally
+    stats = sync_chunks(doc_splits, collection_name, url)
+    if stats["chunks_added"] or stats["chunks_deleted"]:
+        answer_cache.invalidate(collection_name)
+    # sync_chunks sets the content-hash ids, all chunks of the page (new and unchanged)
+    return {"ids": list(dict.fromkeys(doc.id for doc in doc_splits)), **stats}
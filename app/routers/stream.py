@@ -0,0 +1,207 @@
+import json
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import RunnableConfig
+from loguru import logger
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+
+from chains.chat.graph import (
+    graph as chat_graph,
+    session_graph as chat_session_graph,
+    sessions as chat_sessions,
+)
+from chains.crag.graph import graph as crag_graph
+from chains.rag.graph import graph as rag_graph
+from utils.AppSettings import get_settings
+
+settings = get_settings()
+
+router = APIRouter(
+    prefix="/stream",
+    tags=["stream"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+class ChatStreamInput(BaseModel):
+    input: str
+    # with thread_id the history is kept on the server, chat_history is not needed
+    thread_id: str | None = None
+    # answers the client already got in the session, to detect a lost session
+    turns: int = 0
+    chat_history: list[dict] = []
+    further_questions: bool = False
+    further_questions_mode: Literal["sequential", "parallel"] | None = None
+    further_questions_timeout: float | None = None
+    ollama_model_name: str | None = None
+    llm: str | None = None
+
+
+class RagStreamInput(BaseModel):
+    question: str
+    collection_name: str = settings.PGVECTOR_COLLECTION
+    answer_cache: bool = settings.ANSWER_CACHE
+    # e.g. {"search_type": "hybrid", "k": 4}
+    search_kwargs: dict | None = None
+    ollama_model_name: str | None = None
+    llm: str | None = None
+
+
+def _text(chunk) -> str:
+    # chat models stream message chunks, completion models generation chunks
+    return getattr(chunk, "content", None) or getattr(chunk, "text", "") or ""
+
+
+def _documents(documents) -> str:
+    return json.dumps(
+        [
+            {"page_content": doc.page_content, "metadata": doc.metadata}
+            for doc in documents or []
+        ],
+        default=str,
+    )
+
+
+def is_node_run(event: dict) -> bool:
+    # the end of a node is reported by the node and by its function, only the node has the step tag
+    return any(tag.startswith("graph:step:") for tag in event.get("tags", []))
+
+
+async def stream_graph(
+    graph: Runnable,
+    graph_input: dict,
+    metadata: dict,
+    token_node: str,
+    node_events: dict,
+    configurable: dict | None = None,
+):
+    """Server-sent events of a graph run: 'token' for every token of the token_node,
+    the events of node_events (node -> function of the node output returning a list
+    of (event, data)) when the node has finished, at last 'end' or 'error'.
+    """
+    config = RunnableConfig(metadata=metadata, configurable=configurable or {})
+    try:
+        async for event in graph.astream_events(graph_input, config, version="v2"):
+            node = event.get("metadata", {}).get("langgraph_node")
+            if event["event"] in ("on_chat_model_stream", "on_llm_stream"):
+                if node == token_node and "nostream" not in event.get("tags", []):
+                    text = _text(event["data"]["chunk"])
+                    if text:
+                        yield {"event": "token", "data": text}
+            elif (
+                event["event"] == "on_chain_end"
+                and node in node_events
+                and is_node_run(event)
+            ):
+                for name, data in node_events[node](event["data"].get("output") or {}):
+                    yield {"event": name, "data": data}
+    except Exception as e:
+        logger.error(f"Error in stream_graph: {e}")
+        yield {"event": "error", "data": str(e)}
+        return
+    yield {"event": "end", "data": ""}
+
+
+def _overrides(body: BaseModel) -> dict:
+    return {
+        key: value
+        for key, value in body.model_dump(include={"ollama_model_name", "llm"}).items()
+        if value
+    }
+
+
+@router.post(
+    "/chat",
+    name="stream chat",
+    description="Chat graph as server-sent events: token, further_questions, end",
+)
+async def stream_chat(body: ChatStreamInput):
+    if (
+        body.thread_id
+        and not body.chat_history
+        and chat_sessions.lost(body.thread_id, body.turns)
+    ):
+        raise HTTPException(
+            409,
+            f"Sitzung {body.thread_id} ist nicht mehr vorhanden, "
+            "bitte den Verlauf (chat_history) erneut senden",
+        )
+    metadata = {
+        "further_questions": body.further_questions,
+        **body.model_dump(
+            include={"further_questions_mode", "further_questions_timeout"},
+            exclude_none=True,
+        ),
+        **_overrides(body),
+    }
+    node_events = {
+        "get_further_questions": lambda output: [
+            ("further_questions", json.dumps(output.get("further_questions", [])))
+        ],
+    }
+    return EventSourceResponse(
+        stream_graph(
+            chat_session_graph if body.thread_id else chat_graph,
+            {"input": body.input, "chat_history": body.chat_history},
+            metadata,
+            token_node="chatbot",
+            node_events=node_events,
+            configurable={"thread_id": body.thread_id} if body.thread_id else None,
+        )
+    )
+
+
+def _cached(output: dict) -> list:
+    # a cached answer has no generation, it is sent as one token
+    if not output.get("cached"):
+        return []
+    return [
+        ("documents", _documents(output.get("documents"))),
+        ("token", output.get("generation", "")),
+    ]
+
+
+def _stream_rag(graph: Runnable, documents_node: str, body: RagStreamInput):
+    metadata = {
+        "collection_name": body.collection_name,
+        "answer_cache": body.answer_cache,
+        "search_kwargs": body.search_kwargs,
+        **_overrides(body),
+    }
+    node_events = {
+        "check_cache": _cached,
+        # the sources are sent before the first token
+        documents_node: lambda output: [
+            ("documents", _documents(output.get("documents")))
+        ],
+    }
+    return EventSourceResponse(
+        stream_graph(
+            graph,
+            {"question": body.question},
+            metadata,
+            token_node="generate",
+            node_events=node_events,
+        )
+    )
+
+
+@router.post(
+    "/rag",
+    name="stream rag",
+    description="RAG graph as server-sent events: documents, token, end",
+)
+async def stream_rag(body: RagStreamInput):
+    return _stream_rag(rag_graph, "retrieve", body)
+
+
+@router.post(
+    "/crag",
+    name="stream crag",
+    description="Corrective RAG graph as server-sent events: documents (graded), token, end",
+)
+async def stream_crag(body: RagStreamInput):
+    return _stream_rag(crag_graph, "grade_documents", body)
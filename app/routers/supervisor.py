@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Request
+import json
+
+from fastapi import APIRouter, HTTPException, Request
 from langserve import add_routes
 from chains.supervisor.graph import supervisor
 from langfuse.callback import CallbackHandler
 from langchain_core.runnables.config import RunnableConfig
-from utils.pinutils import FakeBot
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+from utils.fleet import BotStatus
 
-from app.globals import bots
+from app.globals import bot_events, fleet
 
 router = APIRouter(
     prefix="/supervisor",
@@ -14,12 +18,15 @@ router = APIRouter(
 )
 
 
-config = RunnableConfig(callbacks=[CallbackHandler()])
+class BotTransition(BaseModel):
+    status: BotStatus
+    # default: all bots
+    bot_ids: list[str] | None = None
+    # only bots with this status
+    where: BotStatus | None = None
 
-red_bot = FakeBot("red")
-yellow_bot = FakeBot("yellow")
-green_bot = FakeBot("green")
 
+config = RunnableConfig(callbacks=[CallbackHandler()])
 
 add_routes(router, supervisor.with_config(config), path="/invoke")
 
@@ -34,22 +41,106 @@ def invoke_supervisor():
 
 @router.get("/start-bots", name="start bots", description="Starts the dummy bots")
 def start_bots():
-    bots.leds[0].blink(1)
-    bots.leds[1].blink(0.75)
-    bots.leds[2].blink(0.5)
+    fleet.transition("idle", where="offline")
 
     return {"output": "started bots"}
 
 
 @router.get("/stop-bots", name="stop bots", description="Stops the dummy bots")
 def stop_bots():
-    bots.leds[0].stop()
-    bots.leds[1].stop()
-    bots.leds[2].stop()
+    fleet.transition("offline")
 
     return {"output": "stopped bots"}
 
 
 @router.get("/get-test_var", name="get-test_var", description="Platzhalter")
 def get_test_var(request: Request):
-    return {"output": request.state.bots.leds[0].pin}
+    return {"output": request.state.fleet.led("red").pin}
+
+
+@router.get(
+    "/bots",
+    name="list bots",
+    description="A page of the bots, optionally only those with the status",
+)
+def list_bots(status: BotStatus | None = None, offset: int = 0, limit: int = 100):
+    return fleet.select(status, offset=offset, limit=limit)
+
+
+@router.get("/bots/counts", name="count bots", description="Number of bots per status")
+def count_bots():
+    return {"total": len(fleet), **fleet.counts()}
+
+
+@router.get("/bots/{bot_id}", name="get bot", description="Status of a bot")
+def get_bot(bot_id: str):
+    try:
+        return fleet.get(bot_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post(
+    "/bots/status",
+    name="set bot status",
+    description="Sets the status of the bots (default: all) in one bulk transition",
+)
+def set_bot_status(transition: BotTransition):
+    try:
+        changed = fleet.transition(
+            transition.status, bot_ids=transition.bot_ids, where=transition.where
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"changed": changed, "counts": fleet.counts()}
+
+
+@router.post(
+    "/bots/simulate",
+    name="simulate bots",
+    description="Adds count simulated bots (sim-00000, sim-00001, ...)",
+)
+def simulate_bots(count: int = 100, status: BotStatus = "offline"):
+    start = len(fleet)
+    added = fleet.add_many(
+        (f"sim-{i:05d}" for i in range(start, start + count)), status
+    )
+    return {"added": added, "total": len(fleet)}
+
+
+@router.get(
+    "/events",
+    name="bot events",
+    description="Status changes of the bots as server-sent events: 'counts' at the start, "
+    "then 'added' and 'status' (coalesced per bot), 'resync' if the client fell behind. "
+    "Reconnects continue after the Last-Event-ID.",
+)
+async def bot_event_stream(request: Request, coalesce: float = 0.1):
+    last_event_id = request.headers.get("last-event-id", "")
+    resume = last_event_id.isdigit()
+
+    async def events():
+        since = int(last_event_id) if resume else bot_events.sequence
+        if not resume:
+            # changes after since are sent again, so the counts are never older than the stream
+            yield {
+                "event": "counts",
+                "id": str(since),
+                "data": json.dumps(fleet.counts()),
+            }
+        async for batch in bot_events.subscribe(since, coalesce=coalesce):
+            for sequence, event in batch:
+                yield {
+                    "event": event["type"],
+                    "id": str(sequence),
+                    "data": json.dumps(event),
+                }
+
+    return EventSourceResponse(events())
+
+
+@router.get(
+    "/events/stats", name="bot event stats", description="Published events, subscribers"
+)
+def bot_event_stats():
+    return bot_events.stats()
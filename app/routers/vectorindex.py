@@ -0,0 +1,93 @@
+from fastapi import APIRouter, HTTPException
+
+from utils.AppSettings import get_settings
+from utils.hybridretriever import ensure_fulltext_index, fulltext_index_name
+from utils.pgindex import Method, create_index, drop_index, list_indexes, rebuild_index
+from utils.retriever import get_engine
+
+settings = get_settings()
+
+router = APIRouter(
+    prefix="/admin/index",
+    tags=["admin"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+def _run(function, *args, **kwargs):
+    try:
+        return function(get_engine(), *args, **kwargs)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get(
+    "",
+    name="list ann indexes",
+    description="ANN indexes (HNSW/IVFFlat) of the collections",
+)
+def get_indexes():
+    return list_indexes(get_engine())
+
+
+# before /{collection_name}, otherwise "fulltext" is taken for a collection
+@router.post(
+    "/fulltext",
+    name="create fulltext index",
+    description="Creates the GIN index of the hybrid search (CONCURRENTLY) if it is missing, "
+    "otherwise it is built on the first hybrid search",
+)
+def post_fulltext_index(ts_config: str = settings.HYBRID_TS_CONFIG):
+    built = _run(ensure_fulltext_index, ts_config)
+    return {
+        "ts_config": ts_config,
+        "index": fulltext_index_name(ts_config),
+        "built": built,
+    }
+
+
+@router.post(
+    "/{collection_name}",
+    name="create ann index",
+    description="Creates (or replaces) the ANN index of a collection. "
+    "hnsw: m, ef_construction; ivfflat: lists (default rows / 1000)",
+)
+def post_index(
+    collection_name: str,
+    method: Method = "hnsw",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int | None = None,
+):
+    return _run(
+        create_index,
+        collection_name,
+        method=method,
+        m=m,
+        ef_construction=ef_construction,
+        lists=lists,
+    )
+
+
+@router.post(
+    "/{collection_name}/rebuild",
+    name="rebuild ann index",
+    description="Rebuilds the ANN index of a collection, e.g. ivfflat after large imports",
+)
+def post_rebuild(collection_name: str):
+    return _run(rebuild_index, collection_name)
+
+
+@router.delete(
+    "/{collection_name}",
+    name="drop ann index",
+    description="Drops the ANN index, the collection is searched exactly again",
+)
+def delete_index(collection_name: str):
+    if not _run(drop_index, collection_name):
+        raise HTTPException(
+            status_code=404, detail=f"No ANN index on '{collection_name}'"
+        )
+    return {"collection_name": collection_name, "dropped": True}
@@ -1,24 +1,37 @@
 import asyncio
 import os
-import random
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from langfuse.callback import CallbackHandler
 from langchain_core.runnables.config import RunnableConfig
 from langserve import add_routes
 from contextlib import asynccontextmanager
-from app.routers import drill_bot, file, supervisor
+from app.routers import drill_bot, file, stream, supervisor, vectorindex
 from chains.rag.graph import graph as rag_graph, InputDict
+from chains.crag.graph import graph as crag_graph
 from chains.chat.chain import chain as chat_chain
-from chains.chat.graph import graph as chat_graph
+from chains.chat.graph import (
+    graph as chat_graph,
+    history as chat_history,
+    session_graph as chat_session_graph,
+    sessions as chat_sessions,
+)
 from utils import AppSettings
+from utils.aiutils import get_embeddings_cache_stats
+from utils.answercache import answer_cache
+from utils.bulkimport import bulk_imports
+from utils.fleet import Fleet
+from utils.importer import import_queue
+from utils.pgutils import pg_init_imports
+from utils.providers import warmup as warmup_providers
+from utils.retriever import vectorstore_health, warmup_vectorstores
 from loguru import logger
 
-from utils.pinutils import GPIOHelper, FakeBot
+from utils.pinutils import GPIOHelper, led_scheduler
 
-from app.globals import bots, Bots
+from app.globals import fleet
 
-settings = AppSettings.AppSettings()
+settings = AppSettings.get_settings()
 
 
 async def print_task(s):
@@ -27,13 +40,52 @@ async def print_task(s):
         await asyncio.sleep(s)
 
 
-async def toggle_fakebots(bots: Bots):
+def resume_imports():
+    try:
+        pg_init_imports()
+        import_queue.resume()
+    except Exception as e:
+        logger.error(f"Could not resume the imports: {e}")
+
+
+async def evict_chat_sessions(interval: float = 60):
     while True:
-        for bot in bots.leds:
-            if random.random() < 0.2:
-                stats = [bot.set_offline, bot.set_idle, bot.set_busy]
-                do_something = random.choice(stats)
-                do_something()
+        await asyncio.sleep(interval)
+        chat_sessions.evict_idle()
+
+
+async def session_config(config: dict, request: Request) -> dict:
+    """thread_id of the chat session from configurable or the header X-Thread-Id.
+    A session that is gone (evicted, or unknown although the header X-Session-Turns
+    counts earlier answers) is answered with 409, unless the chat_history is resent.
+    """
+    configurable = config.setdefault("configurable", {})
+    if not configurable.get("thread_id"):
+        configurable["thread_id"] = request.headers.get("x-thread-id")
+    if not configurable["thread_id"]:
+        raise HTTPException(
+            422, "thread_id fehlt (config.configurable.thread_id oder X-Thread-Id)"
+        )
+    turns = request.headers.get("x-session-turns") or "0"
+    if not turns.isdigit():
+        raise HTTPException(422, f"Ungültiger Header X-Session-Turns: {turns}")
+    turns = int(turns)
+    if chat_sessions.lost(configurable["thread_id"], turns):
+        body = await request.json()
+        inputs = body.get("inputs") or [body.get("input") or {}]
+        if not any(isinstance(i, dict) and i.get("chat_history") for i in inputs):
+            raise HTTPException(
+                409,
+                f"Sitzung {configurable['thread_id']} ist nicht mehr vorhanden, "
+                "bitte den Verlauf (chat_history) erneut senden",
+            )
+    return config
+
+
+async def toggle_fakebots(fleet: Fleet):
+    while True:
+        # every bot gets a random status with a probability of 20 %, in one bulk transition
+        fleet.random_transitions(0.2)
         await asyncio.sleep(10)
 
 
@@ -53,11 +105,26 @@ async def lifespan(app: FastAPI):
 
     GPIOHelper.init()
 
+    # create the vectorstore (pool, embeddings, collection) without blocking the startup
+    asyncio.create_task(asyncio.to_thread(warmup_vectorstores))
+    # before the first request: the imports table needs its columns, and a job queued
+    # by /file/import must not be taken for an interrupted one
+    await asyncio.to_thread(resume_imports)
+    if settings.WARMUP_MODELS:
+        # otherwise the models are built on the first request
+        asyncio.create_task(asyncio.to_thread(warmup_providers))
+
+    asyncio.create_task(evict_chat_sessions())
+
     # asyncio.create_task(print_task(5))
-    asyncio.create_task(toggle_fakebots(bots))
-    yield {"bots": bots}
+    asyncio.create_task(toggle_fakebots(fleet))
+    yield {"fleet": fleet}
 
     ### after the application has finished ###
+    import_queue.shutdown()
+    bulk_imports.shutdown()
+    fleet.shutdown()
+    led_scheduler.shutdown()
     GPIOHelper.cleanup()
     logger.success("Server has shut down.")
 
@@ -95,6 +162,21 @@ def nyi():
     return {"output": "nyi"}
 
 
+@app.get("/health", description="Checks the connection to the vector db")
+def health():
+    return vectorstore_health()
+
+
+@app.get("/metrics", description="Cache statistics")
+def metrics():
+    return {
+        "embedding_cache": get_embeddings_cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "chat_history": chat_history.stats(),
+        "chat_sessions": chat_sessions.stats(),
+    }
+
+
 add_routes(
     app,
     chat_chain,
@@ -107,6 +189,13 @@ add_routes(
     path="/chat_graph",
 )
 
+add_routes(
+    app,
+    chat_session_graph.with_config(config),
+    path="/chat_session",
+    per_req_config_modifier=session_config,
+)
+
 add_routes(
     app,
     rag_graph.with_config(config),
@@ -114,9 +203,18 @@ add_routes(
     input_type=InputDict,
 )
 
+add_routes(
+    app,
+    crag_graph.with_config(config),
+    path="/crag",
+    input_type=InputDict,
+)
+
 app.include_router(supervisor.router)
 app.include_router(drill_bot.router)
 app.include_router(file.router)
+app.include_router(stream.router)
+app.include_router(vectorindex.router)
 
 if __name__ == "__main__":
     import uvicorn
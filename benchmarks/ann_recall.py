@@ -0,0 +1,118 @@
+"""Recall@k and latency of the exact search (PGVector, sequential scan) against the
+ANN indexes of utils.pgindex (HNSW with several ef_search, IVFFlat with several probes).
+
+Writes random clustered vectors into a temporary collection of the vector db (no
+embedding model is called) and removes it afterwards.
+
+    python -m benchmarks.ann_recall --rows 20000 --dims 256 --queries 50 --k 4
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from utils.pgindex import AnnRetriever, create_index, drop_index
+from utils.retriever import get_engine, get_vectorstore
+
+
+def vectors(count: int, centers: list[list[float]], rnd: random.Random):
+    for _ in range(count):
+        center = rnd.choice(centers)
+        yield [value + rnd.gauss(0, 0.3) for value in center]
+
+
+def fill(vectorstore, args, rnd: random.Random) -> list[list[float]]:
+    centers = [
+        [rnd.gauss(0, 1) for _ in range(args.dims)] for _ in range(args.clusters)
+    ]
+    batch = 2000
+    for offset in range(0, args.rows, batch):
+        embeddings = list(vectors(min(batch, args.rows - offset), centers, rnd))
+        vectorstore.add_embeddings(
+            texts=[f"chunk {offset + i}" for i in range(len(embeddings))],
+            embeddings=embeddings,
+        )
+    return list(vectors(args.queries, centers, rnd))
+
+
+def measure(name: str, search, queries, exact: list[set[str]] | None, k: int):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        documents = search(query, k)
+        latencies.append(time.perf_counter() - start)
+        results.append({doc.id for doc in documents})
+    recall = (
+        statistics.mean(len(r & e) / k for r, e in zip(results, exact))
+        if exact
+        else 1.0
+    )
+    latencies.sort()
+    print(
+        f"{name:>22}: recall@{k} {recall:.3f}, "
+        f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms"
+    )
+    return results
+
+
+def main(args):
+    rnd = random.Random(42)
+    engine = get_engine()
+    vectorstore = get_vectorstore(args.collection)
+    try:
+        queries = fill(vectorstore, args, rnd)
+        exact = measure(
+            "exact",
+            lambda query, k: vectorstore.similarity_search_by_vector(query, k=k),
+            queries,
+            None,
+            args.k,
+        )
+
+        start = time.perf_counter()
+        index = create_index(engine, args.collection, "hnsw")
+        print(f"hnsw build {time.perf_counter() - start:.1f}s")
+        for ef_search in args.ef_search:
+            retriever = AnnRetriever(
+                vectorstore=vectorstore, index=index, engine=engine, ef_search=ef_search
+            )
+            measure(
+                f"hnsw ef_search={ef_search}",
+                retriever.search_by_vector,
+                queries,
+                exact,
+                args.k,
+            )
+
+        start = time.perf_counter()
+        index = create_index(engine, args.collection, "ivfflat")
+        print(f"ivfflat build {time.perf_counter() - start:.1f}s ({index['options']})")
+        for probes in args.probes:
+            retriever = AnnRetriever(
+                vectorstore=vectorstore, index=index, engine=engine, probes=probes
+            )
+            measure(
+                f"ivfflat probes={probes}",
+                retriever.search_by_vector,
+                queries,
+                exact,
+                args.k,
+            )
+    finally:
+        drop_index(engine, args.collection)
+        vectorstore.delete_collection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--collection", default="benchmark_ann_recall")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10])
+    main(parser.parse_args())
@@ -0,0 +1,61 @@
+"""Write throughput of the import: PGVector.add_documents (INSERT) against COPY
+(utils.bulkingest), rows per second of the writes only.
+
+Needs the vector db of the .env, the embeddings are fake (no embedding model is called).
+Writes into a temporary collection and removes it afterwards.
+
+    python -m benchmarks.bulk_ingest --rows 5000 --dims 1536 --batch-size 64
+"""
+
+import argparse
+import random
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_postgres.vectorstores import PGVector
+
+from utils.bulkingest import BulkWriter
+from utils.importer import batched
+from utils.retriever import get_engine
+
+WORDS = "Art. Absatz Gesetz Bayern Verordnung Satz Frist Antrag Behörde Recht 12a 3b".split()
+
+
+def chunks(rows: int, rnd: random.Random):
+    for i in range(rows):
+        yield Document(
+            page_content=" ".join(rnd.choice(WORDS) for _ in range(150)),
+            metadata={"source": "benchmark.pdf", "page": i // 10, "import_id": 0},
+        )
+
+
+def run(name: str, args, use_copy: bool):
+    vectorstore = PGVector(
+        embeddings=DeterministicFakeEmbedding(size=args.dims),
+        collection_name=f"{args.collection}_{name}",
+        connection=get_engine(),
+        use_jsonb=True,
+    )
+    try:
+        writer = BulkWriter(vectorstore, use_copy=use_copy)
+        for batch in batched(chunks(args.rows, random.Random(42)), args.batch_size):
+            writer.write(batch)
+        stats = writer.stats()
+        print(
+            f"{name:>6} ({stats['mode']}): {stats['rows']} rows, "
+            f"writing {stats['write_seconds']:.2f}s, {stats['rows_per_second']} rows/s"
+        )
+    finally:
+        vectorstore.delete_collection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--collection", default="benchmark_bulk_ingest")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    run("insert", args, use_copy=False)
+    run("copy", args, use_copy=True)
@@ -0,0 +1,100 @@
+"""Prompt tokens and latency of long chat sessions: the whole history (as before)
+against the history manager (window + incremental summary).
+
+Runs without LLM: the answers and summaries are random text, the latency of the
+model is estimated per prompt token and per generated token (measure them on the Pi
+with a few real calls and pass them).
+
+    python -m benchmarks.chat_history --turns 50 --max-tokens 1536 --num-ctx 2048
+"""
+
+import argparse
+import random
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from utils.history import HistoryManager, count_tokens
+
+WORDS = "Art. Absatz Gesetz Bayern Verordnung Satz Frist Antrag Behörde Recht Zuständigkeit Gemeinde".split()
+
+
+def text(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(words))
+
+
+class Costs:
+    def __init__(self, prompt_ms: float, output_ms: float):
+        self.prompt_ms = prompt_ms
+        self.output_ms = output_ms
+        self.seconds = 0.0
+
+    def add(self, prompt_tokens: int, output_tokens: int):
+        self.seconds += (
+            prompt_tokens * self.prompt_ms + output_tokens * self.output_ms
+        ) / 1000
+
+
+def run(args, compact: bool):
+    rnd = random.Random(42)
+    costs = Costs(args.prompt_ms, args.output_ms)
+
+    def summarize(input: dict) -> str:
+        messages = input["messages"]
+        costs.add(count_tokens(messages) + 100, 200)
+        return text(rnd, 150)
+
+    history = HistoryManager(
+        lambda: RunnableLambda(summarize), max_tokens=args.max_tokens
+    )
+    messages = []
+    rows = []
+    overhead = 0.0
+    for turn in range(1, args.turns + 1):
+        messages.append(HumanMessage(content=text(rnd, args.question_words)))
+        start = time.perf_counter()
+        prompt = history.compact(messages, "benchmark") if compact else messages
+        overhead += time.perf_counter() - start
+        prompt_tokens = count_tokens(prompt)
+        answer = text(rnd, args.answer_words)
+        costs.add(prompt_tokens, count_tokens([AIMessage(content=answer)]))
+        messages.append(AIMessage(content=answer))
+        rows.append((turn, prompt_tokens, costs.seconds))
+    return rows, history.stats(), overhead
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--max-tokens", type=int, default=1536)
+    parser.add_argument("--num-ctx", type=int, default=2048)
+    parser.add_argument("--question-words", type=int, default=25)
+    parser.add_argument("--answer-words", type=int, default=120)
+    parser.add_argument(
+        "--prompt-ms", type=float, default=2.0, help="ms per prompt token"
+    )
+    parser.add_argument(
+        "--output-ms", type=float, default=60.0, help="ms per generated token"
+    )
+    args = parser.parse_args()
+
+    full, _, _ = run(args, compact=False)
+    compacted, stats, overhead = run(args, compact=True)
+
+    print(f"{'turn':>4} {'full':>8} {'compact':>8}  prompt tokens")
+    for (turn, full_tokens, _), (_, compact_tokens, _) in zip(full, compacted):
+        if turn == 1 or turn % 5 == 0:
+            print(f"{turn:>4} {full_tokens:>8} {compact_tokens:>8}")
+    over = sum(1 for _, tokens, _ in full if tokens > args.num_ctx)
+    print(
+        f"full history: {over} of {args.turns} prompts longer than num_ctx {args.num_ctx}"
+    )
+    print(
+        f"estimated model time: full {full[-1][2]:.0f}s, "
+        f"compact {compacted[-1][2]:.0f}s (incl. {stats['summaries']} summaries)"
+    )
+    print(
+        f"history manager: {overhead * 1000:.1f}ms for {args.turns} turns, "
+        f"{stats['summarized_messages']} messages summarized, {stats['hits']} cache hits"
+    )
@@ -0,0 +1,50 @@
+"""Corrective RAG (/crag) against the plain RAG graph (/rag): latency and size of the
+generation prompt (the graded documents are dropped before the generation).
+Needs the vector db and the LLM configured in the .env, the answer cache is not used.
+
+    python -m benchmarks.crag_vs_rag --question "Was regelt Art. 1?" --question "Wer ist zuständig?"
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from chains.core.chains import format_document_context, rag_chain_prompt
+from chains.crag.graph import graph as crag_graph
+from chains.rag.graph import graph as rag_graph
+
+
+def prompt_size(result: dict) -> int:
+    context = format_document_context({"context": result.get("documents") or []})
+    return len(rag_chain_prompt.format(question=result["question"], context=context))
+
+
+async def run(name: str, graph, questions: list[str], repeat: int):
+    latencies, sizes, documents = [], [], []
+    config = {"metadata": {"answer_cache": False}}
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            result = await graph.ainvoke({"question": question}, config)
+            latencies.append(time.perf_counter() - start)
+            sizes.append(prompt_size(result))
+            documents.append(len(result.get("documents") or []))
+    print(
+        f"{name:>4}: p50 {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s, "
+        f"{statistics.mean(documents):.1f} documents, "
+        f"prompt {statistics.mean(sizes):.0f} chars (~{statistics.mean(sizes) / 4:.0f} tokens)"
+    )
+
+
+async def main(args):
+    questions = args.question or ["Was regelt Art. 1?"]
+    await run("rag", rag_graph, questions, args.repeat)
+    await run("crag", crag_graph, questions, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--question", action="append")
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
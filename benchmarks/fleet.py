@@ -0,0 +1,120 @@
+"""Fleet registry: one Python object per bot with a status attribute (like the former
+FakeBot, without the LEDs) against the Fleet with NumPy columns.
+
+    python -m benchmarks.fleet --bots 10000 --repeat 20
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from utils.fleet import Fleet, statuses
+
+
+class ObjectBot:
+    __slots__ = ("id", "status", "since")
+
+    def __init__(self, bot_id: str):
+        self.id = bot_id
+        self.status = "offline"
+        self.since = time.time()
+
+    def set_status(self, status: str):
+        if status != self.status:
+            self.status = status
+            self.since = time.time()
+
+
+def timed(function, repeat: int) -> float:
+    """Best of repeat runs in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_objects(ids: list[str], repeat: int) -> dict:
+    bots: dict[str, ObjectBot] = {}
+    rnd = random.Random(42)
+
+    def add():
+        bots.clear()
+        bots.update((bot_id, ObjectBot(bot_id)) for bot_id in ids)
+
+    def transitions():
+        for bot in bots.values():
+            if rnd.random() < 0.2:
+                bot.set_status(rnd.choice(statuses))
+
+    def counts():
+        result = dict.fromkeys(statuses, 0)
+        for bot in bots.values():
+            result[bot.status] += 1
+        return result
+
+    def select():
+        idle = [bot for bot in bots.values() if bot.status == "idle"]
+        return len(idle), [
+            {"id": bot.id, "status": bot.status, "since": bot.since}
+            for bot in idle[:100]
+        ]
+
+    def bulk():
+        for bot in bots.values():
+            if bot.status == "busy":
+                bot.set_status("idle")
+
+    def lookup():
+        for bot_id in ids[:1000]:
+            bots[bot_id].status
+
+    return {
+        "add": timed(add, repeat),
+        "random transitions": timed(transitions, repeat),
+        "counts": timed(counts, repeat),
+        "select idle (page 100)": timed(select, repeat),
+        "busy -> idle": timed(bulk, repeat),
+        "1000 lookups": timed(lookup, repeat),
+    }
+
+
+def bench_fleet(ids: list[str], repeat: int) -> dict:
+    fleet = Fleet()
+    rng = np.random.default_rng(42)
+
+    def add():
+        nonlocal fleet
+        fleet = Fleet()
+        fleet.add_many(ids)
+
+    add()
+    return {
+        "add": timed(add, repeat),
+        "random transitions": timed(lambda: fleet.random_transitions(0.2, rng), repeat),
+        "counts": timed(fleet.counts, repeat),
+        "select idle (page 100)": timed(lambda: fleet.select("idle"), repeat),
+        "busy -> idle": timed(lambda: fleet.transition("idle", where="busy"), repeat),
+        "1000 lookups": timed(lambda: [fleet.status(i) for i in ids[:1000]], repeat),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bots", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ids = [f"sim-{i:05d}" for i in range(args.bots)]
+    objects = bench_objects(ids, args.repeat)
+    fleet = bench_fleet(ids, args.repeat)
+    print(f"{args.bots} bots, best of {args.repeat}, milliseconds")
+    print(f"{'':>24} {'objects':>10} {'fleet':>10}")
+    for name in objects:
+        print(
+            f"{name:>24} {objects[name]:>10.3f} {fleet[name]:>10.3f}"
+            f" {objects[name] / fleet[name]:>6.1f}x"
+        )
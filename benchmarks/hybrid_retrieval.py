@@ -0,0 +1,102 @@
+"""Recall@k and latency of the vector search against the hybrid search (vector +
+full-text, search_kwargs {"search_type": "hybrid"}) on a local fixture corpus.
+
+The corpus are synthetic articles of a law ("Art. 12 ..."), the questions ask for an
+article number or a rare term, as users of the RAG do. It is written into a
+temporary collection of the vector db (embeddings of the .env) and removed afterwards.
+
+    python -m benchmarks.hybrid_retrieval --articles 200 --questions 50 --k 4
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from utils.retriever import get_async_retriever, get_vectorstore
+
+WORDS = (
+    "Antrag Behörde Frist Gemeinde Zuständigkeit Verfahren Bescheid Gebühr Landkreis "
+    "Anhörung Genehmigung Aufsicht Satzung Verordnung Erlaubnis Pflicht Nachweis"
+).split()
+TERMS = (
+    "Almweide Fischereirecht Denkmalschutz Feuerbeschau Kaminkehrer Wasserentnahme "
+    "Bodenschätze Jagdpacht Schankerlaubnis Lärmschutz Hochwassermeldung Baumschutz"
+).split()
+
+
+def fixture(articles: int, rnd: random.Random) -> list[Document]:
+    documents = []
+    for number in range(1, articles + 1):
+        term = TERMS[number % len(TERMS)]
+        words = " ".join(rnd.choice(WORDS) for _ in range(60))
+        documents.append(
+            Document(
+                page_content=f"Art. {number} {term}{number}\n{words}",
+                metadata={"article": number},
+            )
+        )
+    return documents
+
+
+def questions(articles: int, count: int, rnd: random.Random) -> list[tuple[str, int]]:
+    result = []
+    for i in range(count):
+        number = rnd.randint(1, articles)
+        term = TERMS[number % len(TERMS)]
+        if i % 2:
+            result.append((f"Was regelt Art. {number}?", number))
+        else:
+            result.append((f"Welche Vorschrift gilt für {term}{number}?", number))
+    return result
+
+
+async def run(name: str, search_kwargs: dict, collection: str, qa, repeat: int):
+    retriever = get_async_retriever(
+        search_kwargs=search_kwargs, collection_name=collection
+    )
+    hits, latencies = 0, []
+    for _ in range(repeat):
+        for question, article in qa:
+            start = time.perf_counter()
+            documents = await retriever.ainvoke(question)
+            latencies.append(time.perf_counter() - start)
+            hits += any(doc.metadata.get("article") == article for doc in documents)
+    latencies.sort()
+    print(
+        f"{name:>6}: recall@{search_kwargs['k']} {hits / (len(qa) * repeat):.2f}, "
+        f"p50 {statistics.median(latencies) * 1000:.1f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms"
+    )
+
+
+async def main(args):
+    rnd = random.Random(42)
+    vectorstore = get_vectorstore(args.collection)
+    vectorstore.add_documents(fixture(args.articles, rnd))
+    try:
+        qa = questions(args.articles, args.questions, rnd)
+        await run("vector", {"k": args.k}, args.collection, qa, args.repeat)
+        await run(
+            "hybrid",
+            {"search_type": "hybrid", "k": args.k, "fetch_k": args.fetch_k},
+            args.collection,
+            qa,
+            args.repeat,
+        )
+    finally:
+        vectorstore.delete_collection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--collection", default="benchmark_hybrid_retrieval")
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""Memory and throughput of the import pipeline: eager (load -> split -> one add_documents)
+against streaming (lazy_load -> split per page -> batched add_documents).
+
+Runs without database and LLM: fake embeddings and an in-memory vectorstore.
+
+    python -m benchmarks.import_pipeline --pages 500 --format pdf
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from utils.aiutils import get_splitter
+from utils.importer import get_loader, import_documents, iter_chunks
+
+WORDS = "Art. Absatz Gesetz Bayern Verordnung Satz Frist Antrag Behörde Recht 12a 3b".split()
+
+
+def random_line(rnd: random.Random) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(12))
+
+
+def write_txt(path: str, pages: int, lines_per_page: int = 45):
+    rnd = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(pages * lines_per_page):
+            f.write(random_line(rnd) + "\n")
+
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 45):
+    """Minimal PDF with one text stream per page (Helvetica, latin-1)."""
+    rnd = random.Random(42)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # pages, written below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = [random_line(rnd) for _ in range(lines_per_page)]
+        text = " T* ".join(f"({line})Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text} ET".encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for i, obj in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (i, obj))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(objects) + 1, xref)
+        )
+
+
+def eager(path: str) -> int:
+    pages = get_loader(path).load()
+    doc_splits = get_splitter("recursive").split_documents(pages)
+    vectorstore = InMemoryVectorStore(DeterministicFakeEmbedding(size=1024))
+    return len(vectorstore.add_documents(doc_splits))
+
+
+def streaming(path: str, batch_size: int) -> int:
+    chunks = iter_chunks(get_loader(path).lazy_load(), get_splitter("recursive"))
+    # the in-memory store keeps every vector, drop them so only the pipeline is measured
+    vectorstore = InMemoryVectorStore(DeterministicFakeEmbedding(size=1024))
+    count = 0
+
+    def on_batch(done: int):
+        nonlocal count
+        count = done
+        vectorstore.store.clear()
+
+    import_documents(chunks, vectorstore, batch_size=batch_size, on_batch=on_batch)
+    return count
+
+
+def measure(name: str, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:>9}: {chunks} chunks in {seconds:.1f}s ({chunks / seconds:.0f} chunks/s), "
+        f"peak {peak / 2**20:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--format", choices=["pdf", "txt"], default="pdf")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"synthetic.{args.format}")
+        (write_pdf if args.format == "pdf" else write_txt)(path, args.pages)
+        print(f"{path}: {os.path.getsize(path) / 2**20:.1f} MiB, {args.pages} pages")
+        measure("eager", eager, path)
+        measure("streaming", streaming, path, args.batch_size)
@@ -0,0 +1,84 @@
+"""LED blinking with the simulated GPIO: one thread per LED (time.sleep, as Led.blink
+did before) against the LedScheduler (one thread, writes batched per tick).
+
+Reports the jitter of the blink intervals (time between two writes of a pin minus
+the interval), the writes per second and the number of GPIO calls.
+
+    python -m benchmarks.led_scheduler --leds 1000 --interval 0.05 --seconds 5
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from utils.gpiobackend import SimBackend
+from utils.pinutils import Led, LedScheduler
+
+
+def run_threads(backend: SimBackend, pins: list[int], interval: float, seconds: float):
+    running = True
+
+    def blink(pin: int):
+        value = False
+        while running:
+            value = not value
+            backend.output([pin], [value])
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=blink, args=(pin,), daemon=True) for pin in pins]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    running = False
+    for thread in threads:
+        thread.join()
+    return len(threads)
+
+
+def run_scheduler(
+    backend: SimBackend, pins: list[int], interval: float, seconds: float
+):
+    scheduler = LedScheduler(backend)
+    leds = [Led("sim", pin=pin, scheduler=scheduler) for pin in pins]
+    for led in leds:
+        led.blink(interval)
+    time.sleep(seconds)
+    for led in leds:
+        scheduler.stop(led)
+    scheduler.shutdown()
+    return 1
+
+
+def report(name: str, backend: SimBackend, interval: float, seconds: float, threads):
+    writes = np.array([(t, pin) for t, pin, _ in backend.writes])
+    jitter = []
+    for pin in np.unique(writes[:, 1]):
+        times = writes[writes[:, 1] == pin, 0]
+        jitter.append(np.abs(np.diff(times) - interval))
+    jitter = np.concatenate(jitter) * 1000
+    print(
+        f"{name:>9}: {threads} threads, {len(writes) / seconds:,.0f} writes/s, "
+        f"{backend.calls / seconds:,.0f} GPIO calls/s, jitter mean {jitter.mean():.2f} ms, "
+        f"p99 {np.percentile(jitter, 99):.2f} ms, max {jitter.max():.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--leds", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--mode", choices=["threads", "scheduler", "both"], default="both"
+    )
+    args = parser.parse_args()
+
+    pins = list(range(args.leds))
+    modes = ["threads", "scheduler"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        backend = SimBackend()
+        run = run_threads if mode == "threads" else run_scheduler
+        threads = run(backend, pins, args.interval, args.seconds)
+        report(mode, backend, args.interval, args.seconds, threads)
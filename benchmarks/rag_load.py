@@ -0,0 +1,79 @@
+"""Load test for the RAG graph: concurrent throughput of the sync and the async path.
+
+The sync path runs graph.invoke in a thread pool (like a sync FastAPI endpoint,
+the default pool of anyio has 40 threads), the async path runs graph.ainvoke
+on the event loop (like LangServe).
+Needs the vector db and the LLM configured in the .env.
+
+    python -m benchmarks.rag_load --requests 50 --concurrency 25 --mode both
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chains.rag.graph import graph as rag_graph
+
+
+def report(mode: str, latencies: list[float], total: float):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(
+        f"{mode:>5}: {len(latencies)} requests in {total:.1f}s "
+        f"-> {len(latencies) / total:.2f} req/s, "
+        f"p50 {statistics.median(latencies):.2f}s, p95 {p95:.2f}s"
+    )
+
+
+async def run_sync(questions: list[str], workers: int):
+    loop = asyncio.get_running_loop()
+    latencies = []
+
+    def call(question: str):
+        start = time.perf_counter()
+        rag_graph.invoke({"question": question})
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        await asyncio.gather(
+            *(loop.run_in_executor(executor, call, q) for q in questions)
+        )
+    report("sync", latencies, time.perf_counter() - start)
+
+
+async def run_async(questions: list[str], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call(question: str):
+        async with semaphore:
+            start = time.perf_counter()
+            await rag_graph.ainvoke({"question": question})
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(q) for q in questions))
+    report("async", latencies, time.perf_counter() - start)
+
+
+async def main(args):
+    questions = [f"{args.question} ({i})" for i in range(args.requests)]
+    if args.mode in ("sync", "both"):
+        await run_sync(questions, min(args.workers, args.concurrency))
+    if args.mode in ("async", "both"):
+        await run_async(questions, args.concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument(
+        "--workers", type=int, default=40, help="thread pool size of the sync path"
+    )
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--question", default="Was regelt Art. 1?")
+    asyncio.run(main(parser.parse_args()))
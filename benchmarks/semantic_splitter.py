@@ -0,0 +1,112 @@
+"""Semantic splitting: langchain_experimental's SemanticChunker (page by page, as the
+import used it) against BatchedSemanticChunker (sentences embedded once, in batches).
+
+Without --real the embeddings are fake with a simulated latency per call and per text
+(measure them with a few real calls and pass them), with --real the configured
+embedding model is called (without the persistent cache).
+
+    python -m benchmarks.semantic_splitter --pages 100 --call-ms 80 --text-ms 2
+    python -m benchmarks.semantic_splitter --file ./data/upload/BayBG.pdf --real
+"""
+
+import argparse
+import random
+import time
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+
+from utils import aiutils
+from utils.importer import get_loader
+from utils.semanticsplitter import BatchedSemanticChunker
+
+WORDS = "Art. Absatz Gesetz Bayern Verordnung Satz Frist Antrag Behörde Recht Gemeinde Zuständigkeit".split()
+
+
+class CountingEmbeddings(Embeddings):
+    """Counts calls and texts, sleeps call_ms per call and text_ms per text."""
+
+    def __init__(self, embeddings: Embeddings, call_ms: float = 0, text_ms: float = 0):
+        self.embeddings = embeddings
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self.calls = 0
+        self.texts = 0
+        self.chars = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        self.chars += sum(len(text) for text in texts)
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def synthetic_pages(pages: int, sentences: int) -> list[Document]:
+    rnd = random.Random(42)
+    return [
+        Document(
+            page_content=" ".join(
+                " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(6, 20))) + "."
+                for _ in range(sentences)
+            ),
+            metadata={"page": page},
+        )
+        for page in range(pages)
+    ]
+
+
+def run(name: str, split, embeddings: CountingEmbeddings, pages: list[Document]):
+    start = time.perf_counter()
+    chunks = split(pages)
+    seconds = time.perf_counter() - start
+    print(
+        f"{name:>8}: {seconds:.2f}s, {len(chunks)} chunks, {embeddings.calls} embedding calls, "
+        f"{embeddings.texts} texts ({embeddings.chars / 1000:.0f}k chars) embedded"
+    )
+    return [chunk.page_content for chunk in chunks]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--sentences", type=int, default=30, help="per synthetic page")
+    parser.add_argument("--real", action="store_true")
+    parser.add_argument("--call-ms", type=float, default=80.0)
+    parser.add_argument("--text-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    pages = (
+        list(get_loader(args.file).lazy_load())
+        if args.file
+        else synthetic_pages(args.pages, args.sentences)
+    )
+
+    def embeddings() -> CountingEmbeddings:
+        if args.real:
+            return CountingEmbeddings(aiutils._create_embeddingsmodel())
+        return CountingEmbeddings(
+            DeterministicFakeEmbedding(size=1024), args.call_ms, args.text_ms
+        )
+
+    old_embeddings, new_embeddings = embeddings(), embeddings()
+    old = SemanticChunker(old_embeddings, breakpoint_threshold_type="percentile")
+    new = BatchedSemanticChunker(new_embeddings, breakpoint_threshold_type="percentile")
+    old_chunks = run(
+        "semantic",
+        # the import split page by page
+        lambda pages: [doc for page in pages for doc in old.split_documents([page])],
+        old_embeddings,
+        pages,
+    )
+    new_chunks = run("batched", new.split_documents, new_embeddings, pages)
+    same = len(set(old_chunks) & set(new_chunks))
+    print(
+        f"{same} of {len(old_chunks)} chunks identical"
+        + ("" if args.real else " (fake embeddings: the breakpoints are random)")
+    )
@@ -0,0 +1,70 @@
+"""Startup report: import times of app.server (python -X importtime) and the
+time from starting uvicorn until the first request is answered.
+
+    python -m benchmarks.startup --top 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def import_report(top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.server"],
+        capture_output=True,
+        text=True,
+        env=os.environ,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+
+    total = max(rows)[0] if rows else 0
+    print(f"import app.server: {total / 1e6:.2f}s")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1e3:10.0f}ms {self_us / 1e3:8.0f}ms {module}")
+
+
+def first_request(port: int, path: str, timeout: float):
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.server:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}{path}")
+                print(
+                    f"time to first request ({path} -> {response.status_code}): "
+                    f"{time.perf_counter() - start:.2f}s"
+                )
+                return
+            except httpx.TransportError:
+                time.sleep(0.05)
+        print(f"no response within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/nyi")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    import_report(args.top)
+    first_request(args.port, args.path, args.timeout)
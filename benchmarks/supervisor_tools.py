@@ -0,0 +1,98 @@
+"""Supervisor tool calls: a scripted fake chat model requests several agent calls in one
+turn (some of them identical), the agents are fake sub-graphs with a latency.
+Compares serial execution, parallel execution with a concurrency cap and parallel
+execution with the per-turn memoization of build_supervisor.
+
+    python -m benchmarks.supervisor_tools --latency 0.5 --calls 6 --distinct 3
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from chains.supervisor.graph import build_supervisor
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Requests tool_calls in the first turn, answers after the tool results."""
+
+    tool_calls: list[dict]
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args, **kwargs) -> ChatResult:
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content="fertig")
+        else:
+            message = AIMessage(content="", tool_calls=self.tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def fake_agents(latency: float) -> tuple[list, dict]:
+    invocations = {"agent_archive": 0, "agent_2": 0}
+
+    @tool
+    async def agent_archive(question: str) -> str:
+        """Beantwortet eine Frage mit den Dokumenten des Archivs."""
+        invocations["agent_archive"] += 1
+        await asyncio.sleep(latency)
+        return f"Antwort auf {question}"
+
+    @tool
+    async def agent_2(question: str) -> str:
+        """Platzhalter für einen weiteren Agenten."""
+        invocations["agent_2"] += 1
+        await asyncio.sleep(latency)
+        return "das ist alles nur gefaket"
+
+    return [agent_archive, agent_2], invocations
+
+
+async def run(name: str, tool_calls: list[dict], latency: float, **kwargs):
+    agent_tools, invocations = fake_agents(latency)
+    supervisor = build_supervisor(
+        ScriptedChatModel(tool_calls=tool_calls), agent_tools, **kwargs
+    )
+    start = time.perf_counter()
+    result = await supervisor.ainvoke({"messages": [HumanMessage("Frage")]})
+    seconds = time.perf_counter() - start
+    answers = sum(isinstance(m, ToolMessage) for m in result["messages"])
+    print(
+        f"{name:>16}: {seconds:.2f}s, {answers} tool results, "
+        f"{sum(invocations.values())} sub-graph calls"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5, help="per agent call")
+    parser.add_argument("--calls", type=int, default=6, help="tool calls in the turn")
+    parser.add_argument("--distinct", type=int, default=3, help="different questions")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    tool_calls = [
+        {
+            "name": "agent_2" if i % 4 == 3 else "agent_archive",
+            "args": {"question": f"Frage {i % args.distinct}"},
+            "id": f"call_{i}",
+        }
+        for i in range(args.calls)
+    ]
+    for name, kwargs in [
+        ("serial", {"max_concurrency": 1, "memoize": False}),
+        ("parallel", {"max_concurrency": args.concurrency, "memoize": False}),
+        ("parallel + memo", {"max_concurrency": args.concurrency, "memoize": True}),
+    ]:
+        asyncio.run(run(name, tool_calls, args.latency, **kwargs))
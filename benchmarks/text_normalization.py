@@ -0,0 +1,124 @@
+"""Text normalization: the old beautify after splitting (re.sub on every chunk, line breaks
+removed) against the TextNormalizer applied once per page before splitting.
+
+The synthetic pages look like PDF pages: short lines, words hyphenated at the line end,
+"Art." paragraphs and numbers glued to words.
+
+    python -m benchmarks.text_normalization --pages 500 --lines 60
+    python -m benchmarks.text_normalization --file ./data/upload/BayBG.pdf
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from utils.aiutils import get_splitter
+from utils.AppSettings import get_settings
+from utils.importer import get_loader, iter_chunks
+from utils.textnorm import get_normalizer
+
+settings = get_settings()
+
+WORDS = "Absatz Gesetz Bayern Verordnung Satz Frist Antrag Behörde Recht Gemeinde Zuständigkeit Verwaltung".split()
+
+
+def synthetic_pages(pages: int, lines: int) -> list[Document]:
+    rnd = random.Random(42)
+
+    def line() -> str:
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(6, 12))]
+        if rnd.random() < 0.2:
+            words.append(f"{rnd.randint(1, 99)}Monate")
+        text = " ".join(words)
+        if rnd.random() < 0.3:
+            # hyphenated at the line end
+            word = rnd.choice(WORDS).lower()
+            text += f" {word[:4]}-\n{word[4:]}"
+        return text
+
+    def page() -> str:
+        parts = []
+        for i in range(lines):
+            if i % 15 == 0:
+                parts.append(f"\nArt. {rnd.randint(1, 200)}\n")
+            parts.append(line() + ("  \n" if rnd.random() < 0.1 else "\n"))
+        return "".join(parts)
+
+    return [Document(page_content=page(), metadata={"page": i}) for i in range(pages)]
+
+
+def split_old(pages: list[Document], splitter) -> list[Document]:
+    """The import before: split page by page, then beautify every chunk."""
+    chunks = [doc for page in pages for doc in splitter.split_documents([page])]
+    for doc in chunks:
+        doc.page_content = re.sub(
+            r"(\d)([a-zA-Z])", r"\1 \2", doc.page_content.replace("\n", "")
+        )
+    return chunks
+
+
+def split_new(pages: list[Document], splitter) -> list[Document]:
+    return list(iter_chunks(pages, splitter, set_page=False))
+
+
+def copy(pages: list[Document]) -> list[Document]:
+    return [
+        Document(page_content=p.page_content, metadata=dict(p.metadata)) for p in pages
+    ]
+
+
+def run(
+    name: str, split, pages: list[Document], splitter, repeat: int
+) -> list[Document]:
+    size = sum(len(page.page_content) for page in pages)
+    times = []
+    for _ in range(repeat):
+        # the new path changes the pages in place
+        data = copy(pages)
+        start = time.perf_counter()
+        chunks = split(data, splitter)
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+    lengths = [len(chunk.page_content) for chunk in chunks]
+    print(
+        f"{name:>4}: {seconds:.3f}s, {size / 2**20 / seconds:.1f} MB/s, {len(chunks)} chunks, "
+        f"chunk size median {statistics.median(lengths):.0f} / max {max(lengths)} "
+        f"(CHUNK_SIZE {settings.CHUNK_SIZE})"
+    )
+    return chunks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=60, help="per synthetic page")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = (
+        list(get_loader(args.file).lazy_load())
+        if args.file
+        else synthetic_pages(args.pages, args.lines)
+    )
+    splitter = get_splitter("recursive")
+    size = sum(len(page.page_content) for page in pages)
+    print(
+        f"{len(pages)} pages, {size / 2**20:.1f} MB, rules: {settings.TEXT_NORMALIZATION}"
+    )
+
+    normalize = get_normalizer()
+    start = time.perf_counter()
+    for page in pages:
+        normalize(page.page_content)
+    seconds = time.perf_counter() - start
+    print(f"normalization only: {seconds:.3f}s, {size / 2**20 / seconds:.1f} MB/s")
+
+    old = run("old", split_old, pages, splitter, args.repeat)
+    new = run("new", split_new, pages, splitter, args.repeat)
+    hyphenated = sum(len(re.findall(r"\w-\w", chunk.page_content)) for chunk in old)
+    print(f"old chunks with hyphenated words left: {hyphenated}")
@@ -1,13 +1,26 @@
+from typing_extensions import TypedDict
+
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables.config import RunnableConfig
 from langfuse.callback import CallbackHandler
 
 from utils.aiutils import get_chatmodel
+from utils.providers import lazy_runnable, provider
 
-model = get_chatmodel()
 _prompt = ChatPromptTemplate.from_template("Question: {text}")
 
-_chain = _prompt | model | StrOutputParser()
+
+class ChatInput(TypedDict):
+    text: str
+
+
+@provider("chat_chain")
+def _chat_chain():
+    return _prompt | get_chatmodel() | StrOutputParser()
+
+
+# the model is built on the first request
+_chain = lazy_runnable("chat_chain", input_type=ChatInput)
 chain = _chain.with_config(RunnableConfig(callbacks=[CallbackHandler()]))
 breakpoint = "here"
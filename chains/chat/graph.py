@@ -1,8 +1,10 @@
+import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # from typing_extensions import Annotated, TypedDict, List
 from typing import Annotated, NotRequired, TypedDict
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import retry, stop_after_attempt, wait_exponential, wait_fixed
 from langchain_core.messages import AIMessage, HumanMessage, AnyMessage
 from langchain_core.runnables.config import RunnableConfig
 from langgraph.graph.message import add_messages
@@ -16,7 +18,34 @@ from chains.core.chains import (
     patch_config,
 )
 
-from utils.aiutils import get_chatmodel
+from utils.aiutils import get_chatmodel_for_config
+from utils.AppSettings import get_settings
+from utils.history import HistoryManager
+from utils.providers import get
+from utils.sessions import SessionSaver
+
+settings = get_settings()
+
+# the chat history is kept within the token budget, older messages are summarized
+history = HistoryManager(
+    lambda: get("summary_chain"),
+    max_tokens=settings.HISTORY_MAX_TOKENS,
+    keep_messages=settings.HISTORY_KEEP_MESSAGES,
+    max_sessions=settings.HISTORY_MAX_SESSIONS,
+)
+
+# server side chat histories of the session_graph
+sessions = SessionSaver(
+    max_sessions=settings.CHAT_SESSIONS_MAX, ttl=settings.CHAT_SESSION_TTL
+)
+
+# the sync further questions run here, so the graph can stop waiting after the time budget
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="further_questions")
+
+
+def add_chat_history(left: list[AnyMessage], right: list[AnyMessage] | None):
+    # LangServe sends chat_history None, if the client sends only the input
+    return add_messages(left, right if right is not None else [])
 
 
 # TODO: creates UserWarning: typing.NotRequired is not a Python type
@@ -24,7 +53,7 @@ from utils.aiutils import get_chatmodel
 # and pydantic.SkipValidation not working
 class InputDict(TypedDict):
     input: str
-    chat_history: Annotated[NotRequired[list[AnyMessage]], add_messages]
+    chat_history: Annotated[NotRequired[list[AnyMessage]], add_chat_history]
 
 
 class GraphState(TypedDict):
@@ -36,7 +65,7 @@ class GraphState(TypedDict):
     """
 
     input: str
-    chat_history: Annotated[list[AnyMessage], add_messages]
+    chat_history: Annotated[list[AnyMessage], add_chat_history]
     generation: str
     further_questions: list[str]
 
@@ -47,61 +76,203 @@ def create_chat_history(state: InputDict):
     if not state.get("input", ""):
         raise ValueError("Aufruf ohne Key 'input' oder leer")
 
-    if state.get("chat_history", []):
-        history = state["chat_history"] + [HumanMessage(content=state["input"])]
-    else:
-        history = [HumanMessage(content=state["input"])]
-    return {"chat_history": history}
+    # add_messages appends the question to the history of the input or of the session
+    return {"chat_history": [HumanMessage(content=state["input"])]}
+
+
+def is_session(config: RunnableConfig) -> bool:
+    return bool(config.get("configurable", {}).get("thread_id"))
+
+
+def answer(output: AIMessage, config: RunnableConfig) -> dict:
+    # the session keeps the answer for the next turn, without session the client sends the history
+    if is_session(config):
+        return {
+            "generation": output.content,
+            "chat_history": [AIMessage(content=output.content)],
+        }
+    return {"generation": output.content}
+
+
+def get_session_id(config: RunnableConfig) -> str | None:
+    return config.get("metadata", {}).get("session_id") or config.get(
+        "configurable", {}
+    ).get("thread_id")
+
+
+def compact_history(state: GraphState, config: RunnableConfig) -> list[AnyMessage]:
+    return history.compact(state["chat_history"], get_session_id(config), config)
+
+
+async def acompact_history(
+    state: GraphState, config: RunnableConfig
+) -> list[AnyMessage]:
+    return await history.acompact(state["chat_history"], get_session_id(config), config)
 
 
 @logger.catch(reraise=True)
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(5))
 def generate(state: GraphState, config: RunnableConfig):
-    model = get_chatmodel().with_config(patch_config(config))
-    output = model.invoke(state["chat_history"])
-    return {"generation": output.content}
+    config = patch_config(config)
+    model = get_chatmodel_for_config(config).with_config(config)
+    output = model.invoke(compact_history(state, config))
+    return answer(output, config)
+
+
+# the config is passed to the model, so the tokens arrive in astream_events while they are generated
+@logger.catch(reraise=True)
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8))
+async def agenerate(state: GraphState, config: RunnableConfig):
+    config = patch_config(config)
+    model = get_chatmodel_for_config(config)
+    output = await model.ainvoke(await acompact_history(state, config), config)
+    return answer(output, config)
+
+
+def get_further_questions_chain(config: RunnableConfig):
+    model = get_chatmodel_for_config(config, use_ollama_json_format=True)
+    return (
+        further_q_prompt
+        | model.with_structured_output(FurtherQuestions)
+        | RunnableLambda(further_q_parser)
+    )
+
+
+def further_questions_enabled(config: RunnableConfig) -> bool:
+    return config.get("metadata", {}).get("further_questions", False)
+
+
+def further_questions_parallel(config: RunnableConfig) -> bool:
+    """In the parallel mode the further questions are generated from the question alone,
+    at the same time as the answer."""
+    mode = config.get("metadata", {}).get(
+        "further_questions_mode", settings.FURTHER_QUESTIONS_MODE
+    )
+    return mode == "parallel"
+
+
+def further_questions_timeout(config: RunnableConfig) -> float:
+    return float(
+        config.get("metadata", {}).get(
+            "further_questions_timeout", settings.FURTHER_QUESTIONS_TIMEOUT
+        )
+    )
+
+
+def _qa_history(state: GraphState, config: RunnableConfig) -> list[AnyMessage]:
+    # the further questions are about the latest turns, the window is enough
+    if further_questions_parallel(config):
+        # speculative, the answer is not there yet
+        return history.window(state["chat_history"])
+    messages = state["chat_history"]
+    if not is_session(config):
+        messages = messages + [AIMessage(content=state["generation"])]
+    return history.window(messages)
 
 
 def get_further_questions(state: GraphState, config: RunnableConfig):
 
-    if not config["metadata"].get("further_questions", False):
+    if not further_questions_enabled(config):
         return {"further_questions": []}
 
     logger.info("---FURTHER QUESTIONS---")
-    qa_history = state["chat_history"] + [
-        AIMessage(content=state["generation"]),
-    ]
-
-    model = get_chatmodel(use_ollama_json_format=True).with_config(patch_config(config))
+    qa_history = _qa_history(state, config)
 
-    further_questions_chain = (
-        further_q_prompt
-        | model.with_structured_output(FurtherQuestions)
-        | RunnableLambda(further_q_parser)
+    config = patch_config(config)
+    further_questions_chain = get_further_questions_chain(config)
+    timeout = further_questions_timeout(config)
+    future = _executor.submit(
+        further_questions_chain.invoke, {"chat_history": qa_history}, config
     )
     try:
-        fqs = further_questions_chain.invoke({"chat_history": qa_history})
+        fqs = future.result(timeout=timeout)
+        further_questions = fqs["questions"]
+    except TimeoutError:
+        # the call is not cancelled, but the graph does not wait for it
+        logger.warning(f"get_further_questions: no result within {timeout}s")
+        further_questions = []
+    except Exception as e:
+        logger.warning(f"Error in get_further_questions: {e}")
+        further_questions = []
+    return {"further_questions": further_questions}
+
+
+async def aget_further_questions(state: GraphState, config: RunnableConfig):
+
+    if not further_questions_enabled(config):
+        return {"further_questions": []}
+
+    logger.info("---FURTHER QUESTIONS---")
+    qa_history = _qa_history(state, config)
+
+    config = patch_config(config)
+    further_questions_chain = get_further_questions_chain(config)
+    timeout = further_questions_timeout(config)
+    try:
+        fqs = await asyncio.wait_for(
+            further_questions_chain.ainvoke({"chat_history": qa_history}, config),
+            timeout,
+        )
         further_questions = fqs["questions"]
+    except TimeoutError:
+        logger.warning(f"get_further_questions: no result within {timeout}s")
+        further_questions = []
     except Exception as e:
         logger.warning(f"Error in get_further_questions: {e}")
         further_questions = []
     return {"further_questions": further_questions}
 
 
-workflow = StateGraph(GraphState)
-workflow.add_node("create_chat_history", create_chat_history)
-workflow.add_node("chatbot", generate)
-workflow.add_node("get_further_questions", get_further_questions)
+def route_question(state: GraphState, config: RunnableConfig) -> list[str]:
+    if further_questions_enabled(config) and further_questions_parallel(config):
+        return ["chatbot", "get_further_questions"]
+    return ["chatbot"]
+
+
+def route_answer(state: GraphState, config: RunnableConfig) -> str:
+    if further_questions_enabled(config) and further_questions_parallel(config):
+        return END
+    return "get_further_questions"
+
+
+class SessionOutput(TypedDict):
+    """The history stays on the server, only the answer is returned."""
+
+    generation: str
+    further_questions: list[str]
+
 
-workflow.add_edge(START, "create_chat_history")
-workflow.add_edge("create_chat_history", "chatbot")
-workflow.add_edge("chatbot", "get_further_questions")
-workflow.add_edge("get_further_questions", END)
+def create_workflow(output=GraphState) -> StateGraph:
+    workflow = StateGraph(GraphState, input=InputDict, output=output)
+    workflow.add_node("create_chat_history", create_chat_history)
+    # graph.invoke runs the sync functions, graph.ainvoke / astream_events (LangServe) the async ones
+    workflow.add_node("chatbot", RunnableLambda(generate, afunc=agenerate))
+    workflow.add_node(
+        "get_further_questions",
+        RunnableLambda(get_further_questions, afunc=aget_further_questions),
+    )
 
-graph = workflow.compile()
+    workflow.add_edge(START, "create_chat_history")
+    # sequential: chatbot -> get_further_questions, parallel: both branches after create_chat_history
+    workflow.add_conditional_edges(
+        "create_chat_history", route_question, ["chatbot", "get_further_questions"]
+    )
+    workflow.add_conditional_edges(
+        "chatbot", route_answer, ["get_further_questions", END]
+    )
+    workflow.add_edge("get_further_questions", END)
+    return workflow
+
+
+graph = create_workflow().compile()
 """this is the chat graph with optional further questions
 """
 
+session_graph = create_workflow(output=SessionOutput).compile(checkpointer=sessions)
+"""the chat graph with server side sessions: the history is kept per thread_id
+(configurable), the requests only send the new input
+"""
+
 # from langfuse.callback import CallbackHandler
 # graph = graph.with_config(RunnableConfig(callbacks=[CallbackHandler()]))
 # breakpoint = "here"
@@ -9,10 +9,22 @@ from langchain_core.runnables.config import RunnableConfig
 from loguru import logger
 from utils import AppSettings
 from utils.aiutils import get_chatmodel
+from utils.providers import get, provider
 
-settings = AppSettings.AppSettings()
-llm = get_chatmodel()
-json_llm = get_chatmodel(use_ollama_json_format=True)
+settings = AppSettings.get_settings()
+
+# the models and the chains using them are built on first use (see utils.providers),
+# module attributes like chains.llm still work, see __getattr__ at the end
+
+
+@provider("llm")
+def _llm():
+    return get_chatmodel()
+
+
+@provider("json_llm")
+def _json_llm():
+    return get_chatmodel(use_ollama_json_format=True)
 
 
 # LLMs
@@ -43,7 +55,11 @@ retrieval_grader_prompt = PromptTemplate(
     """,
     input_variables=["question", "document"],
 )
-retrieval_grader = retrieval_grader_prompt | json_llm | JsonOutputParser()
+
+
+@provider("retrieval_grader")
+def _retrieval_grader():
+    return retrieval_grader_prompt | get("json_llm") | JsonOutputParser()
 
 
 ### Generate
@@ -95,17 +111,19 @@ rag_chain_prompt = PromptTemplate(
 )
 
 
-rag_chain = (
-    RunnableParallel(
-        {
-            "context": RunnableLambda(format_document_context),
-            "question": RunnableLambda(get_question),
-        }
+@provider("rag_chain")
+def _rag_chain():
+    return (
+        RunnableParallel(
+            {
+                "context": RunnableLambda(format_document_context),
+                "question": RunnableLambda(get_question),
+            }
+        )
+        | rag_chain_prompt
+        | get("llm")
+        | StrOutputParser()
     )
-    | rag_chain_prompt
-    | llm
-    | StrOutputParser()
-)
 
 
 ### Hallucination Grader
@@ -121,7 +139,11 @@ hallucination_grader_prompt = PromptTemplate(
     Here is the answer: {generation}  <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
     input_variables=["generation", "documents"],
 )
-hallucination_grader = hallucination_grader_prompt | json_llm | JsonOutputParser()
+
+
+@provider("hallucination_grader")
+def _hallucination_grader():
+    return hallucination_grader_prompt | get("json_llm") | JsonOutputParser()
 
 
 ### Answer Grader
@@ -136,7 +158,11 @@ answer_grader_prompt = PromptTemplate(
     Here is the question: {question} <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
     input_variables=["generation", "question"],
 )
-answer_grader = answer_grader_prompt | json_llm | JsonOutputParser()
+
+
+@provider("answer_grader")
+def _answer_grader():
+    return answer_grader_prompt | get("json_llm") | JsonOutputParser()
 
 
 re_write_prompt = PromptTemplate(
@@ -148,7 +174,11 @@ re_write_prompt = PromptTemplate(
      Umformulierte Frage: <|eot_id|><|start_header_id|>assistant<|end_header_id|>""",
     input_variables=["question"],
 )
-question_rewriter = re_write_prompt | llm | StrOutputParser()
+
+
+@provider("question_rewriter")
+def _question_rewriter():
+    return re_write_prompt | get("llm") | StrOutputParser()
 
 
 ### History Question Rewriter
@@ -169,7 +199,41 @@ contextualize_q_prompt = ChatPromptTemplate.from_messages(
         ("human", "{input}"),
     ]
 )
-recreate_chain = contextualize_q_prompt | llm | StrOutputParser()
+
+
+@provider("recreate_chain")
+def _recreate_chain():
+    return contextualize_q_prompt | get("llm") | StrOutputParser()
+
+
+### Chat History Summary
+summary_prompt_text = """
+    Du erhältst die bisherige Zusammenfassung eines Chatverlaufs und neue Nachrichten dieses Chatverlaufs.
+    Ergänze die Zusammenfassung um die neuen Nachrichten. Behalte Namen, Zahlen, Fakten und offene Fragen.
+    Gib ausschließlich die aktualisierte Zusammenfassung zurück, auf deutsch und in höchstens 150 Wörtern.
+
+    Bisherige Zusammenfassung: {summary}
+
+    Neue Nachrichten:
+    """
+
+# NOTE: "human" instead of "system", see contextualize_q_prompt
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("human", summary_prompt_text),
+        MessagesPlaceholder("messages"),
+        ("human", "Aktualisierte Zusammenfassung:"),
+    ]
+)
+
+
+@provider("summary_chain")
+def _summary_chain():
+    # nostream: the tokens of the summary are not part of the streamed answer
+    return (summary_prompt | get("llm") | StrOutputParser()).with_config(
+        run_name="history_summary", tags=["nostream"]
+    )
+
 
 # Typing extensions: It is highly recommended to import Annotated and TypedDict from typing_extensions instead of typing to ensure consistent behavior across Python versions.
 # https://python.langchain.com/docs/how_to/structured_output/
@@ -211,19 +275,22 @@ further_q_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
+
 # Since there is a bug in the passing of the config, ollama_model_name is ignored at json_llm
-further_questions_chain = (
-    further_q_prompt
-    | json_llm.with_structured_output(FurtherQuestions)
-    | RunnableLambda(further_q_parser)
-)
+@provider("further_questions_chain")
+def _further_questions_chain():
+    return (
+        further_q_prompt
+        | get("json_llm").with_structured_output(FurtherQuestions)
+        | RunnableLambda(further_q_parser)
+    )
 
 
 def create_chain(promptTemplate: PromptTemplate, json_output: bool = False):
     if json_output:
-        return promptTemplate | json_llm | JsonOutputParser()
+        return promptTemplate | get("json_llm") | JsonOutputParser()
     else:
-        return promptTemplate | llm | StrOutputParser()
+        return promptTemplate | get("llm") | StrOutputParser()
 
 
 def patch_config(config: RunnableConfig):
@@ -240,3 +307,23 @@ def patch_config(config: RunnableConfig):
         if key in config.get("metadata", {}):
             config.get("configurable", {})[key] = config.get("metadata", {})[key]
     return config
+
+
+_lazy_names = [
+    "llm",
+    "json_llm",
+    "retrieval_grader",
+    "rag_chain",
+    "hallucination_grader",
+    "answer_grader",
+    "question_rewriter",
+    "recreate_chain",
+    "further_questions_chain",
+    "summary_chain",
+]
+
+
+def __getattr__(name: str):
+    if name in _lazy_names:
+        return get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
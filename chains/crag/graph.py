@@ -0,0 +1,174 @@
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import RunnableConfig
+from langgraph.graph import END, StateGraph
+from loguru import logger
+from typing_extensions import TypedDict
+
+from chains.core import chains as core
+from chains.rag.graph import (
+    acheck_cache,
+    agenerate,
+    aretrieve,
+    check_cache,
+    generate,
+    retrieve,
+    route_cached,
+)
+from utils.AppSettings import get_settings
+
+settings = get_settings()
+
+
+def get_min_documents(config: RunnableConfig) -> int:
+    return config.get("metadata", {}).get(
+        "crag_min_documents", settings.CRAG_MIN_DOCUMENTS
+    )
+
+
+def is_relevant(grade) -> bool:
+    if isinstance(grade, Exception):
+        # fail open, a failing grader must not drop the context
+        logger.warning(f"Error in retrieval grader: {grade}")
+        return True
+    score = grade.get("score", "yes") if isinstance(grade, dict) else grade
+    return str(score).strip().lower() in ("yes", "ja", "true")
+
+
+def _to_grade(state) -> tuple[list[Document], list[Document]]:
+    """Returns the documents kept before a rewrite and the new ones to grade."""
+    kept = state.get("kept") or []
+    known = {doc.page_content for doc in kept}
+    new = [doc for doc in state["documents"] or [] if doc.page_content not in known]
+    return kept, new
+
+
+def _grader_inputs(state, documents: list[Document]) -> list[dict]:
+    return [
+        {"question": state["question"], "document": doc.page_content}
+        for doc in documents
+    ]
+
+
+def _graded(state, kept, documents, grades):
+    relevant = [doc for doc, grade in zip(documents, grades) if is_relevant(grade)]
+    logger.info(f"---BEWERTUNG: {len(relevant)} von {len(documents)} relevant---")
+    return {"documents": kept + relevant}
+
+
+@logger.catch(reraise=True)
+def grade_documents(state, config: RunnableConfig):
+    """
+    Grade the retrieved documents concurrently and drop the irrelevant ones
+    """
+    logger.info("---DOKUMENTE BEWERTEN---")
+    kept, documents = _to_grade(state)
+    grades = core.retrieval_grader.batch(
+        _grader_inputs(state, documents),
+        # the node config keeps the callbacks (tracing, astream_events), tags and metadata
+        config={**config, "max_concurrency": settings.CRAG_MAX_CONCURRENCY},
+        return_exceptions=True,
+    )
+    return _graded(state, kept, documents, grades)
+
+
+@logger.catch(reraise=True)
+async def agrade_documents(state, config: RunnableConfig):
+    """
+    Grade the retrieved documents concurrently and drop the irrelevant ones (async)
+    """
+    logger.info("---DOKUMENTE BEWERTEN---")
+    kept, documents = _to_grade(state)
+    grades = await core.retrieval_grader.abatch(
+        _grader_inputs(state, documents),
+        # the node config keeps the callbacks (tracing, astream_events), tags and metadata
+        config={**config, "max_concurrency": settings.CRAG_MAX_CONCURRENCY},
+        return_exceptions=True,
+    )
+    return _graded(state, kept, documents, grades)
+
+
+def _rewritten(state, search_query: str):
+    logger.info(f"---NEUE FRAGE: {search_query}---")
+    return {"search_query": search_query, "kept": state["documents"]}
+
+
+@logger.catch(reraise=True)
+def transform_query(state, config: RunnableConfig):
+    """
+    Rewrite the question for a second retrieval, the relevant documents are kept
+    """
+    logger.info("---FRAGE UMFORMULIEREN---")
+    return _rewritten(
+        state, core.question_rewriter.invoke({"question": state["question"]})
+    )
+
+
+@logger.catch(reraise=True)
+async def atransform_query(state, config: RunnableConfig):
+    """
+    Rewrite the question for a second retrieval, the relevant documents are kept (async)
+    """
+    logger.info("---FRAGE UMFORMULIEREN---")
+    return _rewritten(
+        state, await core.question_rewriter.ainvoke({"question": state["question"]})
+    )
+
+
+def decide_to_generate(state, config: RunnableConfig) -> str:
+    # only one rewrite, afterwards the answer is generated with what is left
+    if state.get("search_query") or len(state["documents"]) >= get_min_documents(
+        config
+    ):
+        return "generate"
+    return "transform_query"
+
+
+### State
+
+
+class GraphState(TypedDict):
+    """
+    Status des Graphen.
+
+    Attribute:
+        question: question
+        search_query: rewritten question of the second retrieval
+        kept: relevant documents of the first retrieval
+    """
+
+    question: str
+    search_query: str | None
+    generation: str | None
+    documents: List[Document] | None
+    kept: List[Document] | None
+    cached: bool
+    started_at: float
+
+
+workflow = StateGraph(GraphState)
+
+workflow.add_node("check_cache", RunnableLambda(check_cache, afunc=acheck_cache))
+workflow.add_node("retrieve", RunnableLambda(retrieve, afunc=aretrieve))
+workflow.add_node(
+    "grade_documents", RunnableLambda(grade_documents, afunc=agrade_documents)
+)
+workflow.add_node(
+    "transform_query", RunnableLambda(transform_query, afunc=atransform_query)
+)
+workflow.add_node("generate", RunnableLambda(generate, afunc=agenerate))
+
+workflow.set_entry_point("check_cache")
+workflow.add_conditional_edges("check_cache", route_cached, ["retrieve", END])
+workflow.add_edge("retrieve", "grade_documents")
+workflow.add_conditional_edges(
+    "grade_documents", decide_to_generate, ["transform_query", "generate"]
+)
+workflow.add_edge("transform_query", "retrieve")
+workflow.add_edge("generate", END)
+
+graph = workflow.compile()
+"""this is the corrective RAG graph: irrelevant documents are dropped before the generation
+"""
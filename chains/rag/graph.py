@@ -1,37 +1,149 @@
+import asyncio
+import json
+import time
 from typing import List
 
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import RunnableConfig
 from langgraph.graph import END, StateGraph
 from loguru import logger
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import retry, stop_after_attempt, wait_exponential, wait_fixed
 from typing_extensions import TypedDict
 
-from chains.core.chains import rag_chain
-from utils.retriever import get_retriever
+from chains.core import chains as core  # core.rag_chain is built on first use
+from utils.aiutils import config_value
+from utils.answercache import answer_cache
+from utils.AppSettings import get_settings
+from utils.retriever import get_async_retriever, get_retriever
+
+settings = get_settings()
 
 
 class InputDict(TypedDict):
     question: str
 
 
+def get_collection_name(config: RunnableConfig) -> str:
+    return config.get("metadata", {}).get(
+        "collection_name", settings.PGVECTOR_COLLECTION
+    )
+
+
+def get_search_kwargs(config: RunnableConfig) -> dict | None:
+    """e.g. metadata {"search_kwargs": {"search_type": "hybrid", "k": 4}}"""
+    return config.get("metadata", {}).get("search_kwargs")
+
+
+def use_answer_cache(config: RunnableConfig) -> bool:
+    return config.get("metadata", {}).get("answer_cache", settings.ANSWER_CACHE)
+
+
+def get_cache_partition(config: RunnableConfig) -> str:
+    """The answers are only shared by requests with the same search and model."""
+    return json.dumps(
+        {
+            "search_kwargs": get_search_kwargs(config) or {},
+            "llm": config_value(config, "llm"),
+            "ollama_model_name": config_value(config, "ollama_model_name"),
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+def check_cache(state: InputDict, config: RunnableConfig):
+    """
+    Look up a cached answer of a similar question (opt-in, metadata 'answer_cache')
+    """
+    if use_answer_cache(config):
+        try:
+            entry = answer_cache.lookup(
+                get_collection_name(config),
+                state["question"],
+                config.get("metadata", {}).get("answer_cache_threshold"),
+                partition=get_cache_partition(config),
+            )
+            if entry:
+                logger.info("---AUS DEM CACHE---")
+                return {
+                    "generation": entry["generation"],
+                    "documents": entry["documents"],
+                    "cached": True,
+                }
+        except Exception as e:
+            logger.warning(f"Error in answer cache lookup: {e}")
+    return {"cached": False, "started_at": time.perf_counter()}
+
+
+async def acheck_cache(state: InputDict, config: RunnableConfig):
+    if not use_answer_cache(config):
+        return {"cached": False, "started_at": time.perf_counter()}
+    # the lookup queries Postgres and embeds the question, not on the event loop
+    return await asyncio.to_thread(check_cache, state, config)
+
+
+def store_in_cache(state, config: RunnableConfig, generation: str):
+    if not use_answer_cache(config):
+        return
+    try:
+        answer_cache.store(
+            get_collection_name(config),
+            state["question"],
+            generation,
+            state["documents"],
+            latency=time.perf_counter() - state.get("started_at", time.perf_counter()),
+            partition=get_cache_partition(config),
+        )
+    except Exception as e:
+        logger.warning(f"Error in answer cache store: {e}")
+
+
+def route_cached(state) -> str:
+    return END if state.get("cached") else "retrieve"
+
+
 @logger.catch
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(5))
-def retrieve(state: InputDict):
+def retrieve(state: InputDict, config: RunnableConfig):
     """
     Retrieve documents from vectorstore
     """
     logger.info("---ABRUFEN---")
-    question = state["question"]
+    # the corrective RAG graph searches a second time with the rewritten question
+    question = state.get("search_query") or state["question"]
 
-    retriever = get_retriever()
+    retriever = get_retriever(
+        search_kwargs=get_search_kwargs(config),
+        collection_name=get_collection_name(config),
+    )
 
     documents = retriever.invoke(question)
     return {"documents": documents}
 
 
+# the async variants do not block a worker thread, tenacity awaits asyncio.sleep between the attempts
+@logger.catch
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8))
+async def aretrieve(state: InputDict, config: RunnableConfig):
+    """
+    Retrieve documents from vectorstore (async)
+    """
+    logger.info("---ABRUFEN---")
+    question = state.get("search_query") or state["question"]
+
+    retriever = get_async_retriever(
+        search_kwargs=get_search_kwargs(config),
+        collection_name=get_collection_name(config),
+    )
+
+    documents = await retriever.ainvoke(question)
+    return {"documents": documents}
+
+
 @logger.catch
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(5))
-def generate(state):
+def generate(state, config: RunnableConfig):
     """
     Generate answer using RAG on retrieved documents
     """
@@ -39,7 +151,30 @@ def generate(state):
     question = state["question"]
     documents = state["documents"]
 
-    generation = rag_chain.invoke({"context": documents, "question": question})
+    generation = core.rag_chain.invoke(
+        {"context": documents, "question": question}, config
+    )
+    store_in_cache(state, config, generation)
+    return {
+        "generation": generation,
+    }
+
+
+@logger.catch
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8))
+async def agenerate(state, config: RunnableConfig):
+    """
+    Generate answer using RAG on retrieved documents (async)
+    """
+    logger.info("---GENERIEREN---")
+    question = state["question"]
+    documents = state["documents"]
+
+    # with the config the tokens arrive in astream_events while they are generated
+    generation = await core.rag_chain.ainvoke(
+        {"context": documents, "question": question}, config
+    )
+    await asyncio.to_thread(store_in_cache, state, config, generation)
     return {
         "generation": generation,
     }
@@ -59,14 +194,19 @@ class GraphState(TypedDict):
     question: str
     generation: str | None
     documents: List[Document] | None
+    cached: bool
+    started_at: float
 
 
 workflow = StateGraph(GraphState)
 
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("generate", generate)
+workflow.add_node("check_cache", RunnableLambda(check_cache, afunc=acheck_cache))
+# graph.invoke runs the sync functions, graph.ainvoke (LangServe) the async ones
+workflow.add_node("retrieve", RunnableLambda(retrieve, afunc=aretrieve))
+workflow.add_node("generate", RunnableLambda(generate, afunc=agenerate))
 
-workflow.set_entry_point("retrieve")
+workflow.set_entry_point("check_cache")
+workflow.add_conditional_edges("check_cache", route_cached, ["retrieve", END])
 workflow.add_edge("retrieve", "generate")
 workflow.add_edge("generate", END)
 
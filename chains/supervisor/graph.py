@@ -1,44 +1,183 @@
-from typing import Annotated
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import InjectedState, create_react_agent
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Sequence
+
+from typing_extensions import TypedDict
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from langgraph.prebuilt import create_react_agent
 from chains.rag.graph import graph as rag_graph
 from utils.aiutils import get_chatmodel
+from utils.AppSettings import get_settings
+from utils.providers import lazy_runnable, provider
 
+settings = get_settings()
 
-# this is the agent function that will be called as tool
-# notice that you can pass the state to the tool via InjectedState annotation
-def agent_archive(state: Annotated[dict, InjectedState]):
-    """_summary_
 
-    Args:
-        state (Annotated[dict, InjectedState]): _description_
+# the agents are called as tools, the supervisor LLM passes the question as argument,
+# every tool has a sync variant (supervisor.invoke) and an async one (supervisor.ainvoke)
+def archive(question: str, config: RunnableConfig) -> str:
+    """Beantwortet eine Frage mit den Dokumenten des Archivs (RAG über die importierten Dateien).
 
-    Returns:
-        _type_: _description_
+    Args:
+        question: die Frage, vollständig formuliert
     """
-    # you can pass relevant parts of the state to the LLM (e.g., state["messages"])
-    # and add any additional logic (different models, custom prompts, structured output, etc.)
-    response = rag_graph.invoke(state)
-    # return the LLM response as a string (expected tool response format)
-    # this will be automatically turned to ToolMessage
-    # by the prebuilt create_react_agent (supervisor)
-    return response.content
+    response = rag_graph.invoke({"question": question}, config)
+    # the string is turned into a ToolMessage by the prebuilt create_react_agent (supervisor)
+    return response["generation"]
 
 
-def agent_2(state: Annotated[dict, InjectedState]):
-    """_summary_
+async def aarchive(question: str, config: RunnableConfig) -> str:
+    response = await rag_graph.ainvoke({"question": question}, config)
+    return response["generation"]
 
-    Args:
-        state (Annotated[dict, InjectedState]): _description_
 
-    Returns:
-        _type_: _description_
+agent_archive = StructuredTool.from_function(
+    func=archive, coroutine=aarchive, name="agent_archive"
+)
+
+
+def fake_agent(question: str) -> str:
+    """Platzhalter für einen weiteren Agenten.
+
+    Args:
+        question: die Frage an den Agenten
     """
     # response = model.invoke(...)
-    return {"generation": "das ist alles nur gefaket"}
+    return "das ist alles nur gefaket"
+
+
+async def afake_agent(question: str) -> str:
+    return fake_agent(question)
+
+
+agent_2 = StructuredTool.from_function(
+    func=fake_agent, coroutine=afake_agent, name="agent_2"
+)
 
 
 tools = [agent_archive, agent_2]
+
+
+class ToolTurns:
+    """Per-turn state of the supervisor tools. A turn is one run of the tools node, all
+    tool calls of one supervisor message: ToolNode starts them together (async), here
+    at most max_concurrency of them run at once and identical calls (same tool and
+    arguments) run only once, the others await the same result.
+
+    ### Example
+
+    ```python
+    turns = ToolTurns(max_concurrency=4)
+    result = await turns.run(config, "agent_archive", {"question": "..."}, call)
+    ```
+    """
+
+    def __init__(
+        self, max_concurrency: int = 4, memoize: bool = True, max_turns: int = 256
+    ):
+        self.max_concurrency = max_concurrency
+        self.memoize = memoize
+        self.max_turns = max_turns
+        self.calls = 0
+        self.hits = 0
+        self._turns: OrderedDict[str, dict] = OrderedDict()
+
+    @staticmethod
+    def _turn_key(config: RunnableConfig) -> str | None:
+        # the checkpoint namespace of the tools task is unique per turn
+        metadata = config.get("metadata") or {}
+        return metadata.get("langgraph_checkpoint_ns") or metadata.get("checkpoint_ns")
+
+    def _turn(self, config: RunnableConfig) -> dict:
+        key = self._turn_key(config)
+        if key is None:
+            # not called by the tools node: no shared state
+            return {"semaphore": asyncio.Semaphore(self.max_concurrency), "calls": {}}
+        if key not in self._turns:
+            self._turns[key] = {
+                "semaphore": asyncio.Semaphore(self.max_concurrency),
+                "calls": {},
+            }
+            while len(self._turns) > self.max_turns:
+                self._turns.popitem(last=False)
+        return self._turns[key]
+
+    async def run(
+        self,
+        config: RunnableConfig,
+        name: str,
+        args: dict,
+        call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        turn = self._turn(config)
+        key = (name, json.dumps(args, sort_keys=True, default=str))
+        if self.memoize and key in turn["calls"]:
+            self.hits += 1
+            return await turn["calls"][key]
+
+        async def limited():
+            async with turn["semaphore"]:
+                return await call()
+
+        self.calls += 1
+        task = asyncio.ensure_future(limited())
+        if self.memoize:
+            turn["calls"][key] = task
+        return await task
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "hits": self.hits, "turns": len(self._turns)}
+
+
+def with_turns(agent_tool: BaseTool, turns: ToolTurns) -> BaseTool:
+    """The tool with the concurrency cap and the memoization of the turns.
+    Both only apply to the async calls, sync calls (supervisor.invoke) call the tool
+    directly."""
+
+    def run(config: RunnableConfig, **kwargs):
+        return agent_tool.invoke(kwargs, config)
+
+    async def arun(config: RunnableConfig, **kwargs):
+        return await turns.run(
+            config, agent_tool.name, kwargs, lambda: agent_tool.ainvoke(kwargs, config)
+        )
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=agent_tool.name,
+        description=agent_tool.description,
+        args_schema=agent_tool.args_schema,
+    )
+
+
+def build_supervisor(
+    model: BaseChatModel,
+    agent_tools: Sequence[BaseTool] = tools,
+    max_concurrency: int = settings.SUPERVISOR_TOOL_CONCURRENCY,
+    memoize: bool = True,
+):
+    """ReAct supervisor over the agent tools (e.g. a fake chat model in benchmarks)."""
+    turns = ToolTurns(max_concurrency=max_concurrency, memoize=memoize)
+    agent = create_react_agent(model, [with_turns(t, turns) for t in agent_tools])
+    agent.turns = turns
+    return agent
+
+
+class SupervisorInput(TypedDict):
+    messages: list[AnyMessage]
+
+
 # the simplest way to build a supervisor w/ tool-calling is to use prebuilt ReAct agent graph
 # that consists of a tool-calling LLM node (i.e. supervisor) and a tool-executing node
-supervisor = create_react_agent(get_chatmodel(), tools)
+@provider("supervisor")
+def _supervisor():
+    return build_supervisor(get_chatmodel())
+
+
+# the agent is built on the first request
+supervisor = lazy_runnable("supervisor", input_type=SupervisorInput)
@@ -1,3 +1,4 @@
+import functools
 import os
 from dotenv import find_dotenv, load_dotenv
 from typing_extensions import Annotated, Doc
@@ -8,18 +9,21 @@ class AppSettings:
     """
     `AppSetting` class, the one and only source to get your enviroment variables and predefined parameters.
 
-    Will call os.getenv(), not (!) static, create an instance first.
+    Will call os.getenv(), not (!) static, create an instance first
+    or use the shared instance of get_settings().
     ### Example
 
     ```python
-    from mylibs.classes.AppSettings import AppSettings
+    from utils.AppSettings import get_settings
 
-    settings = AppSettings()
+    settings = get_settings()
 
     key = settings.API_KEY
     ```
     """
 
+    _dotenv_loaded = False
+
     true_values = [
         "true",
         "1",
@@ -32,7 +36,9 @@ class AppSettings:
 
     def __init__(self):
         # logger.info("Reading AppSettings...")
-        load_dotenv(find_dotenv())  # load enviroment variables once
+        if not AppSettings._dotenv_loaded:
+            load_dotenv(find_dotenv())  # load enviroment variables once
+            AppSettings._dotenv_loaded = True
         self.API_USER = os.getenv("API_USER")
         self.API_PWD = os.getenv("API_PWD")
 
@@ -46,6 +52,40 @@ class AppSettings:
         self.CHROMADB_API_KEY = os.getenv("CHROMADB_API_KEY", None)
         self.CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))
         self.CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 50))
+        self.IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 1))
+        self.ANSWER_CACHE = (
+            os.getenv("ANSWER_CACHE", "false").lower() in self.true_values
+        )
+        self.ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+        self.ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 256))
+        self.IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 64))
+        self.IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", 2))
+        # rules of utils.textnorm, applied to every page before splitting
+        self.TEXT_NORMALIZATION = os.getenv(
+            "TEXT_NORMALIZATION", "whitespace,hyphenation,join_lines,digit_letter"
+        )
+        # tool calls of one supervisor turn running at the same time
+        self.SUPERVISOR_TOOL_CONCURRENCY = int(
+            os.getenv("SUPERVISOR_TOOL_CONCURRENCY", 4)
+        )
+        # GPIO of the LEDs: rpi, sim (in memory) or auto (rpi if RPi.GPIO is available)
+        self.GPIO_BACKEND = os.getenv("GPIO_BACKEND", "auto")
+        # simulated bots of the supervisor fleet (besides the three LED bots)
+        self.FLEET_SIMULATED_BOTS = int(os.getenv("FLEET_SIMULATED_BOTS", 0))
+        self.IMPORT_BULK_COPY = (
+            os.getenv("IMPORT_BULK_COPY", "true").lower() in self.true_values
+        )
+        self.CRAG_MIN_DOCUMENTS = int(os.getenv("CRAG_MIN_DOCUMENTS", 2))
+        self.CRAG_MAX_CONCURRENCY = int(os.getenv("CRAG_MAX_CONCURRENCY", 4))
+        self.FURTHER_QUESTIONS_MODE = os.getenv("FURTHER_QUESTIONS_MODE", "sequential")
+        self.FURTHER_QUESTIONS_TIMEOUT = float(
+            os.getenv("FURTHER_QUESTIONS_TIMEOUT", 10)
+        )
+        self.HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", 1536))
+        self.HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", 2))
+        self.HISTORY_MAX_SESSIONS = int(os.getenv("HISTORY_MAX_SESSIONS", 256))
+        self.CHAT_SESSIONS_MAX = int(os.getenv("CHAT_SESSIONS_MAX", 256))
+        self.CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", 3600))
 
         self.PGVECTOR_USER = os.getenv("PGVECTOR_USER", "user")
         self.PGVECTOR_PASSWORD = os.getenv("PGVECTOR_PASSWORD", "pwd")
@@ -54,6 +94,11 @@ class AppSettings:
         self.PGVECTOR_DB = os.getenv("PGVECTOR_DB", "db")
         self.PGVECTOR_COLLECTION = os.getenv("PGVECTOR_COLLECTION", "rag")
         self.PGVECTOR_QA_COLLECTION = os.getenv("PGVECTOR_QA_COLLECTION", "qa")
+        self.PGVECTOR_POOL_SIZE = int(os.getenv("PGVECTOR_POOL_SIZE", 5))
+        self.PGVECTOR_MAX_OVERFLOW = int(os.getenv("PGVECTOR_MAX_OVERFLOW", 2))
+        self.PGVECTOR_POOL_RECYCLE = int(os.getenv("PGVECTOR_POOL_RECYCLE", 1800))
+        # text search configuration of the hybrid search (full-text index)
+        self.HYBRID_TS_CONFIG = os.getenv("HYBRID_TS_CONFIG", "german")
 
         self.MSSQL_USER = os.getenv("MSSQL_USER", "user")
         self.MSSQL_PASSWORD = os.getenv("MSSQL_PASSWORD", "pwd")
@@ -66,8 +111,22 @@ class AppSettings:
         self.LLM_MODEL = os.getenv("LLM_MODEL", "lff_api_llama31:70b_default")
         self.LLM_MODEL_LARGE = os.getenv("LLM_MODEL_LARGE", "lff_api_llama31:70b_large")
         self.LLM_EMBEDDINGMODEL = os.getenv("LLM_EMBEDDINGMODEL", "nomic-embed-text")
+        # model clients kept by get_cached_model (least recently used are dropped)
+        self.MODEL_CACHE_MAX_ENTRIES = int(os.getenv("MODEL_CACHE_MAX_ENTRIES", 32))
+        self.EMBEDDING_CACHE = (
+            os.getenv("EMBEDDING_CACHE", "true").lower() in self.true_values
+        )
+        self.EMBEDDING_CACHE_FILE = os.getenv(
+            "EMBEDDING_CACHE_FILE", "./data/cache/embeddings.sqlite"
+        )
+        self.EMBEDDING_CACHE_MAX_ENTRIES = int(
+            os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000)
+        )
         self.LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1024"))
         self.LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+        self.WARMUP_MODELS = (
+            os.getenv("WARMUP_MODELS", "false").lower() in self.true_values
+        )
         self.LLM_LOG_FILE = os.getenv("LLM_LOG_FILE", "./data/log/llmlog.log")
 
         self.LANGFUSE_PUBLIC_KEY = os.getenv("LANGFUSE_PUBLIC_KEY", None)
@@ -88,3 +147,9 @@ class AppSettings:
 
     def getenv(self, key: str, default=None):
         return os.getenv(key, default)
+
+
+@functools.cache
+def get_settings() -> AppSettings:
+    """Returns the shared settings, the .env is read only once per process."""
+    return AppSettings()
@@ -1,9 +1,9 @@
+import threading
+from collections import OrderedDict
 from typing import List, Literal, Sequence
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.chat_models import ChatOllama
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.llms.ollama import Ollama
+from langchain_core.embeddings import Embeddings
 from langchain_core.messages import (
     AIMessage,
     AnyMessage,
@@ -11,105 +11,223 @@ from langchain_core.messages import (
     FunctionMessage,
     HumanMessage,
 )
-from langchain_experimental.llms.ollama_functions import OllamaFunctions
-from langchain_experimental.text_splitter import SemanticChunker
 
 # ToDo das fliegt später wieder raus -> Poetry!!!
 # from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from langchain_openai import (
-    ChatOpenAI,
-    OpenAIEmbeddings,
-    AzureChatOpenAI,
-    AzureOpenAIEmbeddings,
-)
-from langchain_openai.llms import AzureOpenAI
 from loguru import logger
-from utils.AppSettings import AppSettings
+from utils.AppSettings import get_settings
+from utils.embeddingcache import CachedEmbeddings
 
-# from langchain_nvidia_ai_endpoints import ChatNVIDIA
+# the provider packages (langchain_openai, langchain_community, langchain_experimental, ...)
+# are imported in the branches where they are used, importing them all costs seconds on the Pi
 
 
-settings = AppSettings()
+settings = get_settings()
 
 
-@logger.catch
-def get_model(
-    temperature: float = 0,
-    use_ollama_json_format: bool = False,
-    use_openai: bool = settings.getenv("USE_OPENAI", False),
-    openai_chat_model: str = settings.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
-):
+Provider = Literal["openai", "groq", "azure", "ollama"]
+providers = ("openai", "groq", "azure", "ollama")
+
+# model clients per (kind, provider, model, temperature, format, num_ctx), the model
+# name can come from a request, so the least recently used clients are dropped
+_models: OrderedDict[tuple, object] = OrderedDict()
+_models_lock = threading.Lock()
+_http_clients = None
+
+
+def get_provider(use_openai: bool = False) -> Provider:
+    """Returns the configured LLM provider (USE_OPENAI, USE_GROQ, USE_AZURE, else ollama)."""
     if use_openai:
-        logger.debug("Using OPENAI...")
-        return ChatOpenAI(model=openai_chat_model, temperature=temperature)
+        return "openai"
     elif settings.getenv("USE_GROQ", False):
+        return "groq"
+    elif settings.getenv("USE_AZURE", False):
+        return "azure"
+    return "ollama"
+
+
+def _get_http_clients():
+    """One connection pool for all OpenAI, Azure and Groq clients.
+    Ollama is called by langchain_community with requests.post, without a session.
+    """
+    global _http_clients
+    if _http_clients is None:
+        import httpx
+
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        _http_clients = (
+            httpx.Client(limits=limits, follow_redirects=True),
+            httpx.AsyncClient(limits=limits, follow_redirects=True),
+        )
+    return _http_clients
+
+
+def _default_model_name(kind: str, provider: Provider, openai_chat_model: str):
+    if provider == "openai":
+        return openai_chat_model
+    elif provider == "groq":
+        return settings.getenv("GROQ_CHAT_MODEL", "llama3-70b-8192")
+    elif provider == "azure":
+        return "gpt-4o-mini" if kind == "llm" else settings.getenv("AZURE_DEPLOYMENT")
+    return settings.LLM_MODEL
+
+
+def _create_model(
+    kind: str,
+    provider: Provider,
+    model: str,
+    temperature: float,
+    json_format: bool,
+    num_ctx: int | None,
+):
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        logger.debug("Using OPENAI...")
+        http_client, http_async_client = _get_http_clients()
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+    elif provider == "groq":
         from langchain_groq import ChatGroq
 
         logger.debug("Using groq...")
+        http_client, http_async_client = _get_http_clients()
         return ChatGroq(
             temperature=temperature,
-            model=settings.getenv("GROQ_CHAT_MODEL", "llama3-70b-8192"),
+            model=model,
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
-    elif settings.getenv("USE_AZURE", False):
-        logger.debug("Using Azure (may not work)...")
-        return AzureOpenAI(deployment_name="gpt-4o-mini", temperature=temperature)
+    elif provider == "azure":
+        http_client, http_async_client = _get_http_clients()
+        if kind == "llm":
+            from langchain_openai.llms import AzureOpenAI
+
+            logger.debug("Using Azure (may not work)...")
+            return AzureOpenAI(
+                deployment_name=model,
+                temperature=temperature,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+        from langchain_openai import AzureChatOpenAI
+
+        logger.debug("Using Azure...")
+        return AzureChatOpenAI(
+            temperature=temperature,
+            azure_deployment=model,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+    elif provider != "ollama":
+        raise ValueError(f"Unbekannter Provider: {provider}")
+
+    kwargs = {"format": "json"} if json_format else {}
+    if kind == "llm":
+        from langchain_community.llms.ollama import Ollama
 
-    if use_ollama_json_format:
         return Ollama(
             base_url=settings.LLM_URL_SERVER,
-            model=settings.LLM_MODEL,
+            model=model,
             temperature=temperature,
-            format="json",
+            **kwargs,
         )
-    else:
-        return Ollama(
+    elif kind == "function":
+        from langchain_experimental.llms.ollama_functions import OllamaFunctions
+
+        return OllamaFunctions(
             base_url=settings.LLM_URL_SERVER,
-            model=settings.LLM_MODEL,
+            model=model,
             temperature=temperature,
+            format="json",
         )
 
+    from langchain_community.chat_models import ChatOllama
+
+    return ChatOllama(
+        base_url=settings.LLM_URL_SERVER,
+        model=model,
+        temperature=temperature,
+        num_ctx=num_ctx,
+        **kwargs,
+    )
+
+
+def get_cached_model(
+    kind: Literal["llm", "chat", "function"] = "chat",
+    provider: Provider | None = None,
+    model: str | None = None,
+    temperature: float = 0,
+    use_ollama_json_format: bool = False,
+    num_ctx: int = 2048,
+    use_openai: bool = settings.getenv("USE_OPENAI", False),
+    openai_chat_model: str = settings.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
+):
+    """Returns the model client for the full configuration, created once and then shared.
+
+    Args:
+        kind: llm (completion), chat or function (tool calling)
+        provider: overrides the configured provider
+        model: overrides the configured model / deployment
+    """
+    provider = provider or get_provider(use_openai)
+    model = model or _default_model_name(kind, provider, openai_chat_model)
+    # format and num_ctx are only passed to Ollama, they must not create extra clients
+    is_ollama = provider == "ollama"
+    key = (
+        kind,
+        provider,
+        model,
+        float(temperature),
+        is_ollama and (use_ollama_json_format or kind == "function"),
+        num_ctx if is_ollama and kind == "chat" else None,
+    )
+    with _models_lock:
+        if key in _models:
+            _models.move_to_end(key)
+        else:
+            _models[key] = _create_model(*key)
+            while len(_models) > settings.MODEL_CACHE_MAX_ENTRIES:
+                _models.popitem(last=False)
+        return _models[key]
+
 
 @logger.catch
-def get_chatmodel(
+def get_model(
     temperature: float = 0,
     use_ollama_json_format: bool = False,
     use_openai: bool = settings.getenv("USE_OPENAI", False),
     openai_chat_model: str = settings.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
-    num_ctx=2048,
 ):
-    if use_openai:
-        logger.debug("Using OPENAI...")
-        return ChatOpenAI(model=openai_chat_model, temperature=temperature)
-    elif settings.getenv("USE_GROQ", False):
-        from langchain_groq import ChatGroq
+    return get_cached_model(
+        "llm",
+        temperature=temperature,
+        use_ollama_json_format=use_ollama_json_format,
+        use_openai=use_openai,
+        openai_chat_model=openai_chat_model,
+    )
 
-        logger.debug("Using groq...")
-        return ChatGroq(
-            temperature=temperature,
-            model=settings.getenv("GROQ_CHAT_MODEL", "llama3-70b-8192"),
-        )
-    elif settings.getenv("USE_AZURE"):
-        logger.debug("Using Azure...")
-        return AzureChatOpenAI(
-            temperature=temperature,
-            azure_deployment=settings.getenv("AZURE_DEPLOYMENT"),
-        )
 
-    if use_ollama_json_format:
-        return ChatOllama(
-            base_url=settings.LLM_URL_SERVER,
-            model=settings.LLM_MODEL,
-            temperature=temperature,
-            format="json",
-            num_ctx=num_ctx,
-        )
-    else:
-        return ChatOllama(
-            base_url=settings.LLM_URL_SERVER,
-            model=settings.LLM_MODEL,
-            temperature=temperature,
-            num_ctx=num_ctx,
-        )
+@logger.catch
+def get_chatmodel(
+    temperature: float = 0,
+    use_ollama_json_format: bool = False,
+    use_openai: bool = settings.getenv("USE_OPENAI", False),
+    openai_chat_model: str = settings.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
+    num_ctx=2048,
+):
+    return get_cached_model(
+        "chat",
+        temperature=temperature,
+        use_ollama_json_format=use_ollama_json_format,
+        num_ctx=num_ctx,
+        use_openai=use_openai,
+        openai_chat_model=openai_chat_model,
+    )
 
 
 @logger.catch
@@ -118,42 +236,113 @@ def get_functionmodel(
     use_openai: bool = settings.getenv("USE_OPENAI", False),
     openai_chat_model: str = settings.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
 ):
-    if use_openai:
-        logger.debug("Using OPENAI...")
-        return ChatOpenAI(model=openai_chat_model, temperature=temperature)
-    elif settings.getenv("USE_GROQ", False):
-        from langchain_groq import ChatGroq
+    return get_cached_model(
+        "function",
+        temperature=temperature,
+        use_openai=use_openai,
+        openai_chat_model=openai_chat_model,
+    )
+
+
+def config_value(config: dict | None, key: str):
+    """A request override, from configurable or metadata."""
+    config = config or {}
+    return config.get("configurable", {}).get(key) or config.get("metadata", {}).get(
+        key
+    )
+
+
+@logger.catch(reraise=True)
+def get_chatmodel_for_config(
+    config: dict | None,
+    temperature: float = 0,
+    use_ollama_json_format: bool = False,
+    num_ctx: int = 2048,
+):
+    """Returns the shared chat model for the overrides of a request:
+    'llm' (provider) and 'ollama_model_name' in configurable or metadata.
+
+    ### Example
+
+    ```python
+    model = get_chatmodel_for_config({"metadata": {"ollama_model_name": "llama3.1"}})
+    ```
+    """
+    default = get_provider(settings.getenv("USE_OPENAI", False))
+    provider = config_value(config, "llm") or default
+    if provider not in providers:
+        logger.warning(f"Unbekannter Provider '{provider}', nutze '{default}'")
+        provider = default
+    model = config_value(config, "ollama_model_name") if provider == "ollama" else None
+    return get_cached_model(
+        "chat",
+        provider=provider,
+        model=model,
+        temperature=temperature,
+        use_ollama_json_format=use_ollama_json_format,
+        num_ctx=num_ctx,
+    )
+
+
+def get_embeddings_backend() -> str:
+    """Returns the key of the configured embedding backend, e.g. 'ollama:bge-m3'."""
+    if settings.getenv("USE_OPENAI_EMBEDDING", False):
+        return "openai:text-embedding-3-small"
+    elif settings.getenv("USE_AZURE_EMBEDDING", False):
+        return "azure:text-embedding-3-large"
+    return f"ollama:{settings.LLM_EMBEDDINGMODEL}"
 
-        logger.debug("Using groq...")
-        return ChatGroq(
-            temperature=temperature,
-            model=settings.getenv("GROQ_CHAT_MODEL", "llama3-70b-8192"),
-        )
-    elif settings.getenv("USE_AZURE"):
-        logger.debug("Using Azure...")
-        return AzureChatOpenAI(
-            temperature=temperature,
-            azure_deployment=settings.getenv("AZURE_DEPLOYMENT"),
-        )
-    else:
-        return OllamaFunctions(
-            base_url=settings.LLM_URL_SERVER,
-            model=settings.LLM_MODEL,
-            temperature=temperature,
-            format="json",
-        )
+
+_embeddings: dict[str, Embeddings] = {}
+# one client per backend, the cache wraps one SQLite connection to the cache file
+_embeddings_lock = threading.Lock()
 
 
 @logger.catch(reraise=True)
 def get_embeddingsmodel():
+    """Returns the embeddings client of the configured backend.
+    The client is created once per backend and shared by all callers,
+    with EMBEDDING_CACHE it is wrapped by the persistent embedding cache.
+    """
+    backend = get_embeddings_backend()
+    if backend not in _embeddings:
+        with _embeddings_lock:
+            if backend not in _embeddings:
+                embeddings = _create_embeddingsmodel()
+                if settings.EMBEDDING_CACHE:
+                    embeddings = CachedEmbeddings(
+                        embeddings,
+                        model_name=backend,
+                        db_file=settings.EMBEDDING_CACHE_FILE,
+                        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                    )
+                _embeddings[backend] = embeddings
+    return _embeddings[backend]
+
+
+def get_embeddings_cache_stats() -> dict:
+    return {
+        backend: embeddings.stats()
+        for backend, embeddings in _embeddings.items()
+        if isinstance(embeddings, CachedEmbeddings)
+    }
+
+
+def _create_embeddingsmodel():
     # Note: OpenAIEmbeddings has different dimensions:
     if settings.getenv("USE_OPENAI_EMBEDDING", False):
+        from langchain_openai import OpenAIEmbeddings
+
         logger.debug("Using OpenAI text-embedding-3-small...")
         return OpenAIEmbeddings(model="text-embedding-3-small")
     elif settings.getenv("USE_AZURE_EMBEDDING", False):
+        from langchain_openai import AzureOpenAIEmbeddings
+
         logger.debug("using Azure text-embedding-3-large...")
         return AzureOpenAIEmbeddings(model="text-embedding-3-large")
 
+    from langchain_community.embeddings import OllamaEmbeddings
+
     logger.debug(f"Using OllamaEmbeddings {settings.LLM_EMBEDDINGMODEL}...")
     return OllamaEmbeddings(
         base_url=settings.LLM_URL_EMBEDDING_SERVER or settings.LLM_URL_SERVER,
@@ -175,9 +364,13 @@ def get_splitter(
         )
     elif splitter_type == "semantic":
         # Semantic splitting hat bei ersten Tests mit dem BayBG kein besseres Resultat geliefert
-        # dauert auch ca. 3 Minuten, aber die Teilung ist tatsächlich einigermaßen semantisch
+        # aber die Teilung ist tatsächlich einigermaßen semantisch
         # breakpoint_threshold_type hat wenig Einfluss
-        text_splitter = SemanticChunker(
+        # BatchedSemanticChunker statt SemanticChunker: jeder Satz wird nur einmal und in Batches
+        # eingebettet (SemanticChunker: ca. 3 Minuten), siehe benchmarks/semantic_splitter.py
+        from utils.semanticsplitter import BatchedSemanticChunker
+
+        text_splitter = BatchedSemanticChunker(
             get_embeddingsmodel(), breakpoint_threshold_type="percentile"
         )
     return text_splitter
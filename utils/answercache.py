@@ -0,0 +1,161 @@
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+from utils.aiutils import get_embeddingsmodel
+from utils.AppSettings import get_settings
+from utils.pgutils import pg_get_collection_version
+
+settings = get_settings()
+
+
+class _CollectionCache:
+    def __init__(self, version: str, dimensions: int):
+        self.version = version
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        self.entries: list[dict] = []
+        # partition of every entry, see AnswerCache
+        self.partitions: list[str] = []
+
+
+class AnswerCache:
+    """Semantic cache for RAG answers, per collection.
+
+    A question is a hit, if the cosine similarity to a cached question is at least threshold
+    and both were asked in the same partition (e.g. the search_kwargs and the model of the
+    request), an answer of a filtered search is never returned for an unfiltered one.
+    The entries of a collection are dropped as soon as its version changes
+    (version_getter, e.g. the state of the imports table), the version is checked
+    at most every version_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        embeddings_getter: Callable[[], Embeddings],
+        version_getter: Callable[[str], str],
+        threshold: float = 0.95,
+        max_entries: int = 256,
+        version_ttl: float = 5.0,
+    ):
+        self.embeddings_getter = embeddings_getter
+        self.version_getter = version_getter
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._collections: dict[str, _CollectionCache] = {}
+        self._versions: dict[str, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _version(self, collection_name: str) -> str:
+        version, checked = self._versions.get(collection_name, ("", 0.0))
+        if time.monotonic() - checked > self.version_ttl:
+            version = self.version_getter(collection_name)
+            self._versions[collection_name] = (version, time.monotonic())
+        return version
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(
+            self.embeddings_getter().embed_query(question), dtype=np.float32
+        )
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(
+        self,
+        collection_name: str,
+        question: str,
+        threshold: float | None = None,
+        partition: str = "",
+    ) -> dict | None:
+        """Returns the cached entry (generation, documents, ...) of the most similar question or None."""
+        version = self._version(collection_name)
+        vector = self._embed(question)
+        with self._lock:
+            cache = self._collections.get(collection_name)
+            if cache is None or cache.version != version or not cache.entries:
+                self.misses += 1
+                return None
+            similarities = cache.vectors @ vector
+            other = np.fromiter(
+                (p != partition for p in cache.partitions),
+                dtype=bool,
+                count=len(cache.partitions),
+            )
+            similarities[other] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < (threshold or self.threshold):
+                self.misses += 1
+                return None
+            entry = cache.entries[best]
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+        logger.debug(
+            f"Answer cache hit ({similarities[best]:.3f}): '{question}' ~ '{entry['question']}'"
+        )
+        return entry
+
+    def store(
+        self,
+        collection_name: str,
+        question: str,
+        generation: str,
+        documents: list[Document],
+        latency: float,
+        partition: str = "",
+    ):
+        version = self._version(collection_name)
+        vector = self._embed(question)
+        with self._lock:
+            cache = self._collections.get(collection_name)
+            if cache is None or cache.version != version:
+                cache = _CollectionCache(version, len(vector))
+                self._collections[collection_name] = cache
+            if len(cache.entries) >= self.max_entries:
+                # drop the oldest entry
+                cache.vectors = cache.vectors[1:]
+                cache.entries.pop(0)
+                cache.partitions.pop(0)
+            cache.vectors = np.vstack([cache.vectors, vector])
+            cache.entries.append(
+                {
+                    "question": question,
+                    "generation": generation,
+                    "documents": documents,
+                    "latency": latency,
+                }
+            )
+            cache.partitions.append(partition)
+
+    def invalidate(self, collection_name: str):
+        with self._lock:
+            self._collections.pop(collection_name, None)
+            self._versions.pop(collection_name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries": {
+                    name: len(cache.entries)
+                    for name, cache in self._collections.items()
+                },
+            }
+
+
+answer_cache = AnswerCache(
+    get_embeddingsmodel,
+    pg_get_collection_version,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+)
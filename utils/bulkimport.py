@@ -0,0 +1,315 @@
+import multiprocessing
+import pathlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from langchain_core.documents import Document
+from loguru import logger
+
+from utils.aiutils import get_splitter
+from utils.answercache import answer_cache
+from utils.AppSettings import get_settings
+from utils.bulkingest import BulkWriter
+from utils.fileutils import upload_dir
+from utils.importer import get_loader, iter_chunks, with_chunk_ids
+from utils.pgutils import (
+    pg_delete_chunks,
+    pg_get_source_chunk_ids,
+    pg_save_import,
+    pg_update_import,
+)
+from utils.retriever import get_vectorstore
+
+settings = get_settings()
+
+import_suffixes = {".pdf", ".docx", ".txt", ".md"}
+
+
+def list_import_files(directory: pathlib.Path) -> list[tuple[str, str]]:
+    """(path, file name) of the importable files below the directory, the file name is
+    the path relative to the upload directory (the source of the chunks).
+    Links pointing outside of the upload directory are skipped."""
+    root = upload_dir.resolve()
+    files = []
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in import_suffixes:
+            continue
+        resolved = path.resolve()
+        if not resolved.is_relative_to(root):
+            logger.warning(f"Skipping {path}: {resolved} is outside of {root}")
+            continue
+        files.append((str(path), resolved.relative_to(root).as_posix()))
+    return files
+
+
+def parse_file(
+    file_path: str, file_name: str, splitter_type: str, import_id: int
+) -> tuple[list[Document], float]:
+    """Loads and splits a file (runs in a worker process), returns the chunks and the seconds."""
+    start = time.perf_counter()
+    chunks = list(
+        iter_chunks(
+            get_loader(file_path).lazy_load(),
+            get_splitter(splitter_type),
+            metadata={"source": file_name, "import_id": import_id},
+            set_page=pathlib.Path(file_name).suffix.lower() != ".pdf",
+        )
+    )
+    return chunks, time.perf_counter() - start
+
+
+class _File:
+    """State of one file of a bulk import."""
+
+    def __init__(self, import_id: int, file_path: str, file_name: str):
+        self.import_id = import_id
+        self.file_path = file_path
+        self.file_name = file_name
+        self.existing: set[str] = set()
+        self.seen: set[str] = set()
+        self.pending = 0
+        self.added = 0
+        self.done = False
+
+
+class BulkImport:
+    """Imports many files of one collection: the files are parsed in a process pool,
+    the new chunks of all files are embedded and written in shared batches.
+    Every file has its own imports row and is updated incrementally like run_import.
+    """
+
+    def __init__(
+        self,
+        files: list[tuple[int, str, str]],
+        splitter_type: str,
+        collection_name: str,
+        parse_workers: int = settings.IMPORT_PARSE_WORKERS,
+        batch_size: int = settings.IMPORT_BATCH_SIZE,
+    ):
+        self.id = uuid.uuid4().hex
+        self.files = {
+            import_id: _File(import_id, file_path, file_name)
+            for import_id, file_path, file_name in files
+        }
+        self.splitter_type = splitter_type
+        self.collection_name = collection_name
+        self.parse_workers = parse_workers
+        self.batch_size = batch_size
+        self.status = "queued"
+        self.error = None
+        self.writer = BulkWriter(get_vectorstore(collection_name=collection_name))
+        self.parse = {"files": 0, "failed": 0, "bytes": 0, "chunks": 0, "seconds": 0.0}
+        self.started = self.finished = None
+        # end of the parsing, the embedding of the first files runs in parallel
+        self._parsed = None
+        self._buffer: list[Document] = []
+
+    def _finish_file(self, file: _File):
+        file.done = True
+        deleted = pg_delete_chunks(list(file.existing - file.seen))
+        pg_update_import(
+            file.import_id,
+            status="done",
+            stage="done",
+            chunks_total=len(file.seen),
+            chunks_done=file.added,
+            chunks_added=file.added,
+            chunks_unchanged=len(file.seen & file.existing),
+            chunks_deleted=deleted,
+        )
+        if file.added or deleted:
+            answer_cache.invalidate(self.collection_name)
+
+    def _flush(self, final: bool = False):
+        # a batch may contain chunks of several files, a file is done with its last chunk
+        while len(self._buffer) >= self.batch_size or (final and self._buffer):
+            batch = self._buffer[: self.batch_size]
+            self._buffer = self._buffer[self.batch_size :]
+            self.writer.write(batch)
+            for doc in batch:
+                file = self.files[doc.metadata["import_id"]]
+                file.added += 1
+                file.pending -= 1
+                if file.pending == 0:
+                    self._finish_file(file)
+
+    def _add(self, file: _File, chunks: list[Document]):
+        file.existing = pg_get_source_chunk_ids(self.collection_name, file.file_name)
+        new = []
+        for doc in with_chunk_ids(chunks, self.collection_name, file.file_name):
+            if doc.id not in file.seen:
+                file.seen.add(doc.id)
+                if doc.id not in file.existing:
+                    new.append(doc)
+        pg_update_import(file.import_id, stage="embedding", chunks_total=len(file.seen))
+        file.pending = len(new)
+        if not new:
+            self._finish_file(file)
+            return
+        self._buffer.extend(new)
+        self._flush()
+
+    def _parse_done(self, future):
+        self._parsed = time.perf_counter()
+
+    def run(self):
+        self.status = "running"
+        self.started = time.perf_counter()
+        for file in self.files.values():
+            pg_update_import(file.import_id, status="running", stage="parsing")
+        # spawn: the server process has threads (pools, loguru), fork could copy held locks
+        with ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    parse_file,
+                    file.file_path,
+                    file.file_name,
+                    self.splitter_type,
+                    file.import_id,
+                ): file
+                for file in self.files.values()
+            }
+            for future in futures:
+                future.add_done_callback(self._parse_done)
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    chunks, seconds = future.result()
+                except Exception as e:
+                    logger.error(
+                        f"Import {file.import_id} ({file.file_name}) failed: {e}"
+                    )
+                    pg_update_import(file.import_id, status="failed", error=str(e))
+                    file.done = True
+                    self.parse["failed"] += 1
+                    continue
+                self.parse["files"] += 1
+                self.parse["bytes"] += pathlib.Path(file.file_path).stat().st_size
+                self.parse["chunks"] += len(chunks)
+                self.parse["seconds"] += seconds
+                self._add(file, chunks)
+        self._flush(final=True)
+        self.finished = time.perf_counter()
+        self.status = "done"
+        logger.success(f"Bulk import {self.id} done: {self.stats()}")
+
+    def stats(self) -> dict:
+        """Throughput per stage: parse (process pool), embed and write (shared batches)."""
+        write = self.writer.stats()
+        parse_wall = self._parsed - self.started if self._parsed else 0.0
+        return {
+            "bulk_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "collection_name": self.collection_name,
+            "files": len(self.files),
+            "imports": [
+                {"import_id": file.import_id, "file_name": file.file_name}
+                for file in self.files.values()
+            ],
+            "parse": {
+                **{key: round(value, 3) for key, value in self.parse.items()},
+                "wall_seconds": round(parse_wall, 3),
+                "workers": self.parse_workers,
+                "files_per_second": (
+                    round(self.parse["files"] / parse_wall, 2) if parse_wall else None
+                ),
+                "mb_per_second": (
+                    round(self.parse["bytes"] / 2**20 / parse_wall, 2)
+                    if parse_wall
+                    else None
+                ),
+            },
+            "embed": {
+                "chunks": write["rows"],
+                "seconds": write["embed_seconds"],
+                "chunks_per_second": (
+                    round(write["rows"] / write["embed_seconds"])
+                    if write["embed_seconds"]
+                    else None
+                ),
+            },
+            "write": {
+                "mode": write["mode"],
+                "rows": write["rows"],
+                "seconds": write["write_seconds"],
+                "rows_per_second": write["rows_per_second"],
+            },
+            "seconds": (
+                round((self.finished or time.perf_counter()) - self.started, 3)
+                if self.started
+                else None
+            ),
+        }
+
+
+class BulkImportQueue:
+    """Runs the bulk imports one after another and keeps the latest max_jobs for their status."""
+
+    def __init__(self, max_jobs: int = 32):
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, BulkImport] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="bulk_import"
+        )
+
+    def submit(
+        self,
+        files: list[tuple[str, str]],
+        splitter_type: str,
+        collection_name: str,
+    ) -> BulkImport:
+        """files: (path, file name), an imports row is created for every file."""
+        now = datetime.now()
+        jobs = [
+            (
+                pg_save_import(
+                    file_name=file_name,
+                    file_size=pathlib.Path(file_path).stat().st_size,
+                    import_date=now,
+                    collection_name=collection_name,
+                    status="queued",
+                    splitter_type=splitter_type,
+                    file_path=file_path,
+                ),
+                file_path,
+                file_name,
+            )
+            for file_path, file_name in files
+        ]
+        bulk = BulkImport(jobs, splitter_type, collection_name)
+        with self._lock:
+            self._jobs[bulk.id] = bulk
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, bulk)
+        return bulk
+
+    @staticmethod
+    def _run(bulk: BulkImport):
+        try:
+            bulk.run()
+        except Exception as e:
+            logger.exception(f"Bulk import {bulk.id} failed: {e}")
+            bulk.status = "failed"
+            bulk.error = str(e)
+            for file in bulk.files.values():
+                if not file.done:
+                    pg_update_import(file.import_id, status="failed", error=str(e))
+
+    def get(self, bulk_id: str) -> BulkImport | None:
+        return self._jobs.get(bulk_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+bulk_imports = BulkImportQueue()
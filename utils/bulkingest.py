@@ -0,0 +1,169 @@
+import contextlib
+import threading
+import time
+import uuid
+import weakref
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_postgres.vectorstores import PGVector
+from loguru import logger
+from pgvector.psycopg import register_vector
+from psycopg.types.json import Jsonb
+from sqlalchemy.engine import Engine
+
+# collection name -> uuid of langchain_pg_collection
+_collection_ids: dict[str, uuid.UUID] = {}
+# psycopg connections of the pool with the vector type registered
+_registered = weakref.WeakSet()
+_lock = threading.Lock()
+
+_copy_sql = (
+    "COPY langchain_pg_embedding (id, collection_id, embedding, document, cmetadata) "
+    "FROM STDIN WITH (FORMAT BINARY)"
+)
+_copy_types = ["varchar", "uuid", "vector", "varchar", "jsonb"]
+
+
+def supports_copy(vectorstore: VectorStore) -> bool:
+    """COPY needs a PGVector on a sync SQLAlchemy engine (psycopg 3)."""
+    return (
+        isinstance(vectorstore, PGVector)
+        and isinstance(getattr(vectorstore, "_engine", None), Engine)
+        and vectorstore._engine.dialect.driver == "psycopg"
+    )
+
+
+def _collection_id(conn, collection_name: str) -> uuid.UUID:
+    collection_id = _collection_ids.get(collection_name)
+    if collection_id is None:
+        row = conn.execute(
+            "SELECT uuid FROM langchain_pg_collection WHERE name = %s",
+            (collection_name,),
+        ).fetchone()
+        if row is None:
+            raise LookupError(f"Collection '{collection_name}' nicht gefunden")
+        collection_id = row[0]
+        with _lock:
+            _collection_ids[collection_name] = collection_id
+    return collection_id
+
+
+def _register(conn):
+    # the type lookup of register_vector costs a query, once per pooled connection
+    if conn not in _registered:
+        register_vector(conn)
+        _registered.add(conn)
+
+
+def copy_documents(
+    vectorstore: PGVector,
+    documents: list[Document],
+    embeddings: list[list[float]],
+) -> list[str]:
+    """Writes the chunks with COPY ... FROM STDIN (binary) in one transaction.
+
+    Chunks without id get a uuid like in PGVector.add_documents. COPY cannot update
+    rows, existing ids fail the transaction (nothing is written).
+
+    Returns:
+        list[str]: the ids of the chunks
+    """
+    ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+    with contextlib.closing(vectorstore._engine.raw_connection()) as raw:
+        conn = raw.driver_connection
+        try:
+            _register(conn)
+            collection_id = _collection_id(conn, vectorstore.collection_name)
+            with conn.cursor() as cur:
+                with cur.copy(_copy_sql) as copy:
+                    copy.set_types(_copy_types)
+                    for id, doc, embedding in zip(ids, documents, embeddings):
+                        copy.write_row(
+                            (
+                                id,
+                                collection_id,
+                                embedding,
+                                doc.page_content,
+                                Jsonb(doc.metadata),
+                            )
+                        )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # the collection may have been deleted and created again
+            with _lock:
+                _collection_ids.pop(vectorstore.collection_name, None)
+            raise
+    return ids
+
+
+class BulkWriter:
+    """Embeds and writes batches of chunks: with COPY if the vectorstore supports it,
+    else (or after an error of COPY) with the INSERT of the vectorstore.
+    Measures the time of embedding and writing, see stats().
+
+    ### Example
+
+    ```python
+    writer = BulkWriter(get_vectorstore(collection_name))
+    for batch in batched(chunks, 64):
+        ids = writer.write(batch)
+    logger.info(writer.stats())
+    ```
+    """
+
+    def __init__(self, vectorstore: VectorStore, use_copy: bool = True):
+        self.vectorstore = vectorstore
+        self.use_copy = use_copy and supports_copy(vectorstore)
+        self.rows = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def _embed(self, documents: list[Document]) -> list[list[float]]:
+        start = time.perf_counter()
+        embeddings = self.vectorstore.embeddings.embed_documents(
+            [doc.page_content for doc in documents]
+        )
+        self.embed_seconds += time.perf_counter() - start
+        return embeddings
+
+    def _timed(self, function, *args, **kwargs) -> list[str]:
+        start = time.perf_counter()
+        ids = function(*args, **kwargs)
+        self.write_seconds += time.perf_counter() - start
+        self.rows += len(ids)
+        return ids
+
+    def write(self, documents: list[Document]) -> list[str]:
+        if not hasattr(self.vectorstore, "add_embeddings"):
+            # add_documents embeds and inserts, the time is counted as writing
+            return self._timed(self.vectorstore.add_documents, documents)
+        embeddings = self._embed(documents)
+        if self.use_copy:
+            try:
+                return self._timed(
+                    copy_documents, self.vectorstore, documents, embeddings
+                )
+            except Exception as e:
+                logger.warning(f"COPY failed, falling back to INSERT: {e}")
+                self.use_copy = False
+        ids = [doc.id for doc in documents]
+        return self._timed(
+            self.vectorstore.add_embeddings,
+            texts=[doc.page_content for doc in documents],
+            embeddings=embeddings,
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids if all(ids) else None,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "mode": "copy" if self.use_copy else "insert",
+            "rows": self.rows,
+            "embed_seconds": round(self.embed_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+            "rows_per_second": (
+                round(self.rows / self.write_seconds) if self.write_seconds else None
+            ),
+        }
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalization for the cache key: unicode NFC, collapsed whitespace, stripped."""
+    return _whitespace.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings model with a persistent, content-addressed cache.
+
+    The key is the hash of model name, kind (query/document) and normalized text,
+    the vectors are stored as float32 in a local SQLite file.
+    If the cache holds more than max_entries, the least recently used entries are evicted.
+
+    ### Example
+
+    ```python
+    embeddings = CachedEmbeddings(OllamaEmbeddings(...), "ollama:bge-m3", "./data/cache/embeddings.sqlite")
+    vectors = embeddings.embed_documents(texts)
+    ```
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        db_file: str,
+        max_entries: int = 200_000,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(db_file):
+            os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()[0]
+
+    def _key(self, text: str, kind: str) -> str:
+        # query and document embeddings may differ (instruction prefixes), so both are part of the key
+        value = f"{self.model_name}\x00{kind}\x00{normalize_text(text)}"
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+    def _select(self, columns: str, keys: list[str]) -> list[tuple]:
+        rows = []
+        # SQLite allows 999 parameters per statement in older versions
+        for i in range(0, len(keys), 500):
+            part = keys[i : i + 500]
+            rows.extend(
+                self._conn.execute(
+                    f"SELECT {columns} FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+            )
+        return rows
+
+    def _get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            found.update(
+                (key, array("f", vector).tolist())
+                for key, vector in self._select("key, vector", keys)
+            )
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _put_many(self, items: dict[str, list[float]]):
+        now = time.time()
+        with self._lock:
+            # another thread may have stored some of the keys meanwhile, they are replaced
+            existing = len(self._select("key", list(items)))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (key, array("f", vector).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+            self._entries += len(items) - existing
+            if self._entries > self.max_entries:
+                # evict 10% more than needed, so not every insert has to evict
+                to_evict = self._entries - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (to_evict,),
+                )
+                self.evictions += to_evict
+                self._entries = self._conn.execute(
+                    "SELECT COUNT(*) FROM embeddings"
+                ).fetchone()[0]
+                logger.debug(f"Embedding cache: {to_evict} entries evicted")
+            self._conn.commit()
+
+    def _embed(self, texts: list[str], kind: str) -> list[list[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        cached = self._get_many(list(set(keys)))
+
+        # embed every missing text only once, even if it occurs several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            if kind == "query":
+                vectors = [
+                    self.embeddings.embed_query(text) for text in missing.values()
+                ]
+            else:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._put_many(new)
+            cached.update(new)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], "query")[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+            }
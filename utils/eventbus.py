@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import threading
+from collections import deque
+from typing import AsyncIterator, Iterable
+
+
+class EventBus:
+    """In-process pub/sub for state changes (e.g. the bot status of the Fleet).
+
+    Publishing appends to one bounded log of (sequence, key, event) and wakes the
+    subscribers, it never waits for them and costs the same for any number of them.
+    Every subscriber reads the log from its own position and coalesces the events by
+    key, a bot toggled several times since the last read is sent once with its latest
+    state. A subscriber that falls behind the log (max_events) gets a "resync" event
+    and should reload the state (e.g. GET /supervisor/bots).
+    publish can be called from any thread, subscribe runs in the event loop.
+
+    ### Example
+
+    ```python
+    bus = EventBus()
+    bus.publish("red", {"id": "red", "status": "busy"})
+
+    async for batch in bus.subscribe():
+        for sequence, event in batch:
+            ...
+    ```
+    """
+
+    def __init__(self, max_events: int = 100_000):
+        self._events: deque[tuple[int, str, dict]] = deque(maxlen=max_events)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.published = 0
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the last event."""
+        return self._sequence
+
+    def publish(self, key: str, event: dict):
+        self.publish_many([(key, event)])
+
+    def publish_many(self, events: Iterable[tuple[str, dict]]):
+        with self._lock:
+            for key, event in events:
+                self._sequence += 1
+                self._events.append((self._sequence, key, event))
+                self.published += 1
+            waiters = list(self._waiters)
+        for loop, ready in waiters:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # the loop of the subscriber is closed
+                pass
+
+    def _read(self, position: int) -> tuple[list[tuple[int, dict]], int, bool]:
+        """Coalesced events after position, the new position and whether events were lost."""
+        with self._lock:
+            if not self._events or self._sequence <= position:
+                return [], self._sequence, False
+            first = self._events[0][0]
+            lost = position + 1 < first
+            start = max(position + 1 - first, 0)
+            latest: dict[str, tuple[int, dict]] = {}
+            for sequence, key, event in itertools.islice(self._events, start, None):
+                # the key moves to the end, the batch stays in the order of the last changes
+                latest.pop(key, None)
+                latest[key] = (sequence, event)
+            return list(latest.values()), self._sequence, lost
+
+    async def subscribe(
+        self, since: int | None = None, coalesce: float = 0.1
+    ) -> AsyncIterator[list[tuple[int, dict]]]:
+        """Batches of (sequence, event) after the sequence since (default: from now on).
+        coalesce: seconds to wait after a wake-up, rapid toggles within them are sent once.
+        """
+        ready = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ready)
+        with self._lock:
+            position = self._sequence if since is None else since
+            self._waiters.add(waiter)
+        # events after since may already be there
+        ready.set()
+        try:
+            while True:
+                await ready.wait()
+                ready.clear()
+                if coalesce:
+                    await asyncio.sleep(coalesce)
+                batch, position, lost = self._read(position)
+                if lost:
+                    yield [(position, {"type": "resync"})]
+                    continue
+                if batch:
+                    yield batch
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sequence": self._sequence,
+                "published": self.published,
+                "buffered": len(self._events),
+                "subscribers": len(self._waiters),
+            }
@@ -1,8 +1,10 @@
+import pathlib
 import shutil
 import time
 from typing import List, Tuple
 import urllib.request
 import os
+import zipfile
 
 from fastapi import UploadFile
 from langchain_core.documents import Document
@@ -32,6 +34,37 @@ def save_file(file_upload: UploadFile, filename: str) -> Tuple[str, str]:
     return new_filename, save_to
 
 
+upload_dir = pathlib.Path("./data/upload")
+
+
+def get_upload_subdir(directory: str) -> pathlib.Path:
+    """Directory below ./data/upload, raises ValueError for paths outside of it."""
+    root = upload_dir.resolve()
+    path = (root / directory).resolve()
+    if path != root and root not in path.parents:
+        raise ValueError(f"{directory} liegt nicht unter {upload_dir}")
+    if not path.is_dir():
+        raise ValueError(f"{directory} ist kein Verzeichnis")
+    return path
+
+
+def extract_zip(file_upload: UploadFile, filename: str = "") -> pathlib.Path:
+    """Extracts an uploaded zip into ./data/upload/<name of the zip>/ (replacing the
+    files of an earlier upload with the same name), returns the directory."""
+    name = pathlib.Path(filename or file_upload.filename).stem
+    if not is_valid_filename(name):
+        raise ValueError(f"Ungültiger Dateiname: {name}")
+    target = (upload_dir / name).resolve()
+    with zipfile.ZipFile(file_upload.file) as archive:
+        for member in archive.infolist():
+            path = (target / member.filename).resolve()
+            # no paths outside of the target ("zip slip")
+            if target not in path.parents:
+                raise ValueError(f"Ungültiger Pfad im Archiv: {member.filename}")
+        archive.extractall(target)
+    return target
+
+
 def save_file_url(href: str, filename: str = None) -> Tuple[str, str]:
 
     if filename:
@@ -0,0 +1,216 @@
+import threading
+import time
+from typing import Iterable, Literal
+
+import numpy as np
+
+from utils.eventbus import EventBus
+from utils.pinutils import Led
+
+BotStatus = Literal["offline", "idle", "busy"]
+statuses: tuple[str, ...] = ("offline", "idle", "busy")
+status_codes = {status: code for code, status in enumerate(statuses)}
+# blink interval of the LED of a bot per status, offline: LED off
+blink_speeds = {"idle": 1.0, "busy": 0.25}
+
+
+def _code(status: str) -> int:
+    try:
+        return status_codes[status]
+    except KeyError:
+        raise ValueError(f"Unbekannter Status: {status}") from None
+
+
+class Fleet:
+    """Registry of the bots: the status and the time of the last change are kept in
+    NumPy columns, the bots are found by id with a dict (id -> row).
+    Bulk transitions and filters work on the columns, not on Python objects per bot.
+    Bots with an LED (e.g. the three on the Raspberry Pi) blink according to their status.
+    With an EventBus every change is published (key: the bot id), e.g. for /supervisor/events.
+
+    ### Example
+
+    ```python
+    fleet = Fleet()
+    fleet.add("red", led=Led("red"))
+    fleet.add_many(f"sim-{i}" for i in range(10_000))
+    fleet.transition("idle", where="offline")
+    fleet.select("idle", limit=10)
+    ```
+    """
+
+    def __init__(self, capacity: int = 1024, events: EventBus | None = None):
+        self.events = events
+        self._lock = threading.RLock()
+        self.ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._status = np.zeros(capacity, dtype=np.int8)
+        self._since = np.zeros(capacity, dtype=np.float64)
+        self._leds: dict[int, Led] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, bot_id: str) -> bool:
+        return bot_id in self._rows
+
+    def _reserve(self, count: int):
+        size = len(self.ids) + count
+        if size > len(self._status):
+            capacity = max(size, 2 * len(self._status))
+            self._status = np.resize(self._status, capacity)
+            self._since = np.resize(self._since, capacity)
+
+    def add(self, bot_id: str, status: BotStatus = "offline", led: Led | None = None):
+        self.add_many([bot_id], status)
+        if led is not None:
+            with self._lock:
+                row = self._rows[bot_id]
+                self._leds[row] = led
+                self._update_leds(np.array([row]))
+
+    def add_many(self, bot_ids: Iterable[str], status: BotStatus = "offline") -> int:
+        """Adds the bots that are not registered yet, returns their number."""
+        code = _code(status)
+        with self._lock:
+            new = [bot_id for bot_id in dict.fromkeys(bot_ids) if bot_id not in self]
+            self._reserve(len(new))
+            start = len(self.ids)
+            self._rows.update(zip(new, range(start, start + len(new))))
+            self.ids.extend(new)
+            self._status[start : len(self.ids)] = code
+            self._since[start : len(self.ids)] = time.time()
+            self._publish(np.arange(start, len(self.ids)), "added")
+            return len(new)
+
+    def _row(self, bot_id: str) -> int:
+        try:
+            return self._rows[bot_id]
+        except KeyError:
+            raise LookupError(f"Bot {bot_id} nicht gefunden") from None
+
+    def _bot(self, row: int) -> dict:
+        return {
+            "id": self.ids[row],
+            "status": statuses[self._status[row]],
+            "since": float(self._since[row]),
+            "pin": self._leds[row].pin if row in self._leds else None,
+        }
+
+    def get(self, bot_id: str) -> dict:
+        with self._lock:
+            return self._bot(self._row(bot_id))
+
+    def status(self, bot_id: str) -> BotStatus:
+        # a single read, no lock needed
+        return statuses[self._status.item(self._row(bot_id))]
+
+    def led(self, bot_id: str) -> Led | None:
+        return self._leds.get(self._row(bot_id))
+
+    def set_status(self, bot_id: str, status: BotStatus) -> bool:
+        """Returns False if the bot already had the status."""
+        return self.transition(status, bot_ids=[bot_id]) == 1
+
+    def _rows_of(self, bot_ids: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._row(bot_id) for bot_id in bot_ids), dtype=np.int64)
+
+    def _mask(
+        self, bot_ids: Iterable[str] | None = None, where: BotStatus | None = None
+    ) -> np.ndarray:
+        n = len(self.ids)
+        if bot_ids is None:
+            mask = np.ones(n, dtype=bool)
+        else:
+            mask = np.zeros(n, dtype=bool)
+            mask[self._rows_of(bot_ids)] = True
+        if where is not None:
+            mask &= self._status[:n] == _code(where)
+        return mask
+
+    def _apply(self, rows: np.ndarray, codes: np.ndarray | int) -> np.ndarray:
+        """Sets the status of the rows, returns the rows that changed."""
+        changed = self._status[rows] != codes
+        rows = rows[changed]
+        self._status[rows] = codes if np.isscalar(codes) else codes[changed]
+        self._since[rows] = time.time()
+        self._update_leds(rows)
+        self._publish(rows)
+        return rows
+
+    def _publish(self, rows: np.ndarray, event_type: str = "status"):
+        if self.events is None or not len(rows):
+            return
+        codes = self._status[rows].tolist()
+        since = self._since[rows].tolist()
+        self.events.publish_many(
+            (
+                self.ids[row],
+                {
+                    "type": event_type,
+                    "id": self.ids[row],
+                    "status": statuses[code],
+                    "since": timestamp,
+                },
+            )
+            for row, code, timestamp in zip(rows.tolist(), codes, since)
+        )
+
+    def transition(
+        self,
+        status: BotStatus,
+        bot_ids: Iterable[str] | None = None,
+        where: BotStatus | None = None,
+    ) -> int:
+        """Sets the status of the bots (default: all), optionally only of those with the
+        status where. Returns the number of bots whose status changed."""
+        code = _code(status)
+        with self._lock:
+            rows = np.flatnonzero(self._mask(bot_ids, where))
+            return len(self._apply(rows, code))
+
+    def random_transitions(
+        self, probability: float = 0.2, rng: np.random.Generator | None = None
+    ) -> int:
+        """Every bot gets a random status with the probability (the simulated bots),
+        returns the number of bots whose status changed."""
+        rng = rng or np.random.default_rng()
+        with self._lock:
+            n = len(self.ids)
+            rows = np.flatnonzero(rng.random(n) < probability)
+            codes = rng.integers(0, len(statuses), len(rows)).astype(np.int8)
+            return len(self._apply(rows, codes))
+
+    def _update_leds(self, rows: np.ndarray):
+        if not self._leds or not len(rows):
+            return
+        for row in np.intersect1d(rows, list(self._leds)):
+            led = self._leds[int(row)]
+            speed = blink_speeds.get(statuses[self._status[row]])
+            if speed:
+                led.blink(speed)
+            else:
+                led.stop()
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            counts = np.bincount(self._status[: len(self.ids)], minlength=len(statuses))
+        return dict(zip(statuses, counts.tolist()))
+
+    def select(
+        self, status: BotStatus | None = None, offset: int = 0, limit: int = 100
+    ) -> dict:
+        """A page of the bots (optionally with the status), sorted by registration."""
+        with self._lock:
+            rows = np.flatnonzero(self._mask(where=status))
+            page = rows[offset : offset + limit]
+            return {
+                "total": len(rows),
+                "offset": offset,
+                "limit": limit,
+                "bots": [self._bot(int(row)) for row in page],
+            }
+
+    def shutdown(self):
+        for led in self._leds.values():
+            led.stop()
@@ -0,0 +1,116 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Sequence
+
+from loguru import logger
+
+from utils.AppSettings import get_settings
+
+settings = get_settings()
+
+
+class GPIOBackend(ABC):
+    """Output pins of the LEDs. The backend is selected once at startup (GPIO_BACKEND),
+    utils.pinutils only calls these methods."""
+
+    name = "none"
+
+    def init(self):
+        pass
+
+    def setup(self, pin: int):
+        pass
+
+    @abstractmethod
+    def output(self, pins: Sequence[int], values: Sequence[bool]):
+        """Writes several pins in one call (one tick of the LedScheduler)."""
+
+    @abstractmethod
+    def input(self, pin: int) -> bool:
+        pass
+
+    def cleanup(self):
+        pass
+
+
+class RPiBackend(GPIOBackend):
+    """RPi.GPIO on the Raspberry Pi (BCM numbering)."""
+
+    name = "rpi"
+
+    def __init__(self):
+        import RPi.GPIO as GPIO  # type: ignore
+
+        self._gpio = GPIO
+
+    def init(self):
+        self._gpio.setmode(self._gpio.BCM)
+
+    def setup(self, pin: int):
+        self._gpio.setup(pin, self._gpio.OUT)
+
+    def output(self, pins: Sequence[int], values: Sequence[bool]):
+        self._gpio.output(list(pins), list(values))
+
+    def input(self, pin: int) -> bool:
+        return bool(self._gpio.input(pin))
+
+    def cleanup(self):
+        self._gpio.cleanup()
+
+
+class SimBackend(GPIOBackend):
+    """In-memory pins for tests and load tests without a Raspberry Pi: keeps the value of
+    every pin and the last max_writes writes as (time.monotonic(), pin, value)."""
+
+    name = "sim"
+
+    def __init__(self, max_writes: int = 1_000_000):
+        self.values: dict[int, bool] = {}
+        self.writes: deque[tuple[float, int, bool]] = deque(maxlen=max_writes)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def setup(self, pin: int):
+        with self._lock:
+            self.values.setdefault(pin, False)
+
+    def output(self, pins: Sequence[int], values: Sequence[bool]):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            for pin, value in zip(pins, values):
+                self.values[pin] = bool(value)
+                self.writes.append((now, pin, bool(value)))
+
+    def input(self, pin: int) -> bool:
+        return self.values.get(pin, False)
+
+    def cleanup(self):
+        with self._lock:
+            self.values = dict.fromkeys(self.values, False)
+
+    def reset(self):
+        with self._lock:
+            self.values.clear()
+            self.writes.clear()
+            self.calls = 0
+
+
+backends = {"rpi": RPiBackend, "sim": SimBackend}
+
+
+def get_backend(name: str = settings.GPIO_BACKEND) -> GPIOBackend:
+    """rpi, sim or auto (rpi if RPi.GPIO can be imported, otherwise sim)."""
+    if name == "auto":
+        try:
+            return RPiBackend()
+        except (ImportError, RuntimeError) as e:
+            # RPi.GPIO raises a RuntimeError on Linux hosts which are no Raspberry Pi
+            logger.info(f"RPi.GPIO not available ({e}), using the simulated GPIO")
+            return SimBackend()
+    if name not in backends:
+        raise ValueError(f"Unbekanntes GPIO_BACKEND: {name}")
+    return backends[name]()
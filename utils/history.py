@@ -0,0 +1,179 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import Runnable
+from loguru import logger
+
+summary_prefix = "Zusammenfassung des bisherigen Gesprächs:\n"
+
+
+def count_tokens(messages: Sequence[AnyMessage]) -> int:
+    """Estimate without tokenizer: about 4 characters per token plus 4 per message."""
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+def _messages_hash(messages: Sequence[AnyMessage]) -> str:
+    value = "\x00".join(f"{m.type}:{m.content}" for m in messages)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class HistoryManager:
+    """Keeps the chat history within a token budget: the latest messages are sent
+    as they are, the older ones are replaced by a summary message (max_tokens 0: off).
+
+    The summary is cached per session and only extended by the messages that
+    dropped out of the window since the last summary, so every turn is summarized once.
+    The window is cut to half of the budget, the next turns are added to it
+    without a new summary until the budget is reached again.
+
+    ### Example
+
+    ```python
+    history = HistoryManager(lambda: get("summary_chain"), max_tokens=1536)
+    messages = history.compact(state["chat_history"], session_id)
+    ```
+    """
+
+    def __init__(
+        self,
+        summarizer_getter: Callable[[], Runnable],
+        max_tokens: int = 1536,
+        keep_messages: int = 2,
+        max_sessions: int = 256,
+    ):
+        self.summarizer_getter = summarizer_getter
+        self.max_tokens = max_tokens
+        self.keep_messages = keep_messages
+        self.max_sessions = max_sessions
+        self.summaries = 0
+        self.summarized_messages = 0
+        self.hits = 0
+        # session -> (number of summarized messages, hash of these messages, summary)
+        self._sessions: OrderedDict[str, tuple[int, str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def session_key(self, messages: Sequence[AnyMessage], session_id=None) -> str:
+        # without session id the first message identifies the conversation
+        return str(session_id) if session_id else _messages_hash(messages[:1])
+
+    def split(
+        self, messages: Sequence[AnyMessage]
+    ) -> tuple[list[AnyMessage], list[AnyMessage]]:
+        """Returns (older, window): the window is the longest tail within half of the
+        budget, at least keep_messages long and starting with a question if possible."""
+        budget = self.max_tokens // 2
+        start = len(messages)
+        tokens = 0
+        while start > 0:
+            tokens += count_tokens(messages[start - 1 : start])
+            if tokens > budget and len(messages) - start >= self.keep_messages:
+                break
+            start -= 1
+        while 0 < start < len(messages) - 1 and not isinstance(
+            messages[start], HumanMessage
+        ):
+            start += 1
+        return list(messages[:start]), list(messages[start:])
+
+    def fits(self, messages: Sequence[AnyMessage]) -> bool:
+        # max_tokens 0: no budget, the whole history is sent
+        return not self.max_tokens or count_tokens(messages) <= self.max_tokens
+
+    def window(self, messages: Sequence[AnyMessage]) -> list[AnyMessage]:
+        """Only the latest messages within the budget, without summary (no LLM call)."""
+        if self.fits(messages):
+            return list(messages)
+        return self.split(messages)[1]
+
+    def _cached(self, key: str, messages: Sequence[AnyMessage]) -> tuple[int, str]:
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry:
+                self._sessions.move_to_end(key)
+        if entry:
+            count, prefix_hash, summary = entry
+            # the client may send a different history, then the summary is rebuilt
+            if (
+                count < len(messages)
+                and _messages_hash(messages[:count]) == prefix_hash
+            ):
+                return count, summary
+        return 0, ""
+
+    def _store(self, key: str, older: list[AnyMessage], summary: str):
+        with self._lock:
+            self._sessions[key] = (len(older), _messages_hash(older), summary)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _summary_message(self, summary: str) -> SystemMessage:
+        return SystemMessage(content=summary_prefix + summary)
+
+    def _prepare(self, messages: Sequence[AnyMessage], session_id):
+        if self.fits(messages):
+            return None
+        key = self.session_key(messages, session_id)
+        count, summary = self._cached(key, messages)
+        if count and self.fits([self._summary_message(summary), *messages[count:]]):
+            return key, list(messages[:count]), list(messages[count:]), count, summary
+        older, window = self.split(messages)
+        if count > len(older):
+            older, window = list(messages[:count]), list(messages[count:])
+        return key, older, window, count, summary
+
+    def _summarizer_input(self, summary: str, new: list[AnyMessage]) -> dict:
+        self.summaries += 1
+        self.summarized_messages += len(new)
+        logger.debug(f"Summarizing {len(new)} messages of the chat history")
+        return {"summary": summary or "-", "messages": new}
+
+    def compact(
+        self, messages: Sequence[AnyMessage], session_id=None, config=None
+    ) -> list[AnyMessage]:
+        """Returns the messages to send: [summary] + window, or the messages as they are
+        if they fit into the budget."""
+        prepared = self._prepare(messages, session_id)
+        if prepared is None:
+            return list(messages)
+        key, older, window, count, summary = prepared
+        if not older:
+            return window
+        if count < len(older):
+            summary = self.summarizer_getter().invoke(
+                self._summarizer_input(summary, older[count:]), config
+            )
+            self._store(key, older, summary)
+        else:
+            self.hits += 1
+        return [self._summary_message(summary)] + window
+
+    async def acompact(
+        self, messages: Sequence[AnyMessage], session_id=None, config=None
+    ) -> list[AnyMessage]:
+        prepared = self._prepare(messages, session_id)
+        if prepared is None:
+            return list(messages)
+        key, older, window, count, summary = prepared
+        if not older:
+            return window
+        if count < len(older):
+            summary = await self.summarizer_getter().ainvoke(
+                self._summarizer_input(summary, older[count:]), config
+            )
+            self._store(key, older, summary)
+        else:
+            self.hits += 1
+        return [self._summary_message(summary)] + window
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_tokens": self.max_tokens,
+            "summaries": self.summaries,
+            "summarized_messages": self.summarized_messages,
+            "hits": self.hits,
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import re
+import threading
+import time
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_postgres.vectorstores import PGVector
+from loguru import logger
+from pydantic import ConfigDict, field_validator
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from utils.pgindex import AnnRetriever, _autocommit
+
+# ts configs whose index exists (checked or built by this process)
+_indexed: set[str] = set()
+_lock = threading.Lock()
+# ts configs whose index is built in a thread (ensure_fulltext_index_in_background)
+_building: set[str] = set()
+_building_lock = threading.Lock()
+
+
+def _checked_ts_config(ts_config: str) -> str:
+    # the config is part of the index expression, so it is written into the SQL
+    if not re.fullmatch(r"[a-z_]+", ts_config):
+        raise ValueError(f"Ungültige Textsuche-Konfiguration: {ts_config}")
+    return ts_config
+
+
+def _tsvector(ts_config: str) -> str:
+    return f"to_tsvector('{_checked_ts_config(ts_config)}'::regconfig, e.document)"
+
+
+def fulltext_index_name(ts_config: str) -> str:
+    return f"ix_langchain_pg_embedding_fts_{_checked_ts_config(ts_config)}"
+
+
+def ensure_fulltext_index(engine: Engine, ts_config: str = "german") -> bool:
+    """Creates the GIN index for the full-text search on langchain_pg_embedding (once per
+    process), CONCURRENTLY so running imports are not blocked during the build.
+    An invalid index left by a failed build is replaced. Returns True if it was built.
+    """
+    if ts_config in _indexed:
+        return False
+    with _lock:
+        if ts_config in _indexed:
+            return False
+        name = fulltext_index_name(ts_config)
+        expression = _tsvector(ts_config).replace("e.document", "document")
+        built = False
+        with _autocommit(engine) as conn:
+            valid = conn.execute(
+                text(
+                    "SELECT i.indisvalid FROM pg_index i "
+                    "WHERE i.indexrelid = to_regclass(:name)"
+                ),
+                {"name": name},
+            ).scalar()
+            if not valid:
+                start = time.perf_counter()
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                conn.execute(
+                    text(
+                        f"CREATE INDEX CONCURRENTLY {name} "
+                        f"ON langchain_pg_embedding USING gin ({expression})"
+                    )
+                )
+                built = True
+                logger.info(
+                    f"Full-text index ({ts_config}) created in {time.perf_counter() - start:.1f}s"
+                )
+        _indexed.add(ts_config)
+        return built
+
+
+def ensure_fulltext_index_in_background(engine: Engine, ts_config: str = "german"):
+    """ensure_fulltext_index in a thread (for the event loop), until it is built the
+    lexical search scans the collection."""
+    if ts_config in _indexed:
+        return
+    with _building_lock:
+        if ts_config in _building:
+            return
+        _building.add(ts_config)
+
+    def build():
+        try:
+            ensure_fulltext_index(engine, ts_config)
+        except Exception as e:
+            logger.warning(f"Full-text index ({ts_config}) failed: {e}")
+        finally:
+            with _building_lock:
+                _building.discard(ts_config)
+
+    threading.Thread(target=build, name="fulltext_index", daemon=True).start()
+
+
+def _lexical_query(ts_config: str, filtered: bool = False):
+    tsvector = _tsvector(ts_config)
+    # the metadata filter (equality only) as jsonb containment
+    metadata = "AND e.cmetadata @> CAST(:filter AS jsonb)" if filtered else ""
+    # questions are no search expressions: any term matches (OR), ts_rank_cd ranks
+    # the documents containing more (and closer) terms first
+    return text(f"""SELECT e.id, e.document, e.cmetadata
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+            CROSS JOIN (SELECT replace(plainto_tsquery('{ts_config}'::regconfig, :query)::text,
+                                       '&', '|')::tsquery AS q) query
+            WHERE c.name = :collection_name AND {tsvector} @@ query.q {metadata}
+            ORDER BY ts_rank_cd({tsvector}, query.q) DESC
+            LIMIT :k""")
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[Document]], k: int = 4, rrf_k: int = 60
+) -> list[Document]:
+    """Merges ranked lists: score = sum of 1 / (rrf_k + rank) over the lists."""
+    scores: dict[str, float] = {}
+    documents: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """Vector search and Postgres full-text search (GIN index), merged by
+    reciprocal rank fusion. Finds exact terms like article numbers the embeddings miss.
+
+    Like PGVector, a retriever on the async engine only supports the async methods.
+
+    ### Example
+
+    ```python
+    retriever = get_retriever(search_kwargs={"search_type": "hybrid", "k": 4})
+    documents = retriever.invoke("Was regelt Art. 12a?")
+    ```
+
+    filter restricts both searches to chunks with these metadata values
+    (e.g. {"source": "a.pdf"}), only equality filters are supported.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: PGVector
+    collection_name: str
+    engine: Engine | None = None
+    async_engine: AsyncEngine | None = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    ts_config: str = "german"
+    filter: dict | None = None
+    # vector search on the ANN index of the collection, if there is one
+    vector_search: AnnRetriever | None = None
+
+    @field_validator("filter")
+    @classmethod
+    def _equality_filter(cls, filter: dict | None) -> dict | None:
+        for key, value in (filter or {}).items():
+            if key.startswith("$") or isinstance(value, (dict, list)):
+                raise ValueError(
+                    f"Die hybride Suche unterstützt nur Gleichheitsfilter: {key}"
+                )
+        return filter or None
+
+    def _query(self):
+        return _lexical_query(self.ts_config, filtered=self.filter is not None)
+
+    def _params(self, query: str) -> dict:
+        params = {
+            "query": query,
+            "collection_name": self.collection_name,
+            "k": self.fetch_k,
+        }
+        if self.filter is not None:
+            params["filter"] = json.dumps(self.filter)
+        return params
+
+    def _to_documents(self, rows) -> list[Document]:
+        return [
+            Document(id=str(row.id), page_content=row.document, metadata=row.cmetadata)
+            for row in rows
+        ]
+
+    def lexical_search(self, query: str) -> list[Document]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(self._query(), self._params(query))
+            return self._to_documents(rows)
+
+    async def alexical_search(self, query: str) -> list[Document]:
+        async with self.async_engine.connect() as conn:
+            rows = await conn.execute(self._query(), self._params(query))
+            return self._to_documents(rows)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        if self.vector_search:
+            vector = self.vector_search.search(query, self.fetch_k)
+        else:
+            vector = self.vectorstore.similarity_search(
+                query, k=self.fetch_k, filter=self.filter
+            )
+        lexical = self.lexical_search(query)
+        return reciprocal_rank_fusion([vector, lexical], self.k, self.rrf_k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        if self.vector_search:
+            vector_search = self.vector_search.asearch(query, self.fetch_k)
+        else:
+            vector_search = self.vectorstore.asimilarity_search(
+                query, k=self.fetch_k, filter=self.filter
+            )
+        vector, lexical = await asyncio.gather(
+            vector_search,
+            self.alexical_search(query),
+        )
+        return reciprocal_rank_fusion([vector, lexical], self.k, self.rrf_k)
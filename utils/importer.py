@@ -0,0 +1,337 @@
+import codecs
+import itertools
+import pathlib
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from langchain_community.document_loaders import Docx2txtLoader, PyPDFLoader
+from langchain_community.document_loaders.helpers import detect_file_encodings
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import BaseDocumentTransformer, Document
+from langchain_core.vectorstores import VectorStore
+from langchain_text_splitters import TextSplitter
+from loguru import logger
+
+from utils.aiutils import get_splitter
+from utils.answercache import answer_cache
+from utils.AppSettings import get_settings
+from utils.bulkingest import BulkWriter
+from utils.pgutils import (
+    pg_delete_chunks,
+    pg_delete_import_chunks,
+    pg_get_source_chunk_ids,
+    pg_get_unfinished_imports,
+    pg_update_import,
+)
+from utils.retriever import get_vectorstore
+from utils.textnorm import get_normalizer
+
+settings = get_settings()
+
+# namespace of the content-hash ids of the chunks
+chunk_namespace = uuid.UUID("60dd95a7-00b5-494e-aa5b-728a1e4d85e4")
+
+
+class TextPageLoader(BaseLoader):
+    """Loads a text file lazily in pages of about page_size characters (cut at line ends),
+    so large text files are never completely in memory.
+    """
+
+    def __init__(self, file_path: str, page_size: int = 20_000):
+        self.file_path = file_path
+        self.page_size = page_size
+
+    def _detect_encoding(self) -> str:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            with open(self.file_path, "rb") as f:
+                while block := f.read(1 << 20):
+                    decoder.decode(block)
+            decoder.decode(b"", final=True)
+            return "utf-8"
+        except UnicodeDecodeError:
+            return detect_file_encodings(self.file_path)[0].encoding
+
+    def lazy_load(self) -> Iterator[Document]:
+        with open(self.file_path, encoding=self._detect_encoding()) as f:
+            lines, size = [], 0
+            for line in f:
+                lines.append(line)
+                size += len(line)
+                if size >= self.page_size:
+                    yield Document(page_content="".join(lines))
+                    lines, size = [], 0
+            if lines:
+                yield Document(page_content="".join(lines))
+
+
+def get_loader(file_path: str) -> BaseLoader:
+    suffix = pathlib.Path(file_path).suffix.lower()
+    if suffix == ".pdf":
+        return PyPDFLoader(file_path)
+    elif suffix == ".docx":
+        return Docx2txtLoader(file_path)
+    else:
+        return TextPageLoader(file_path)
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[list]:
+    """batched('ABCDE', 2) -> AB CD E"""
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, n)):
+        yield batch
+
+
+def iter_chunks(
+    pages: Iterable[Document],
+    text_splitter: TextSplitter | BaseDocumentTransformer,
+    metadata: dict | None = None,
+    set_page: bool = True,
+    normalize: Callable[[str], str] | None = None,
+) -> Iterator[Document]:
+    """Normalizes (default: the rules of TEXT_NORMALIZATION) and splits page by page,
+    only one page and its chunks are in memory at a time (splitters with
+    lazy_split_documents may collect a few pages, e.g. to embed them together).
+    """
+    normalize = normalize or get_normalizer()
+
+    def with_metadata():
+        for i, page in enumerate(pages):
+            page.page_content = normalize(page.page_content)
+            page.metadata.update(metadata or {})
+            if set_page:
+                page.metadata["page"] = i
+            yield page
+
+    if hasattr(text_splitter, "lazy_split_documents"):
+        docs = text_splitter.lazy_split_documents(with_metadata())
+    else:
+        docs = (
+            doc
+            for page in with_metadata()
+            for doc in text_splitter.split_documents([page])
+        )
+    yield from docs
+
+
+def import_documents(
+    chunks: Iterable[Document],
+    vectorstore: VectorStore,
+    batch_size: int = settings.IMPORT_BATCH_SIZE,
+    on_batch: Callable[[int], None] | None = None,
+    use_copy: bool = settings.IMPORT_BULK_COPY,
+) -> list[str]:
+    """Embeds and inserts the chunks in batches, the peak memory depends on the batch size,
+    not on the size of the document. With use_copy the batches are written with
+    COPY (utils.bulkingest), if the vectorstore does not support it with add_documents.
+
+    Args:
+        chunks (Iterable[Document]): the chunks, e.g. from iter_chunks
+        vectorstore (VectorStore): the target
+        batch_size (int): chunks per embedding call and insert
+        on_batch (Callable[[int], None] | None): called with the number of chunks done after each batch
+        use_copy (bool): bulk insert with COPY
+
+    Returns:
+        list[str]: the ids of the inserted chunks
+    """
+    writer = BulkWriter(vectorstore, use_copy=use_copy)
+    ids = []
+    for batch in batched(chunks, batch_size):
+        ids.extend(writer.write(batch))
+        if on_batch:
+            on_batch(len(ids))
+    stats = writer.stats()
+    logger.info(
+        f"{stats['rows']} chunks written ({stats['mode']}): embedding {stats['embed_seconds']}s, "
+        f"writing {stats['write_seconds']}s, {stats['rows_per_second']} rows/s"
+    )
+    return ids
+
+
+def chunk_id(collection_name: str, source: str, text: str, occurrence: int = 0) -> str:
+    """Deterministic id of a chunk: the same text of the same source gets the same id.
+    The ids are unique over all collections, so the collection is part of the hash,
+    occurrence numbers repeated texts (e.g. headers) within the source."""
+    return str(
+        uuid.uuid5(
+            chunk_namespace, f"{collection_name}\x00{source}\x00{occurrence}\x00{text}"
+        )
+    )
+
+
+def with_chunk_ids(
+    chunks: Iterable[Document], collection_name: str, source: str
+) -> Iterator[Document]:
+    occurrences: dict[str, int] = {}
+    for doc in chunks:
+        occurrence = occurrences.get(doc.page_content, 0)
+        occurrences[doc.page_content] = occurrence + 1
+        doc.id = chunk_id(collection_name, source, doc.page_content, occurrence)
+        yield doc
+
+
+def sync_chunks(
+    chunks: Iterable[Document],
+    collection_name: str,
+    source: str,
+    on_batch: Callable[[int], None] | None = None,
+) -> dict:
+    """Incremental import of a source: only new or changed chunks are embedded and
+    inserted, chunks of the source that are no longer there are deleted.
+    Unchanged chunks keep their metadata (e.g. the import_id of their first import).
+
+    Returns:
+        dict: chunks_total, chunks_added, chunks_unchanged, chunks_deleted
+    """
+    existing = pg_get_source_chunk_ids(collection_name, source)
+    seen = set()
+
+    def new_chunks():
+        for doc in with_chunk_ids(chunks, collection_name, source):
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
+            if doc.id not in existing:
+                yield doc
+
+    added = import_documents(
+        new_chunks(),
+        get_vectorstore(collection_name=collection_name),
+        on_batch=on_batch,
+    )
+    deleted = pg_delete_chunks(list(existing - seen))
+    return {
+        "chunks_total": len(seen),
+        "chunks_added": len(added),
+        "chunks_unchanged": len(seen & existing),
+        "chunks_deleted": deleted,
+    }
+
+
+def run_import(
+    import_id: int,
+    file_path: str,
+    file_name: str,
+    splitter_type: str,
+    collection_name: str,
+) -> dict:
+    """Load, split and embed a saved file, the progress is written to the imports table.
+    A file imported before (same name and collection) is updated incrementally, see sync_chunks.
+
+    Returns:
+        dict: the numbers of chunks (total, added, unchanged, deleted)
+    """
+    logger.debug(
+        f"Starting import {import_id} ({file_name}), collection_name: {collection_name}"
+    )
+    pg_update_import(import_id, status="running", stage="loading", error=None)
+
+    suffix = pathlib.Path(file_name).suffix.lower()
+    chunks = iter_chunks(
+        get_loader(file_path).lazy_load(),
+        get_splitter(splitter_type),
+        metadata={"source": file_name, "import_id": import_id},
+        set_page=suffix != ".pdf",
+    )
+    # the chunks are split while they are embedded, so the total grows until the end
+    progress = {"total": 0}
+
+    def counted(chunks: Iterable[Document]) -> Iterator[Document]:
+        for doc in chunks:
+            if progress["total"] == 0:
+                pg_update_import(import_id, stage="embedding")
+            progress["total"] += 1
+            # also reported for unchanged chunks, which are not embedded
+            if progress["total"] % settings.IMPORT_BATCH_SIZE == 0:
+                pg_update_import(import_id, chunks_total=progress["total"])
+            yield doc
+
+    stats = sync_chunks(
+        counted(chunks),
+        collection_name,
+        file_name,
+        on_batch=lambda done: pg_update_import(
+            import_id, chunks_done=done, chunks_total=progress["total"]
+        ),
+    )
+
+    pg_update_import(
+        import_id,
+        status="done",
+        stage="done",
+        chunks_done=stats["chunks_added"],
+        **stats,
+    )
+    if stats["chunks_added"] or stats["chunks_deleted"]:
+        answer_cache.invalidate(collection_name)
+    logger.success(
+        f"Import {import_id} ({file_name}) done, {stats['chunks_total']} chunks: "
+        f"{stats['chunks_added']} added, {stats['chunks_unchanged']} unchanged, "
+        f"{stats['chunks_deleted']} deleted"
+    )
+    return stats
+
+
+class ImportQueue:
+    """Bounded worker pool for the file imports.
+
+    The state of the jobs lives in the imports table, so unfinished jobs
+    can be resumed after a restart.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="import"
+        )
+
+    def submit(
+        self,
+        import_id: int,
+        file_path: str,
+        file_name: str,
+        splitter_type: str,
+        collection_name: str,
+    ) -> Future:
+        return self._executor.submit(
+            self._run,
+            import_id,
+            file_path,
+            file_name,
+            splitter_type,
+            collection_name,
+        )
+
+    @staticmethod
+    def _run(import_id: int, *args):
+        try:
+            return run_import(import_id, *args)
+        except Exception as e:
+            logger.exception(f"Import {import_id} failed: {e}")
+            pg_update_import(import_id, status="failed", error=str(e))
+
+    def resume(self):
+        """Requeues the imports which were interrupted by a restart.
+        Chunks they have already written are deleted first.
+        """
+        for job in pg_get_unfinished_imports():
+            deleted = pg_delete_import_chunks(job["id"], job["collection_name"])
+            logger.info(
+                f"Resuming import {job['id']} ({job['file_name']}), {deleted} old chunks deleted"
+            )
+            pg_update_import(job["id"], status="queued", stage="queued")
+            self.submit(
+                job["id"],
+                job["file_path"],
+                job["file_name"],
+                job["splitter_type"] or "recursive",
+                job["collection_name"],
+            )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+import_queue = ImportQueue(max_workers=settings.IMPORT_WORKERS)
@@ -0,0 +1,354 @@
+import threading
+import time
+from typing import Literal
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_postgres.vectorstores import PGVector
+from loguru import logger
+from pydantic import ConfigDict
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+Method = Literal["hnsw", "ivfflat"]
+methods = ("hnsw", "ivfflat")
+
+# The embedding column of langchain_pg_embedding has no dimension (every collection
+# may use another embedding model), so the indexes are partial indexes per collection
+# on embedding::vector(dims). Only cosine distance, the default of PGVector.
+index_prefix = "ix_ann_"
+# vector indexes support up to 2000 dimensions, halfvec (pgvector >= 0.7) up to 4000
+max_vector_dims = 2000
+max_halfvec_dims = 4000
+
+# collection name -> (time of the lookup, index or None)
+_indexes: dict[str, tuple[float, dict | None]] = {}
+_lock = threading.Lock()
+# collections whose index is looked up in a thread (cached_index)
+_refreshing: set[str] = set()
+# other workers may create or drop indexes, so the lookup is repeated after the ttl
+_index_ttl = 60.0
+
+
+def _collection_id(conn, collection_name: str) -> str:
+    row = conn.execute(
+        text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+        {"name": collection_name},
+    ).first()
+    if row is None:
+        raise LookupError(f"Collection '{collection_name}' nicht gefunden")
+    return str(row.uuid)
+
+
+def index_name(collection_id: str) -> str:
+    return index_prefix + collection_id.replace("-", "")
+
+
+def _vector_type(conn, dims: int) -> str:
+    if dims <= max_vector_dims:
+        return "vector"
+    version = conn.execute(
+        text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    ).scalar()
+    major, minor = (int(part) for part in version.split(".")[:2])
+    if dims <= max_halfvec_dims and (major, minor) >= (0, 7):
+        return "halfvec"
+    raise ValueError(
+        f"{dims} Dimensionen: ANN-Indizes unterstützen bis {max_vector_dims} (vector) "
+        f"bzw. {max_halfvec_dims} (halfvec, ab pgvector 0.7, installiert: {version})"
+    )
+
+
+def _dims(conn, collection_id: str) -> int:
+    dims = conn.execute(
+        text(
+            "SELECT vector_dims(embedding) FROM langchain_pg_embedding "
+            "WHERE collection_id = CAST(:collection_id AS uuid) LIMIT 1"
+        ),
+        {"collection_id": collection_id},
+    ).scalar()
+    if dims is None:
+        raise ValueError("Die Collection ist leer, die Dimension ist nicht bekannt")
+    return dims
+
+
+def _default_lists(conn, collection_id: str) -> int:
+    # recommendation of pgvector: rows / 1000 up to 1M rows, sqrt(rows) above
+    rows = conn.execute(
+        text(
+            "SELECT count(*) FROM langchain_pg_embedding "
+            "WHERE collection_id = CAST(:collection_id AS uuid)"
+        ),
+        {"collection_id": collection_id},
+    ).scalar()
+    return max(1, rows // 1000 if rows <= 1_000_000 else int(rows**0.5))
+
+
+def _invalidate(collection_name: str):
+    with _lock:
+        _indexes.pop(collection_name, None)
+
+
+def _parse_index(row) -> dict:
+    # e.g. CREATE INDEX ix_ann_... ON public.langchain_pg_embedding USING hnsw
+    #      (((embedding)::vector(1536)) vector_cosine_ops) WITH (m='16', ...) WHERE (...)
+    definition = row.indexdef
+    method = definition.split(" USING ", 1)[1].split(" ", 1)[0]
+    vector_type = "halfvec" if "halfvec_cosine_ops" in definition else "vector"
+    dims = int(definition.split(f"::{vector_type}(", 1)[1].split(")", 1)[0])
+    options = (
+        definition.split(" WITH (", 1)[1].split(")", 1)[0]
+        if " WITH (" in definition
+        else ""
+    )
+    return {
+        "name": row.indexname,
+        "collection_name": row.collection_name,
+        "collection_id": str(row.collection_id),
+        "method": method,
+        "vector_type": vector_type,
+        "dims": dims,
+        "options": options,
+        "size_bytes": row.size_bytes,
+        "valid": row.valid,
+    }
+
+
+_list_query = text(f"""SELECT i.indexname, i.indexdef, c.name AS collection_name,
+                 c.uuid AS collection_id,
+                 pg_relation_size(to_regclass(i.indexname)) AS size_bytes,
+                 x.indisvalid AS valid
+          FROM pg_indexes i
+          JOIN langchain_pg_collection c
+            ON i.indexname = '{index_prefix}' || replace(c.uuid::text, '-', '')
+          JOIN pg_index x ON x.indexrelid = to_regclass(i.indexname)
+          WHERE i.tablename = 'langchain_pg_embedding'""")
+
+
+def list_indexes(engine: Engine) -> list[dict]:
+    """ANN indexes of all collections."""
+    with engine.connect() as conn:
+        return [_parse_index(row) for row in conn.execute(_list_query)]
+
+
+def get_index(engine: Engine, collection_name: str) -> dict | None:
+    """ANN index of the collection or None (cached for _index_ttl seconds)."""
+    now = time.monotonic()
+    cached = _indexes.get(collection_name)
+    if cached and now - cached[0] < _index_ttl:
+        return cached[1]
+    index = next(
+        (
+            index
+            for index in list_indexes(engine)
+            if index["collection_name"] == collection_name and index["valid"]
+        ),
+        None,
+    )
+    with _lock:
+        _indexes[collection_name] = (now, index)
+    return index
+
+
+def cached_index(engine: Engine, collection_name: str) -> dict | None:
+    """Like get_index, but without a query: for the event loop. A missing or expired
+    entry is looked up in a thread, until then the last known index (or None) is returned.
+    """
+    cached = _indexes.get(collection_name)
+    if cached is None or time.monotonic() - cached[0] >= _index_ttl:
+        with _lock:
+            refresh = collection_name not in _refreshing
+            _refreshing.add(collection_name)
+        if refresh:
+            threading.Thread(
+                target=_refresh_index,
+                args=(engine, collection_name),
+                name="ann_index_lookup",
+                daemon=True,
+            ).start()
+    return cached[1] if cached else None
+
+
+def _refresh_index(engine: Engine, collection_name: str):
+    try:
+        get_index(engine, collection_name)
+    except Exception as e:
+        logger.warning(f"ANN index lookup of '{collection_name}' failed: {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(collection_name)
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    ).scalar()
+
+
+def _autocommit(engine: Engine):
+    # CREATE INDEX CONCURRENTLY does not block the imports, but needs autocommit
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def drop_index(engine: Engine, collection_name: str) -> bool:
+    """Drops the ANN index of the collection, returns False if there was none."""
+    with _autocommit(engine) as conn:
+        name = index_name(_collection_id(conn, collection_name))
+        exists = _exists(conn, name)
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    _invalidate(collection_name)
+    if exists:
+        logger.info(f"ANN index of '{collection_name}' dropped")
+    return exists
+
+
+def create_index(
+    engine: Engine,
+    collection_name: str,
+    method: Method = "hnsw",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int | None = None,
+) -> dict:
+    """Creates the ANN index of the collection, an existing index is replaced.
+
+    hnsw: m and ef_construction (better recall, slower build),
+    ivfflat: lists (default rows / 1000), build it after the import of the documents.
+    """
+    if method not in methods:
+        raise ValueError(f"Unbekannte Indexmethode: {method}")
+    with _autocommit(engine) as conn:
+        collection_id = _collection_id(conn, collection_name)
+        dims = _dims(conn, collection_id)
+        vector_type = _vector_type(conn, dims)
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            lists = lists or _default_lists(conn, collection_id)
+            options = f"lists = {int(lists)}"
+        name = index_name(collection_id)
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        start = time.perf_counter()
+        conn.execute(
+            text(
+                f"CREATE INDEX CONCURRENTLY {name} ON langchain_pg_embedding "
+                f"USING {method} ((embedding::{vector_type}({dims})) {vector_type}_cosine_ops) "
+                f"WITH ({options}) WHERE collection_id = '{collection_id}'"
+            )
+        )
+    _invalidate(collection_name)
+    logger.info(
+        f"ANN index ({method}, {options}) of '{collection_name}' created in {time.perf_counter() - start:.1f}s"
+    )
+    return get_index(engine, collection_name)
+
+
+def rebuild_index(engine: Engine, collection_name: str) -> dict:
+    """Rebuilds the ANN index, e.g. ivfflat after many imports (the lists are
+    computed from the rows at build time)."""
+    with _autocommit(engine) as conn:
+        name = index_name(_collection_id(conn, collection_name))
+        if not _exists(conn, name):
+            raise LookupError(f"Kein ANN-Index auf '{collection_name}'")
+        conn.execute(text(f"REINDEX INDEX CONCURRENTLY {name}"))
+    _invalidate(collection_name)
+    logger.info(f"ANN index of '{collection_name}' rebuilt")
+    return get_index(engine, collection_name)
+
+
+def _search_query(index: dict):
+    vector = f"{index['vector_type']}({index['dims']})"
+    # the condition equals the index predicate, the distance the index expression
+    return text(f"""SELECT e.id, e.document, e.cmetadata,
+                 e.embedding::{vector} <=> CAST(:embedding AS {vector}) AS distance
+          FROM langchain_pg_embedding e
+          WHERE e.collection_id = '{index["collection_id"]}'
+          ORDER BY distance
+          LIMIT :k""")
+
+
+class AnnRetriever(BaseRetriever):
+    """Similarity search on the ANN index of the collection (see create_index).
+
+    ef_search (hnsw, default 40, at least k) and probes (ivfflat, default 1) trade
+    recall for latency, they are set per query (search_kwargs of get_retriever).
+
+    ### Example
+
+    ```python
+    retriever = get_retriever(search_kwargs={"k": 4, "ef_search": 100})
+    ```
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: PGVector
+    index: dict
+    engine: Engine | None = None
+    async_engine: AsyncEngine | None = None
+    k: int = 4
+    ef_search: int | None = None
+    probes: int | None = None
+
+    def _settings(self, k: int) -> dict:
+        if self.index["method"] == "hnsw":
+            # hnsw returns at most ef_search rows
+            return {"hnsw.ef_search": max(self.ef_search or 40, k)}
+        if self.probes:
+            return {"ivfflat.probes": self.probes}
+        return {}
+
+    def _params(self, embedding: list[float], k: int) -> dict:
+        return {"embedding": str(list(embedding)), "k": k}
+
+    def _to_documents(self, rows) -> list[Document]:
+        return [
+            Document(id=str(row.id), page_content=row.document, metadata=row.cmetadata)
+            for row in rows
+        ]
+
+    def search_by_vector(self, embedding: list[float], k: int) -> list[Document]:
+        with self.engine.begin() as conn:
+            for name, value in self._settings(k).items():
+                # SET LOCAL: only for this transaction
+                conn.execute(
+                    text("SELECT set_config(:name, :value, true)"),
+                    {"name": name, "value": str(value)},
+                )
+            rows = conn.execute(_search_query(self.index), self._params(embedding, k))
+            return self._to_documents(rows)
+
+    async def asearch_by_vector(self, embedding: list[float], k: int) -> list[Document]:
+        async with self.async_engine.begin() as conn:
+            for name, value in self._settings(k).items():
+                await conn.execute(
+                    text("SELECT set_config(:name, :value, true)"),
+                    {"name": name, "value": str(value)},
+                )
+            rows = await conn.execute(
+                _search_query(self.index), self._params(embedding, k)
+            )
+            return self._to_documents(rows)
+
+    def search(self, query: str, k: int | None = None) -> list[Document]:
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        return self.search_by_vector(embedding, k or self.k)
+
+    async def asearch(self, query: str, k: int | None = None) -> list[Document]:
+        embedding = await self.vectorstore.embeddings.aembed_query(query)
+        return await self.asearch_by_vector(embedding, k or self.k)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self.search(query)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return await self.asearch(query)
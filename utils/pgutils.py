@@ -1,26 +1,153 @@
 import psycopg
+from psycopg.rows import dict_row
 from utils import AppSettings
 from datetime import datetime
 
-settings = AppSettings.AppSettings()
+settings = AppSettings.get_settings()
 
 conn_string = f"host={settings.PGVECTOR_HOST} port={settings.PGVECTOR_PORT} dbname={settings.PGVECTOR_DB} user={settings.PGVECTOR_USER} password={settings.PGVECTOR_PASSWORD}"
 
+# columns of the import jobs, existing rows count as done
+import_job_columns = {
+    "status": "VARCHAR(20) DEFAULT 'done'",
+    "stage": "VARCHAR(20)",
+    "splitter_type": "VARCHAR(20)",
+    "file_path": "TEXT",
+    "chunks_total": "INTEGER",
+    "chunks_done": "INTEGER",
+    # incremental re-import: chunks embedded, kept and deleted
+    "chunks_added": "INTEGER",
+    "chunks_unchanged": "INTEGER",
+    "chunks_deleted": "INTEGER",
+    "error": "TEXT",
+    "updated_at": "TIMESTAMP",
+}
+
+
+def pg_init_imports():
+    """Adds the job columns to the imports table (if not already there)."""
+    with psycopg.connect(conn_string) as conn:
+        with conn.cursor() as cur:
+            for column, column_type in import_job_columns.items():
+                cur.execute(
+                    f"ALTER TABLE imports ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                )
+            conn.commit()
+
 
 def pg_save_import(
-    file_name: str, file_size: int, import_date: datetime, collection_name: str
+    file_name: str,
+    file_size: int,
+    import_date: datetime,
+    collection_name: str,
+    status: str = "done",
+    splitter_type: str | None = None,
+    file_path: str | None = None,
 ) -> int:
     with psycopg.connect(conn_string) as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO imports (file_name, file_size, import_date, collection_name) VALUES (%s, %s, %s, %s) RETURNING id",
-                (file_name, file_size, import_date, collection_name),
+                "INSERT INTO imports (file_name, file_size, import_date, collection_name, status, stage, splitter_type, file_path, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+                (
+                    file_name,
+                    file_size,
+                    import_date,
+                    collection_name,
+                    status,
+                    status,
+                    splitter_type,
+                    file_path,
+                    import_date,
+                ),
             )
             id = cur.fetchone()[0]
             conn.commit()
     return id
 
 
+def pg_update_import(import_id: int, **fields):
+    """Updates the job columns of an import, e.g. pg_update_import(1, stage="embedding")"""
+    unknown = set(fields) - set(import_job_columns)
+    if unknown:
+        raise ValueError(f"Unbekannte Spalten: {unknown}")
+    fields["updated_at"] = datetime.now()
+    assignments = ", ".join(f"{column} = %s" for column in fields)
+    with psycopg.connect(conn_string) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE imports SET {assignments} WHERE id = %s",
+                (*fields.values(), import_id),
+            )
+            conn.commit()
+
+
+def pg_get_import(import_id: int) -> dict | None:
+    with psycopg.connect(conn_string, row_factory=dict_row) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT * FROM imports WHERE id = %s", (import_id,))
+            return cur.fetchone()
+
+
+def pg_get_unfinished_imports() -> list[dict]:
+    """Returns the imports that were queued or running when the server stopped."""
+    with psycopg.connect(conn_string, row_factory=dict_row) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT * FROM imports WHERE status IN ('queued', 'running') ORDER BY id"
+            )
+            return cur.fetchall()
+
+
+def pg_get_collection_version(collection_name: str) -> str:
+    """Changes with every import into the collection (new, running, done)."""
+    with psycopg.connect(conn_string) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT COUNT(*), MAX(updated_at) FROM imports WHERE collection_name = %s",
+                (collection_name,),
+            )
+            count, updated_at = cur.fetchone()
+    return f"{count}:{updated_at}"
+
+
+def pg_delete_import_chunks(import_id: int, collection_name: str) -> int:
+    """Deletes the chunks an (interrupted) import has already written."""
+    with psycopg.connect(conn_string) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """DELETE FROM langchain_pg_embedding e USING langchain_pg_collection c
+                   WHERE e.collection_id = c.uuid AND c.name = %s AND e.cmetadata->>'import_id' = %s""",
+                (collection_name, str(import_id)),
+            )
+            count = cur.rowcount
+            conn.commit()
+    return count
+
+
+def pg_get_source_chunk_ids(collection_name: str, source: str) -> set[str]:
+    """Ids of the chunks of a source (file name or url) in the collection."""
+    with psycopg.connect(conn_string) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT e.id FROM langchain_pg_embedding e
+                   JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                   WHERE c.name = %s AND e.cmetadata->>'source' = %s""",
+                (collection_name, source),
+            )
+            return {row[0] for row in cur}
+
+
+def pg_delete_chunks(ids: list[str]) -> int:
+    if not ids:
+        return 0
+    with psycopg.connect(conn_string) as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM langchain_pg_embedding WHERE id = ANY(%s)", (ids,))
+            count = cur.rowcount
+            conn.commit()
+    return count
+
+
 # def pg_is_imported(anlage_id: int) -> bool:
 #     with psycopg.connect(conn_string) as conn:
 #         with conn.cursor() as cur:
@@ -1,39 +1,159 @@
+import heapq
+import itertools
 import threading
 import time
-import platform
 
-if platform.system() == "Linux":
-    import RPi.GPIO as GPIO  # type: ignore
+from utils.gpiobackend import GPIOBackend, get_backend
 
-
-def only_linux(func):
-    def wrapper(*args, **kwargs):
-        if platform.system() == "Linux":
-            return func(*args, **kwargs)
-
-    return wrapper
+# selected once (GPIO_BACKEND), not on every write
+gpio = get_backend()
 
 
 class GPIOHelper:
     @staticmethod
-    @only_linux
     def init():
-        GPIO.setmode(GPIO.BCM)
+        gpio.init()
 
     @staticmethod
-    @only_linux
     def cleanup():
-        GPIO.cleanup()
+        gpio.cleanup()
+
+
+class LedScheduler:
+    """One thread toggles all blinking LEDs (instead of one thread per LED).
+
+    The next toggles are kept in a heap, the thread sleeps on a Condition until the
+    earliest one is due and writes all LEDs due within the same tick (resolution
+    seconds) with one GPIO call.
+    blink and stop only change the heap under the lock: after stop returned the LED
+    is off and will not be written again until the next blink.
+
+    ### Example
+
+    ```python
+    led = Led("green")
+    led.blink(0.5)  # led_scheduler.blink(led, 0.5)
+    led.stop()
+    ```
+    """
+
+    def __init__(self, backend: GPIOBackend | None = None, resolution: float = 0.01):
+        self.gpio = backend or gpio
+        self.resolution = resolution
+        # (due, sequence, led, generation), entries of an older generation are skipped
+        self._heap: list[tuple[float, int, "Led", int]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self.ticks = 0
+        self.writes = 0
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._run, name="led_scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def blink(self, led: "Led", speed: float):
+        """Toggles the LED every speed seconds, starting now (a running blink is replaced)."""
+        with self._condition:
+            led._generation += 1
+            led.speed = speed
+            led.running = True
+            heapq.heappush(
+                self._heap,
+                (time.monotonic(), next(self._sequence), led, led._generation),
+            )
+            self._start()
+            self._condition.notify()
+
+    def stop(self, led: "Led"):
+        """Switches the LED off, no more toggles are written after the return."""
+        with self._condition:
+            led._generation += 1
+            led.running = False
+            led.value = False
+            self._write([led])
+
+    def _write(self, leds: list["Led"]):
+        # one call for all pins of the tick
+        pins = [led.pin for led in leds if led.pin is not None]
+        if pins:
+            self.gpio.output(pins, [led.value for led in leds if led.pin is not None])
+        self.writes += len(leds)
+
+    def _due(self, now: float) -> list["Led"]:
+        leds = []
+        while self._heap and self._heap[0][0] <= now + self.resolution:
+            due, _, led, generation = heapq.heappop(self._heap)
+            if generation != led._generation:
+                continue
+            led.value = not led.value
+            leds.append(led)
+            # missed toggles (e.g. a long GC pause) are skipped, not caught up
+            due = due + led.speed if due + led.speed > now else now + led.speed
+            heapq.heappush(self._heap, (due, next(self._sequence), led, generation))
+        return leds
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                if not self._heap or self._heap[0][0] > now:
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._condition.wait(timeout)
+                    continue
+                leds = self._due(now)
+                if leds:
+                    self.ticks += 1
+                    self._write(leds)
+
+    def shutdown(self):
+        """Stops the thread, the LEDs keep their last value (GPIOHelper.cleanup resets them)."""
+        with self._condition:
+            self._running = False
+            self._heap.clear()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "queued": len(self._heap),
+                "ticks": self.ticks,
+                "writes": self.writes,
+            }
+
+
+led_scheduler = LedScheduler()
 
 
 class Led:
-    def __init__(self, color: str):
+    def __init__(
+        self,
+        color: str,
+        virtual: bool = False,
+        pin: int | None = None,
+        scheduler: LedScheduler | None = None,
+    ):
+        """virtual: no GPIO pin, the LED only exists in the scheduler (e.g. simulated bots).
+        pin: instead of the pin of the color (e.g. load tests with the simulated GPIO).
+        """
         self.color = color
-        self._set_pin(color)
+        self.pin = pin
+        if pin is None and not virtual:
+            self._set_pin(color)
+        self.scheduler = scheduler or led_scheduler
         self.running = False
-        self.sleeping = False
-        if platform.system() == "Linux":
-            GPIO.setup(self.pin, GPIO.OUT)
+        self.value = False
+        self.speed = 0.0
+        self._generation = 0
+        if self.pin is not None:
+            self.scheduler.gpio.setup(self.pin)
 
     def _set_pin(self, color: str) -> int:
         match color.lower():
@@ -46,76 +166,31 @@ class Led:
             case _:
                 raise ValueError("falsche Farbe.")
 
-    def _blink(self, speed: float):
-        self.running = True
-        pin_value = False
-        while self.running:
-            if platform.system() == "Linux":
-                pin_value = not GPIO.input(self.pin) if self.running else False
-                GPIO.output(self.pin, pin_value)
-            else:
-                # fake it
-                pin_value = not pin_value if self.running else False
-
-            # print(f"LED {'an' if pin_value else 'aus'} ({self.color})")
-            self.sleeping = True
-            time.sleep(speed)
-            self.sleeping = False
-        print(f"LED blink aus ({self.color})")
-
-    def blink(self, speed: int):
-        if self.running:
-            self.stop()
-        t1 = threading.Thread(target=self._blink, args=(speed,))
-        t1.daemon = True
-        t1.start()
+    def blink(self, speed: float):
+        self.scheduler.blink(self, speed)
 
     def stop(self):
-        self.running = False
-        if platform.system() == "Linux":
-            GPIO.output(self.pin, False)
-        while self.sleeping:
-            time.sleep(0.1)
-
-
-class FakeBot(Led):
-    def set_offline(self):
-        self._status = "offline"
-        self.stop()
-        print(f"Bot {self.color} {self._status}")
-
-    def set_idle(self):
-        self._status = "idle"
-        self.blink(1)
-        print(f"Bot {self.color} {self._status}")
-
-    def set_busy(self):
-        self._status = "busy"
-        self.blink(0.25)
-        print(f"Bot {self.color} {self._status}")
-
-    def get_status(self):
-        return self._status
+        was_running = self.running
+        self.scheduler.stop(self)
+        if was_running and self.pin is not None:
+            print(f"LED blink aus ({self.color})")
 
 
 if __name__ == "__main__":
     GPIOHelper.init()
-    red_bot = FakeBot("red")
-    yellow_bot = FakeBot("yellow")
-    green_bot = FakeBot("green")
-
-    fake_bot = FakeBot("green")
-    fake_bot.set_busy()
+    red_led = Led("red")
+    yellow_led = Led("yellow")
+    green_led = Led("green")
 
-    # red_bot.blink(1)
-    # yellow_bot.blink(0.75)
-    # green_bot.blink(0.5)
+    red_led.blink(1)
+    yellow_led.blink(0.75)
+    green_led.blink(0.5)
 
     time.sleep(5)
 
-    fake_bot.set_offline()
-    # red_bot.stop()
-    # yellow_bot.stop()
-    # green_bot.stop()
+    red_led.stop()
+    yellow_led.stop()
+    green_led.stop()
+    led_scheduler.shutdown()
 
     GPIOHelper.cleanup()
@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Any, Callable
+
+from langchain_core.runnables import Runnable, RunnableLambda
+from loguru import logger
+
+_factories: dict[str, Callable[[], Any]] = {}
+_instances: dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def provider(name: str):
+    """Registers a factory, the object is built on first use of get(name).
+
+    ### Example
+
+    ```python
+    @provider("llm")
+    def _llm():
+        return get_chatmodel()
+
+    llm = get("llm")
+    ```
+    """
+
+    def decorator(factory: Callable[[], Any]):
+        _factories[name] = factory
+        return factory
+
+    return decorator
+
+
+def get(name: str) -> Any:
+    """Returns the object of the provider, built once per process."""
+    if name not in _instances:
+        with _lock:
+            if name not in _instances:
+                start = time.perf_counter()
+                _instances[name] = _factories[name]()
+                logger.debug(
+                    f"Provider '{name}' built in {time.perf_counter() - start:.2f}s"
+                )
+    return _instances[name]
+
+
+def warmup(names: list[str] | None = None) -> dict[str, float]:
+    """Builds the providers in advance (all if names is None), errors are only logged.
+
+    Returns:
+        dict[str, float]: seconds per provider
+    """
+    timings = {}
+    for name in names or list(_factories):
+        start = time.perf_counter()
+        try:
+            get(name)
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            logger.error(f"Warm-up of provider '{name}' failed: {e}")
+    return timings
+
+
+def lazy_runnable(name: str, input_type: Any = None) -> Runnable:
+    """A runnable that can be registered (e.g. with add_routes) at import time,
+    but builds the runnable of the provider only on the first call.
+    invoke, batch and stream (also async) are passed to the built runnable.
+    """
+
+    def resolve(_input):
+        return get(name)
+
+    runnable = RunnableLambda(resolve, name=name)
+    if input_type is not None:
+        runnable = runnable.with_types(input_type=input_type)
+    return runnable
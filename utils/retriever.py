@@ -1,33 +1,265 @@
+import threading
+
 from loguru import logger
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from utils import AppSettings, aiutils
+from utils.hybridretriever import (
+    HybridRetriever,
+    ensure_fulltext_index_in_background,
+)
+from utils.pgindex import AnnRetriever, cached_index, get_index
 from langchain_postgres.vectorstores import PGVector
 
-settings = AppSettings.AppSettings()
+settings = AppSettings.get_settings()
+
+# one sync and one async engine (= bounded connection pools) for the whole process,
+# the vectorstores are kept per (collection_name, embedding backend)
+_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
+_vectorstores: dict[tuple[str, str], PGVector] = {}
+_async_vectorstores: dict[tuple[str, str], PGVector] = {}
+_lock = threading.RLock()
+
+
+def get_connection_string() -> str:
+    # postgresql://[user[:password]@][netloc][:port][/dbname][?param1=value1&...]
+    return f"postgresql+psycopg://{settings.PGVECTOR_USER}:{settings.PGVECTOR_PASSWORD}@{settings.PGVECTOR_HOST}:{settings.PGVECTOR_PORT}/{settings.PGVECTOR_DB}"
+
+
+def get_engine() -> Engine:
+    """Returns the shared SQLAlchemy engine, created on first use."""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = create_engine(
+                    get_connection_string(),
+                    pool_size=settings.PGVECTOR_POOL_SIZE,
+                    max_overflow=settings.PGVECTOR_MAX_OVERFLOW,
+                    pool_recycle=settings.PGVECTOR_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                )
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Returns the shared async SQLAlchemy engine, created on first use."""
+    global _async_engine
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    get_connection_string(),
+                    pool_size=settings.PGVECTOR_POOL_SIZE,
+                    max_overflow=settings.PGVECTOR_MAX_OVERFLOW,
+                    pool_recycle=settings.PGVECTOR_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                )
+    return _async_engine
 
 
 @logger.catch(reraise=True)
 def get_vectorstore(collection_name: str = settings.PGVECTOR_COLLECTION):
-    # postgresql://[user[:password]@][netloc][:port][/dbname][?param1=value1&...]
-    connection = f"postgresql+psycopg://{settings.PGVECTOR_USER}:{settings.PGVECTOR_PASSWORD}@{settings.PGVECTOR_HOST}:{settings.PGVECTOR_PORT}/{settings.PGVECTOR_DB}"
+    """Returns the long-lived vectorstore of the collection.
+    The first call per (collection, embedding backend) creates the store
+    (extension, tables and collection are checked only then), later calls reuse it.
+    """
+    key = (collection_name, aiutils.get_embeddings_backend())
+    vectorstore = _vectorstores.get(key)
+    if vectorstore is None:
+        with _lock:
+            vectorstore = _vectorstores.get(key)
+            if vectorstore is None:
+                logger.debug(f"Creating vectorstore {key}...")
+                vectorstore = PGVector(
+                    embeddings=aiutils.get_embeddingsmodel(),
+                    collection_name=collection_name,
+                    connection=get_engine(),
+                    use_jsonb=True,
+                )
+                _vectorstores[key] = vectorstore
+    return vectorstore
 
-    vectorstore = PGVector(
-        embeddings=aiutils.get_embeddingsmodel(),
-        collection_name=collection_name,
-        connection=connection,
-        use_jsonb=True,
-    )
+
+@logger.catch(reraise=True)
+def get_async_vectorstore(collection_name: str = settings.PGVECTOR_COLLECTION):
+    """Like get_vectorstore, but the store runs on the async engine
+    and only supports the async methods (asimilarity_search, aadd_documents, ...).
+    """
+    key = (collection_name, aiutils.get_embeddings_backend())
+    vectorstore = _async_vectorstores.get(key)
+    if vectorstore is None:
+        with _lock:
+            vectorstore = _async_vectorstores.get(key)
+            if vectorstore is None:
+                logger.debug(f"Creating async vectorstore {key}...")
+                vectorstore = PGVector(
+                    embeddings=aiutils.get_embeddingsmodel(),
+                    collection_name=collection_name,
+                    connection=get_async_engine(),
+                    use_jsonb=True,
+                    async_mode=True,
+                )
+                _async_vectorstores[key] = vectorstore
     return vectorstore
 
 
+def _hybrid_kwargs(search_kwargs: dict) -> dict:
+    """search_kwargs of the hybrid search, e.g. {"search_type": "hybrid", "k": 4, "fetch_k": 20}"""
+    kwargs = {
+        key: search_kwargs[key]
+        for key in ("k", "fetch_k", "rrf_k", "filter")
+        if key in search_kwargs
+    }
+    return {"ts_config": settings.HYBRID_TS_CONFIG, **kwargs}
+
+
+def _ann_retriever(
+    vectorstore: PGVector,
+    collection_name: str,
+    search_kwargs: dict,
+    lookup=get_index,
+    **engines,
+) -> AnnRetriever | None:
+    """Retriever on the ANN index of the collection (utils.pgindex), None if there is
+    no index or the search needs PGVector (filter, mmr).
+    lookup: get_index, or cached_index in the async path (no query on the event loop).
+    """
+    if "filter" in search_kwargs or search_kwargs.get("search_type") not in (
+        None,
+        "similarity",
+        "hybrid",
+    ):
+        return None
+    index = lookup(get_engine(), collection_name)
+    if index is None:
+        return None
+    kwargs = {
+        key: search_kwargs[key]
+        for key in ("k", "ef_search", "probes")
+        if key in search_kwargs
+    }
+    return AnnRetriever(vectorstore=vectorstore, index=index, **engines, **kwargs)
+
+
+def _vector_kwargs(search_kwargs: dict) -> dict:
+    # ef_search and probes are only known to the ANN index
+    return {
+        key: value
+        for key, value in search_kwargs.items()
+        if key not in ("ef_search", "probes")
+    }
+
+
 @logger.catch(reraise=True)
 def get_retriever(
     search_kwargs=None, collection_name: str = settings.PGVECTOR_COLLECTION
 ):
+    """search_kwargs are passed to the vector search,
+    with "search_type": "hybrid" the full-text search is added (HybridRetriever).
+    If the collection has an ANN index, it is used (AnnRetriever, "ef_search"/"probes").
+    """
     vectorstore = get_vectorstore(collection_name)
+    search_kwargs = search_kwargs or {}
+    ann = _ann_retriever(
+        vectorstore, collection_name, search_kwargs, engine=get_engine()
+    )
+
+    if search_kwargs.get("search_type") == "hybrid":
+        # the first hybrid search starts the build of the index (or POST /admin/index/fulltext)
+        ensure_fulltext_index_in_background(get_engine(), settings.HYBRID_TS_CONFIG)
+        return HybridRetriever(
+            vectorstore=vectorstore,
+            collection_name=collection_name,
+            engine=get_engine(),
+            vector_search=ann,
+            **_hybrid_kwargs(search_kwargs),
+        )
+
+    if ann:
+        return ann
+
+    if search_kwargs:
+        retriever = vectorstore.as_retriever(
+            search_kwargs=_vector_kwargs(search_kwargs)
+        )
+    else:
+        retriever = vectorstore.as_retriever()
+
+    return retriever
+
+
+@logger.catch(reraise=True)
+def get_async_retriever(
+    search_kwargs=None, collection_name: str = settings.PGVECTOR_COLLECTION
+):
+    vectorstore = get_async_vectorstore(collection_name)
+    search_kwargs = search_kwargs or {}
+    ann = _ann_retriever(
+        vectorstore,
+        collection_name,
+        search_kwargs,
+        lookup=cached_index,
+        async_engine=get_async_engine(),
+    )
+
+    if search_kwargs.get("search_type") == "hybrid":
+        # on the first hybrid search the index is built in a thread, not on the event loop
+        ensure_fulltext_index_in_background(get_engine(), settings.HYBRID_TS_CONFIG)
+        return HybridRetriever(
+            vectorstore=vectorstore,
+            collection_name=collection_name,
+            async_engine=get_async_engine(),
+            vector_search=ann,
+            **_hybrid_kwargs(search_kwargs),
+        )
+
+    if ann:
+        return ann
 
     if search_kwargs:
-        retriever = vectorstore.as_retriever(search_kwargs=search_kwargs)
+        retriever = vectorstore.as_retriever(
+            search_kwargs=_vector_kwargs(search_kwargs)
+        )
     else:
         retriever = vectorstore.as_retriever()
 
     return retriever
+
+
+def warmup_vectorstores(collection_names: list[str] | None = None):
+    """Creates the engine, the embeddings client and the vectorstores in advance,
+    so the first request does not pay for it. Errors are only logged.
+    """
+    for collection_name in collection_names or [settings.PGVECTOR_COLLECTION]:
+        try:
+            get_vectorstore(collection_name)
+            logger.success(f"Vectorstore '{collection_name}' ready.")
+            index = get_index(get_engine(), collection_name)
+            if index:
+                logger.info(
+                    f"ANN index ({index['method']}) of '{collection_name}' found."
+                )
+        except Exception as e:
+            logger.error(f"Warm-up of vectorstore '{collection_name}' failed: {e}")
+
+
+def vectorstore_health() -> dict:
+    """Checks the database connection and reports the pool and the cached vectorstores."""
+    health = {
+        "database": "ok",
+        "vectorstores": [
+            {"collection_name": collection_name, "embeddings": backend}
+            for collection_name, backend in _vectorstores
+        ],
+    }
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        health["pool"] = get_engine().pool.status()
+    except Exception as e:
+        logger.warning(f"Health check of the vector db failed: {e}")
+        health["database"] = f"error: {e}"
+    return health
@@ -0,0 +1,201 @@
+import re
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, Literal, Sequence
+
+import numpy as np
+from langchain_core.documents import BaseDocumentTransformer, Document
+from langchain_core.embeddings import Embeddings
+
+BreakpointThresholdType = Literal[
+    "percentile", "standard_deviation", "interquartile", "gradient"
+]
+breakpoint_defaults: dict[str, float] = {
+    "percentile": 95,
+    "standard_deviation": 3,
+    "interquartile": 1.5,
+    "gradient": 95,
+}
+
+
+class BatchedSemanticChunker(BaseDocumentTransformer):
+    """Semantic splitting like langchain_experimental's SemanticChunker (same sentence
+    regex, breakpoint thresholds and min_chunk_size), but faster:
+
+    - every sentence is embedded once, in batches of batch_size sentences over several
+      pages (lazy_split_documents), repeated sentences come from an in-memory cache,
+    - the vector of a window (sentence +- buffer_size) is the sum of the normalized
+      sentence vectors instead of the embedding of the joined window text,
+    - the distances are computed vectorized with NumPy.
+
+    With the persistent embedding cache (EMBEDDING_CACHE) a chunk that is a single
+    sentence is not embedded again on insert, its vector is already in the cache.
+
+    ### Example
+
+    ```python
+    splitter = BatchedSemanticChunker(get_embeddingsmodel())
+    chunks = list(splitter.lazy_split_documents(loader.lazy_load()))
+    ```
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        buffer_size: int = 1,
+        breakpoint_threshold_type: BreakpointThresholdType = "percentile",
+        breakpoint_threshold_amount: float | None = None,
+        sentence_split_regex: str = r"(?<=[.?!])\s+",
+        min_chunk_size: int | None = None,
+        batch_size: int = 256,
+        cache_size: int = 10_000,
+    ):
+        if breakpoint_threshold_type not in breakpoint_defaults:
+            raise ValueError(
+                f"Unbekannter breakpoint_threshold_type: {breakpoint_threshold_type}"
+            )
+        self.embeddings = embeddings
+        self.buffer_size = buffer_size
+        self.breakpoint_threshold_type = breakpoint_threshold_type
+        self.breakpoint_threshold_amount = (
+            breakpoint_threshold_amount
+            if breakpoint_threshold_amount is not None
+            else breakpoint_defaults[breakpoint_threshold_type]
+        )
+        self.sentence_split = re.compile(sentence_split_regex)
+        self.min_chunk_size = min_chunk_size
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.calls = 0
+        self.embedded = 0
+        self.hits = 0
+        # sentence -> normalized vector
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def _sentences(self, text: str) -> list[str]:
+        return self.sentence_split.split(text)
+
+    def _embed_missing(self, sentences: list[str]):
+        """Embeds the sentences that are not cached, batch_size per call."""
+        missing = []
+        for sentence in sentences:
+            if sentence in self._cache:
+                self._cache.move_to_end(sentence)
+                self.hits += 1
+            else:
+                missing.append(sentence)
+        missing = list(dict.fromkeys(missing))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i : i + self.batch_size]
+            vectors = np.asarray(self.embeddings.embed_documents(batch), dtype=float)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+            self.calls += 1
+            self.embedded += len(batch)
+            self._cache.update(zip(batch, vectors))
+
+    def _evict(self):
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def distances(self, vectors: np.ndarray) -> np.ndarray:
+        """Cosine distance of every window to the next one."""
+        n = len(vectors)
+        sums = np.vstack([np.zeros(vectors.shape[1]), np.cumsum(vectors, axis=0)])
+        index = np.arange(n)
+        upper = np.minimum(n, index + self.buffer_size + 1)
+        lower = np.maximum(0, index - self.buffer_size)
+        windows = sums[upper] - sums[lower]
+        norms = np.linalg.norm(windows, axis=1, keepdims=True)
+        windows = windows / np.where(norms == 0, 1, norms)
+        return 1 - np.einsum("ij,ij->i", windows[:-1], windows[1:])
+
+    def _threshold(self, distances: np.ndarray) -> tuple[float, np.ndarray]:
+        amount = self.breakpoint_threshold_amount
+        if self.breakpoint_threshold_type == "percentile":
+            return float(np.percentile(distances, amount)), distances
+        if self.breakpoint_threshold_type == "standard_deviation":
+            return float(np.mean(distances) + amount * np.std(distances)), distances
+        if self.breakpoint_threshold_type == "interquartile":
+            q1, q3 = np.percentile(distances, [25, 75])
+            return float(np.mean(distances) + amount * (q3 - q1)), distances
+        gradient = np.gradient(distances, np.arange(len(distances)))
+        return float(np.percentile(gradient, amount)), gradient
+
+    def _split(self, sentences: list[str]) -> list[str]:
+        if len(sentences) == 1:
+            return sentences
+        if self.breakpoint_threshold_type == "gradient" and len(sentences) == 2:
+            return sentences
+        # the sentences are embedded by _embed_missing before
+        vectors = np.vstack([self._cache[sentence] for sentence in sentences])
+        threshold, values = self._threshold(self.distances(vectors))
+        chunks = []
+        start = 0
+        for index in np.flatnonzero(values > threshold):
+            text = " ".join(sentences[start : index + 1])
+            # too small chunks are merged with the next one
+            if self.min_chunk_size is not None and len(text) < self.min_chunk_size:
+                continue
+            chunks.append(text)
+            start = index + 1
+        if start < len(sentences):
+            chunks.append(" ".join(sentences[start:]))
+        return chunks
+
+    def split_text(self, text: str) -> list[str]:
+        sentences = self._sentences(text)
+        self._embed_missing(sentences)
+        chunks = self._split(sentences)
+        self._evict()
+        return chunks
+
+    def lazy_split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Splits page by page, but embeds the sentences of several pages together
+        (until batch_size sentences are collected)."""
+        pending: list[tuple[Document, list[str]]] = []
+        count = 0
+        for doc in documents:
+            sentences = self._sentences(doc.page_content)
+            pending.append((doc, sentences))
+            count += len(sentences)
+            if count >= self.batch_size:
+                yield from self._split_pending(pending)
+                pending, count = [], 0
+        yield from self._split_pending(pending)
+
+    def _split_pending(
+        self, pending: list[tuple[Document, list[str]]]
+    ) -> Iterator[Document]:
+        self._embed_missing([s for _, sentences in pending for s in sentences])
+        chunks = [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for doc, sentences in pending
+            for chunk in self._split(sentences)
+        ]
+        self._evict()
+        yield from chunks
+
+    def split_documents(self, documents: Iterable[Document]) -> list[Document]:
+        return list(self.lazy_split_documents(documents))
+
+    def create_documents(
+        self, texts: list[str], metadatas: list[dict] | None = None
+    ) -> list[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        return self.split_documents(
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas)
+        )
+
+    def transform_documents(
+        self, documents: Sequence[Document], **kwargs: Any
+    ) -> Sequence[Document]:
+        return self.split_documents(documents)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "embedded": self.embedded,
+            "hits": self.hits,
+            "cached": len(self._cache),
+        }
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+from loguru import logger
+
+
+class SessionSaver(MemorySaver):
+    """In-memory checkpointer for chat sessions with bounded memory.
+
+    Per thread only the latest keep_checkpoints checkpoints are kept (the state
+    contains the whole chat history, older checkpoints are not needed), at most
+    max_sessions threads are kept (the least recently used are evicted) and
+    threads idle for longer than ttl seconds are evicted by evict_idle().
+    The ids of the evicted threads are remembered (at most max_evicted), so a client
+    continuing such a session can be told to resend its history (lost()).
+
+    ### Example
+
+    ```python
+    sessions = SessionSaver(max_sessions=256, ttl=3600)
+    graph = workflow.compile(checkpointer=sessions)
+    graph.invoke({"input": "Hallo"}, {"configurable": {"thread_id": "abc"}})
+    ```
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 256,
+        ttl: float = 3600,
+        keep_checkpoints: int = 2,
+        max_evicted: int = 4096,
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.keep_checkpoints = keep_checkpoints
+        self.max_evicted = max_evicted
+        self.evictions = 0
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        self._evicted: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id: str):
+        with self._lock:
+            self._last_used[thread_id] = time.monotonic()
+            self._last_used.move_to_end(thread_id)
+            while len(self._last_used) > self.max_sessions:
+                self._evict(next(iter(self._last_used)))
+
+    def _evict(self, thread_id: str):
+        self.delete(thread_id)
+        self.evictions += 1
+        self._evicted[thread_id] = None
+        while len(self._evicted) > self.max_evicted:
+            self._evicted.popitem(last=False)
+
+    def lost(self, thread_id: str, turns: int = 0) -> bool:
+        """True if the session is gone: evicted, or the client has had turns answers
+        in it already (e.g. before a restart of the server), but it is not stored."""
+        with self._lock:
+            if thread_id in self.storage:
+                return False
+            return thread_id in self._evicted or turns > 0
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_checkpoints:
+            return
+        # the ids are time ordered (uuid6)
+        for checkpoint_id in sorted(checkpoints)[: -self.keep_checkpoints]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+    def get_tuple(self, config: RunnableConfig):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id not in self.storage:
+                # new or evicted session, storage is a defaultdict
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions):
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            # the session starts again (e.g. with the history resent by the client)
+            self._evicted.pop(thread_id, None)
+            self._prune(thread_id, config["configurable"]["checkpoint_ns"])
+            self._touch(thread_id)
+            return result
+
+    def put_writes(self, config: RunnableConfig, writes, task_id: str):
+        with self._lock:
+            return super().put_writes(config, writes, task_id)
+
+    def delete(self, thread_id: str):
+        """Removes all checkpoints of a thread."""
+        with self._lock:
+            self._last_used.pop(thread_id, None)
+            self.storage.pop(thread_id, None)
+            for key in [key for key in self.writes if key[0] == thread_id]:
+                del self.writes[key]
+            # newer versions of MemorySaver store the channel values separately
+            blobs = getattr(self, "blobs", None)
+            if blobs:
+                for key in [key for key in blobs if key[0] == thread_id]:
+                    del blobs[key]
+
+    def evict_idle(self) -> int:
+        """Removes the threads idle for longer than ttl, returns their number."""
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            idle = [
+                thread_id
+                for thread_id, last_used in self._last_used.items()
+                if last_used < deadline
+            ]
+            for thread_id in idle:
+                self._evict(thread_id)
+        if idle:
+            logger.debug(f"{len(idle)} idle chat sessions evicted")
+        return len(idle)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._last_used),
+            "max_sessions": self.max_sessions,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+        }
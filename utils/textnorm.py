@@ -0,0 +1,70 @@
+import re
+from typing import Callable, Iterable, Iterator
+
+from langchain_core.documents import Document
+
+from utils.AppSettings import get_settings
+
+settings = get_settings()
+
+Replacement = tuple[re.Pattern, str | Callable[[re.Match], str]]
+
+# The rules run on the whole page before splitting, so they keep the line breaks the
+# splitter separates at (blank lines, "\nArt. ", "\n("). The patterns start with a
+# literal or a small character class where possible, the regex engine then skips ahead
+# to the candidates instead of trying every position.
+rules: dict[str, list[Replacement]] = {
+    # tabs and no-break spaces become spaces, runs of spaces collapsed, no spaces around line breaks
+    "whitespace": [
+        (re.compile(r"[\t\r\f\v\u00a0]+"), " "),
+        (re.compile(r"  +"), " "),
+        (re.compile(r" \n ?|\n "), "\n"),
+    ],
+    # words hyphenated at the line end: "Verwal-\ntung" -> "Verwaltung" ("Straßen-\nVerkehr" stays)
+    "hyphenation": [(re.compile(r"-(?<=\w-)\n(?=[a-zäöüß])"), "")],
+    # line breaks within a paragraph (PDF lines) become spaces
+    "join_lines": [(re.compile(r"\n(?<!\n\n)(?!\n|Art\. |\()"), " ")],
+    # "12Monate" -> "12 Monate" (also "12a" -> "12 a", as the import did before)
+    "digit_letter": [(re.compile(r"(\d)(?=[a-zA-Z])"), r"\1 ")],
+}
+
+
+def register_rule(name: str, *replacements: tuple[str, str | Callable]):
+    """Adds a rule, e.g. register_rule("paragraph", (r"§\\s*", "§ "))."""
+    rules[name] = [(re.compile(pattern), repl) for pattern, repl in replacements]
+
+
+class TextNormalizer:
+    """Applies the rules in the given order, once per page.
+
+    ### Example
+
+    ```python
+    normalize = TextNormalizer(["whitespace", "hyphenation", "join_lines"])
+    pages = normalize.pages(loader.lazy_load())
+    ```
+    """
+
+    def __init__(self, rule_names: Iterable[str]):
+        self.rule_names = list(rule_names)
+        unknown = [name for name in self.rule_names if name not in rules]
+        if unknown:
+            raise ValueError(f"Unbekannte Normalisierungsregeln: {unknown}")
+        self._replacements = [
+            replacement for name in self.rule_names for replacement in rules[name]
+        ]
+
+    def __call__(self, text: str) -> str:
+        for pattern, repl in self._replacements:
+            text = pattern.sub(repl, text)
+        return text
+
+    def pages(self, pages: Iterable[Document]) -> Iterator[Document]:
+        for page in pages:
+            page.page_content = self(page.page_content)
+            yield page
+
+
+def get_normalizer(spec: str = settings.TEXT_NORMALIZATION) -> TextNormalizer:
+    """Normalizer of a comma separated list of rules, e.g. "whitespace,hyphenation"."""
+    return TextNormalizer(name.strip() for name in spec.split(",") if name.strip())